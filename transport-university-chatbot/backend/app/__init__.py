@@ -0,0 +1,2 @@
+# Load .env once, before any submodule reads its configuration from os.environ
+from . import config  # noqa: F401
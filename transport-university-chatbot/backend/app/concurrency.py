@@ -0,0 +1,64 @@
+"""
+Concurrency helpers for the async request path
+
+Blocking work (CPU-bound embedding, legacy sync clients) is pushed to worker
+threads through dedicated capacity limiters so it can never starve Starlette's
+shared threadpool, and outbound calls (LLM) are bounded by semaphores.
+
+asyncio/anyio primitives are bound to the event loop that first uses them, so
+they are created lazily per loop.
+"""
+import asyncio
+import os
+import weakref
+from functools import partial
+from typing import Any, Callable, Dict
+
+import anyio.to_thread
+from anyio import CapacityLimiter
+
+# Threads allowed to run CPU-bound RAG work (embedding, local vector search) at once
+RAG_CPU_THREADS = int(os.getenv("RAG_CPU_THREADS", str(min(4, os.cpu_count() or 1))))
+# Threads allowed to run blocking I/O offloaded from the async path
+BLOCKING_IO_THREADS = int(os.getenv("BLOCKING_IO_THREADS", "32"))
+
+_per_loop: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, Any]]" = weakref.WeakKeyDictionary()
+
+
+def loop_local(name: str, factory: Callable[[], Any]) -> Any:
+    """Return the object registered under name for the running loop, creating it once."""
+    loop = asyncio.get_running_loop()
+    objects = _per_loop.setdefault(loop, {})
+    if name not in objects:
+        objects[name] = factory()
+    return objects[name]
+
+
+def pop_loop_local(name: str) -> Any:
+    """Remove and return the object registered under name for the running loop (or None)."""
+    loop = asyncio.get_running_loop()
+    return _per_loop.get(loop, {}).pop(name, None)
+
+
+def get_limiter(name: str, total_tokens: int) -> CapacityLimiter:
+    """Capacity limiter shared by every task of the running event loop."""
+    return loop_local(f"limiter:{name}", lambda: CapacityLimiter(total_tokens))
+
+
+def get_semaphore(name: str, value: int) -> asyncio.Semaphore:
+    """Semaphore shared by every task of the running event loop."""
+    return loop_local(f"semaphore:{name}", lambda: asyncio.Semaphore(value))
+
+
+async def run_cpu_bound(func: Callable, *args, **kwargs) -> Any:
+    """Run CPU-bound work (e.g. an embedding encode) in the RAG thread pool."""
+    return await anyio.to_thread.run_sync(
+        partial(func, *args, **kwargs), limiter=get_limiter("rag_cpu", RAG_CPU_THREADS)
+    )
+
+
+async def run_blocking_io(func: Callable, *args, **kwargs) -> Any:
+    """Run a blocking I/O call (sync client, legacy driver) off the event loop."""
+    return await anyio.to_thread.run_sync(
+        partial(func, *args, **kwargs), limiter=get_limiter("blocking_io", BLOCKING_IO_THREADS)
+    )
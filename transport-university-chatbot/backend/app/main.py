@@ -1,56 +1,77 @@
 import os
 import sys
 import logging
-from time import time
+from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, Depends
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
-import uvicorn
-
-# --- Logging ---
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-logger = logging.getLogger(__name__)
-
-# --- Paths ---
-CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))  # backend/app
-ROOT_DIR = os.path.dirname(os.path.dirname(CURRENT_DIR))  # transport-university-chatbot
-FRONTEND_DIR = os.path.join(ROOT_DIR, "frontend", "dist")
-
-try:
-    from app.rag.retriever import retrieve_context
-    from app.rag.generator import generate_answer
-    logger.info("✅ Import module RAG thành công.")
-except Exception as e:
-    logger.warning(f"⚠️ Không thể import RAG module: {e}")
 
 # --- Add backend to sys.path for imports ---
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))  # backend/app
 BACKEND_DIR = os.path.dirname(CURRENT_DIR)
 if BACKEND_DIR not in sys.path:
     sys.path.insert(0, BACKEND_DIR)
 
-try:
-    from app.database import SessionLocal
-    from app.models.user import User
-    from app.models.chat_history import ChatHistory
-    logger.info("✅ Database modules imported successfully.")
-except Exception as e:
-    logger.error(f"❌ Không thể import database/models: {e}")
-    sys.exit(1)
-
-# --- Database dependency ---
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+from app.config import settings
+from app.database import get_db
+from app.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, METRICS_ENABLED, registry as metrics_registry
+from app.models.user import User
+
+# --- Logging ---
+logging.basicConfig(level=settings.log_level, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# --- Paths ---
+FRONTEND_DIR = settings.frontend_dir
+
+# --- RAG preload ---
+# Các thư viện RAG nặng (langchain, openai, sentence-transformers/torch, pinecone) chỉ được
+# import trong lifespan / khi request đầu tiên cần tới, không phải lúc import app.main
+RAG_PRELOAD = settings.rag_preload
+RAG_WARMUP = settings.rag_warmup
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Nạp model embedding + vector store một lần cho mỗi worker khi khởi động."""
+    from app.services.password_hasher import password_hasher
+    password_hasher.start()
+    from app.services.chat_writer import CHAT_WRITE_BEHIND, chat_writer
+    if CHAT_WRITE_BEHIND:
+        await chat_writer.start()
+    if RAG_PRELOAD:
+        from app.rag.registry import registry
+        from app.rag.answer_cache import answer_cache
+        try:
+            await run_in_threadpool(registry.load, RAG_WARMUP)
+        except Exception as e:
+            logger.warning(f"⚠️ Không thể nạp RAG registry lúc khởi động: {e}")
+        try:
+            await run_in_threadpool(answer_cache.load_persisted)
+        except Exception as e:
+            logger.warning(f"⚠️ Không thể nạp answer cache từ DB: {e}")
+        from app.rag.faq_store import FAQ_ENABLED, faq_store
+        if FAQ_ENABLED:
+            try:
+                await run_in_threadpool(faq_store.load)
+            except Exception as e:
+                logger.warning(f"⚠️ Không thể nạp FAQ từ DB: {e}")
+    yield
+    # Flush queued chat rows before the connection pools go away
+    await chat_writer.stop()
+    password_hasher.shutdown()
+    # Đóng connection pool tới LLM (chỉ khi đã được tạo)
+    if "app.rag.llm_client" in sys.modules:
+        await sys.modules["app.rag.llm_client"].get_llm_client().aclose()
+
 
 # --- FastAPI app ---
-app = FastAPI(title="Transport University Chatbot API")
+app = FastAPI(title="Transport University Chatbot API", lifespan=lifespan)
 
 # --- CORS middleware ---
 app.add_middleware(
@@ -64,6 +85,11 @@ app.add_middleware(
 from app.middleware.auth_middleware import AuthMiddleware
 app.add_middleware(AuthMiddleware)
 
+# Added last = outermost: request latency includes auth and CORS handling
+if METRICS_ENABLED:
+    from app.middleware.metrics_middleware import MetricsMiddleware
+    app.add_middleware(MetricsMiddleware)
+
 # --- Pydantic models ---
 class ChatRequest(BaseModel):
     message: str
@@ -83,6 +109,40 @@ app.include_router(dashboard.router, prefix="/api")
 def api_root():
     return {"message": "✅ API is running successfully."}
 
+@app.get("/health")
+def health():
+    """Liveness check kèm trạng thái nạp model RAG."""
+    from app.rag.registry import registry
+    from app.rag.answer_cache import answer_cache
+    from app.rag.faq_store import faq_store
+    from app.services.chat_writer import chat_writer
+    rag_status = registry.status()
+    return {
+        "status": "ok" if rag_status["ready"] else "degraded",
+        "rag": rag_status,
+        "answer_cache": answer_cache.stats(),
+        "faq": faq_store.stats(),
+        "embedding_cache": registry.embedding_cache_stats(),
+        "reranker": registry.reranker_stats(),
+        "chat_writer": chat_writer.stats(),
+    }
+
+@app.get("/health/ready")
+def health_ready():
+    """Readiness check: 503 cho tới khi model embedding và vector store đã sẵn sàng."""
+    from app.rag.registry import registry
+    rag_status = registry.status()
+    if not rag_status["ready"]:
+        return JSONResponse(status_code=503, content={"status": "loading", "rag": rag_status})
+    return {"status": "ready", "rag": rag_status}
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus scrape endpoint (text exposition format)."""
+    if not METRICS_ENABLED:
+        return PlainTextResponse("metrics disabled\n", status_code=404)
+    return Response(content=metrics_registry.render(), media_type=METRICS_CONTENT_TYPE)
+
 @app.get("/api/users")
 def get_users(db: Session = Depends(get_db)):
     """Lấy tất cả người dùng"""
@@ -104,4 +164,6 @@ else:
 
 # --- Run app ---
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run("app.main:app", host="127.0.0.1", port=8000, reload=True)
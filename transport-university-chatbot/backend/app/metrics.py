@@ -0,0 +1,290 @@
+"""
+Prometheus metrics in the text exposition format (0.0.4), without external dependencies
+
+Hot-path updates are a dict lookup plus a short lock; values that already exist
+elsewhere (cache hit counters, pool sizes) are read by collectors only when
+/metrics is scraped, so they cost nothing per request.
+
+Usage:
+    from app.metrics import observe_stage, stage_timer
+    with stage_timer("vector_search"):
+        docs = ...
+    observe_stage("db_save", seconds)
+"""
+import math
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds: 1 ms .. 60 s (LLM calls dominate the upper range)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# (labels, value) pairs for one metric family produced by a collector
+Samples = Iterable[Tuple[Dict[str, str], float]]
+Collector = Callable[[], Iterable[Tuple[str, str, str, Samples]]]  # -> (name, type, help, samples)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self._render_samples())
+        return lines
+
+    def _render_samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _render_samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self._labels(k))} {_format_value(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [per-bucket counts (+Inf last), sum, count]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels) -> int:
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def _render_samples(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(state[0]), state[1], state[2]) for key, state in self._values.items()]
+        lines = []
+        for key, counts, total, count in items:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': _format_value(bound)})} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds metric families and scrape-time collectors; render() produces the /metrics body."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Collector] = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def register_collector(self, collector: Collector) -> None:
+        with self._lock:
+            if collector not in self._collectors:
+                self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        for collector in list(self._collectors):
+            try:
+                families = list(collector())
+            except Exception:
+                continue  # một collector lỗi không được làm hỏng cả trang /metrics
+            for name, metric_type, documentation, samples in families:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                lines.extend(f"{name}{_format_labels(labels)} {_format_value(value)}" for labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+# ============== Metric families ==============
+
+HTTP_REQUEST_DURATION = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template", ["method", "route", "status"]
+)
+HTTP_REQUESTS_IN_PROGRESS = registry.gauge("http_requests_in_progress", "HTTP requests currently being served")
+CHAT_STAGE_DURATION = registry.histogram(
+    "chat_stage_duration_seconds",
+    "Time spent in each stage of a chat request "
+    "(auth, conversation_load, condense, embedding, vector_search, rerank, llm_first_token, llm_total, db_save, db_save_batch)",
+    ["stage"],
+)
+LLM_TOKENS = registry.counter("llm_tokens_total", "LLM tokens reported by the provider", ["model", "direction"])
+DB_POOL_CHECKOUT_WAIT = registry.histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for (or opening) a pooled database connection",
+    ["engine"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0, 30.0),
+)
+DB_POOL_TIMEOUTS = registry.counter(
+    "db_pool_timeouts_total", "Checkouts that gave up after DB_POOL_TIMEOUT (pool exhausted)", ["engine"]
+)
+
+CHAT_WRITE_BATCH = registry.histogram(
+    "chat_write_batch_size",
+    "Chat rows written per write-behind flush",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500),
+)
+CHAT_WRITES = registry.counter(
+    "chat_writes_total", "Chat rows persisted, by path (queued, inline, failed)", ["path"]
+)
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    CHAT_STAGE_DURATION.observe(seconds, stage=stage)
+
+
+@contextmanager
+def stage_timer(stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        CHAT_STAGE_DURATION.observe(time.perf_counter() - started, stage=stage)
+
+
+def record_llm_usage(model: str, usage) -> None:
+    """Count input/output tokens from a Responses API `usage` object (ignored if missing)."""
+    if usage is None:
+        return
+    input_tokens = getattr(usage, "input_tokens", None)
+    output_tokens = getattr(usage, "output_tokens", None)
+    if input_tokens:
+        LLM_TOKENS.inc(input_tokens, model=model, direction="input")
+    if output_tokens:
+        LLM_TOKENS.inc(output_tokens, model=model, direction="output")
+
+
+# ============== Scrape-time collectors ==============
+
+def _cache_collector():
+    """Hit/miss counters kept by the caches themselves (only for modules already loaded)."""
+    samples = []
+
+    def add(cache: str, stats: Optional[dict], results: Dict[str, str]):
+        if stats:
+            samples.extend(({"cache": cache, "result": result}, stats.get(field, 0)) for result, field in results.items())
+
+    lru = {"hit": "hits", "miss": "misses"}
+    auth_cache = sys.modules.get("app.services.auth_cache")
+    if auth_cache is not None:
+        add("auth_token", auth_cache.token_cache.stats(), lru)
+        add("auth_user", auth_cache.user_cache.stats(), lru)
+    chat_service = sys.modules.get("app.services.chat_service")
+    if chat_service is not None:
+        add("chat_count", chat_service.chat_count_cache.stats(), lru)
+    answer_cache = sys.modules.get("app.rag.answer_cache")
+    if answer_cache is not None:
+        add("answer", answer_cache.answer_cache.stats(), {"exact": "exact_hits", "semantic": "semantic_hits", "miss": "misses"})
+    faq_store = sys.modules.get("app.rag.faq_store")
+    if faq_store is not None:
+        add("faq", faq_store.faq_store.stats(), {"exact": "exact_hits", "semantic": "semantic_hits", "miss": "misses"})
+    rag_registry = sys.modules.get("app.rag.registry")
+    if rag_registry is not None:
+        add("embedding", rag_registry.registry.embedding_cache_stats(), {"memory": "memory_hits", "disk": "disk_hits", "miss": "misses"})
+    yield "cache_lookups_total", "counter", "Cache lookups by cache and result", samples
+
+
+registry.register_collector(_cache_collector)
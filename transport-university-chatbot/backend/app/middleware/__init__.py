@@ -1,5 +1,6 @@
 """Middleware modules for the application."""
 
 from .auth_middleware import AuthMiddleware
+from .metrics_middleware import MetricsMiddleware
 
-__all__ = ["AuthMiddleware"]
+__all__ = ["AuthMiddleware", "MetricsMiddleware"]
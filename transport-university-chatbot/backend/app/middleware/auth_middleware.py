@@ -1,24 +1,41 @@
 """
 Authentication middleware for FastAPI
 Verifies JWT tokens and attaches user to request state
+
+Implemented as a plain ASGI middleware rather than a BaseHTTPMiddleware: it only
+reads the headers and writes scope["state"], so the request body and the response
+stream (e.g. Server-Sent Events) pass through untouched, with no extra task or
+stream wrapping per request.
+
+On a user-cache miss the lookup session is kept in scope["state"]["db"] and reused
+by the get_db dependency, so a request uses one sync session end to end; it is
+closed here once the response is sent.
 """
+import logging
 from typing import Optional
 from uuid import UUID
 
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.datastructures import Headers
 from starlette.requests import Request
-from starlette.responses import JSONResponse, Response
+from starlette.types import ASGIApp, Receive, Scope, Send
 from jose import JWTError
 
-from app.services.auth_service import decode_access_token
+from app.concurrency import run_blocking_io
+from app.metrics import stage_timer
+from app.services.auth_cache import UserSnapshot, get_token_claims, get_user_snapshot, user_cache
 from app.database import SessionLocal
-from app.models.user import User
+
+logger = logging.getLogger(__name__)
 
 
-class AuthMiddleware(BaseHTTPMiddleware):
+class AuthMiddleware:
     """
     Middleware to decode JWT tokens from Authorization header and attach user to request state.
     
+    Token verification and the user lookup go through app.services.auth_cache, so a
+    repeat request with the same token normally needs neither a JWT decode nor a query.
+    On a cache miss the users query runs in a worker thread, never on the event loop.
+    
     Usage: Include in FastAPI app with:
         app.add_middleware(AuthMiddleware)
     
@@ -32,93 +49,80 @@ class AuthMiddleware(BaseHTTPMiddleware):
         "/openapi.json",
         "/redoc",
         "/health",
+        "/metrics",
         "/api/auth/login",
         "/api/auth/login/json",
         "/api/auth/register",
         "/api/auth/refresh",
     ]
     
-    async def dispatch(self, request: Request, call_next) -> Response:
-        # Initialize user as None
-        request.state.user = None
-        request.state.user_id = None
-        
-        # Skip auth for public paths
-        if self._is_public_path(request.url.path):
-            return await call_next(request)
-            
-        print(f"DEBUG MIDDLEWARE: Intercepting {request.method} {request.url.path}", flush=True)
-        
-        # Extract Authorization header
-        auth_header = request.headers.get("Authorization")
-        print(f"DEBUG MIDDLEWARE: Auth Header: {auth_header}", flush=True)
+    def __init__(self, app: ASGIApp):
+        self.app = app
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
         
-        if not auth_header:
-            print("DEBUG MIDDLEWARE: Missing Auth Header", flush=True)
-            response = await call_next(request)
-            return response
+        # request.state is backed by scope["state"]
+        state = scope.setdefault("state", {})
+        state["user"] = None
+        state["user_id"] = None
+        state["db"] = None
         
-        if not auth_header.startswith("Bearer "):
-            print("DEBUG MIDDLEWARE: Header does not start with Bearer")
-            response = await call_next(request)
-            return response
+        try:
+            if not self._is_public_path(scope["path"]):
+                with stage_timer("auth"):
+                    user = await self._authenticate(Headers(scope=scope).get("authorization"), state)
+                if user is not None:
+                    state["user"] = user
+                    state["user_id"] = user.id
+            
+            await self.app(scope, receive, send)
+        finally:
+            if state["db"] is not None:
+                await run_blocking_io(state["db"].close)
+    
+    @staticmethod
+    def _request_session(state: dict):
+        """The request's shared sync session, opened on first use"""
+        if state["db"] is None:
+            state["db"] = SessionLocal()
+        return state["db"]
+    
+    async def _authenticate(self, auth_header: Optional[str], state: dict) -> Optional[UserSnapshot]:
+        """Resolve a Bearer Authorization header to an active user snapshot (or None)"""
+        if not auth_header or not auth_header.startswith("Bearer "):
+            return None
         
         token = auth_header[7:]  # Remove "Bearer " prefix
         
         try:
-            # Decode token
-            print(f"DEBUG MIDDLEWARE: Decoding token: {token[:10]}...")
-            payload = decode_access_token(token)
-            user_id_str = payload.get("sub")
-            print(f"DEBUG MIDDLEWARE: Payload sub: {user_id_str}")
-            
-            if not user_id_str:
-                print("DEBUG MIDDLEWARE: No sub in payload")
-                response = await call_next(request)
-                return response
-            
-            # Convert string to UUID
-            try:
-                user_id = UUID(user_id_str)
-            except (ValueError, TypeError):
-                print("DEBUG MIDDLEWARE: Invalid UUID format")
-                response = await call_next(request)
-                return response
-            
-            # Query user from DB
-            db = SessionLocal()
-            try:
-                user = db.query(User).filter(
-                    User.id == user_id,
-                    User.is_active == True
-                ).first()
-                
-                if user:
-                    # Attach user to request state
-                    print(f"DEBUG MIDDLEWARE: User found: {user.username}")
-                    request.state.user = user
-                    request.state.user_id = user.id
-                else:
-                    print("DEBUG MIDDLEWARE: User not found in DB")
-            finally:
-                db.close()
-                
-        except JWTError as e:
-            # Token decode failed - continue without user
-            print(f"DEBUG MIDDLEWARE: JWT Decode Error: {e}")
-            pass
-        except Exception as e:
-            # Log unexpected errors in production
-            print(f"Auth middleware error: {e}")
-            pass
+            payload = get_token_claims(token)
+            user_id = UUID(payload.get("sub"))
+        except (JWTError, ValueError, TypeError):
+            # Invalid/expired token or malformed subject - continue without user
+            return None
+        
+        try:
+            # Look up user (cached snapshot, DB only on a miss, off the event loop)
+            user = user_cache.get(user_id)
+            if user is None:
+                # get_user_snapshot closes the session after its query: the connection
+                # goes back to the pool, the session stays usable for the handler
+                user = await run_blocking_io(get_user_snapshot, user_id, lambda: self._request_session(state))
+        except Exception:
+            logger.exception("Auth middleware error")
+            return None
         
-        response = await call_next(request)
-        return response
+        if user and user.is_active:
+            return user
+        return None
     
     def _is_public_path(self, path: str) -> bool:
         """Check if the path is public and doesn't require authentication"""
         # Specific public paths
-        if path in ["/", "/health", "/favicon.ico"]:
+        if path in ["/", "/health", "/metrics", "/favicon.ico"]:
             return True
             
         # Documentation
@@ -136,7 +140,7 @@ class AuthMiddleware(BaseHTTPMiddleware):
         return False
 
 
-def get_current_user(request: Request) -> Optional[User]:
+def get_current_user(request: Request) -> Optional[UserSnapshot]:
     """
     Dependency to get current authenticated user from request state
     
@@ -166,7 +170,7 @@ def get_current_user_id(request: Request) -> Optional[UUID]:
     return getattr(request.state, "user_id", None)
 
 
-def require_auth(request: Request) -> User:
+def require_auth(request: Request) -> UserSnapshot:
     """
     Dependency that requires authentication and raises error if not authenticated
     
@@ -174,7 +178,7 @@ def require_auth(request: Request) -> User:
         from fastapi import Depends
         
         @app.get("/protected")
-        async def protected_route(user: User = Depends(require_auth)):
+        async def protected_route(user: UserSnapshot = Depends(require_auth)):
             return {"user": user.username}
     """
     from fastapi import HTTPException
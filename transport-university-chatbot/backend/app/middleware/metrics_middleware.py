@@ -0,0 +1,58 @@
+"""
+Request latency middleware
+Records http_request_duration_seconds{method, route, status} for every HTTP request
+
+Plain ASGI like AuthMiddleware: the only per-request work is two perf_counter()
+calls, wrapping `send` to read the status code and one histogram update. The
+duration covers the whole response body, so streamed (SSE) answers are measured
+until their last chunk.
+"""
+import time
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.metrics import HTTP_REQUEST_DURATION, HTTP_REQUESTS_IN_PROGRESS
+
+
+class MetricsMiddleware:
+    """
+    Middleware to time HTTP requests per route.
+    
+    The route label is the matched route template (e.g. "/api/chat/history/{chat_id}"),
+    taken from scope["route"] which FastAPI sets while routing, so ids in the URL
+    don't create one time series per value. Unrouted paths (static files, 404s)
+    are grouped under "unmatched".
+    
+    Usage: add last so it wraps every other middleware:
+        app.add_middleware(MetricsMiddleware)
+    """
+    
+    def __init__(self, app: ASGIApp):
+        self.app = app
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        status_code = 500
+        
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+        
+        HTTP_REQUESTS_IN_PROGRESS.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_REQUESTS_IN_PROGRESS.dec()
+            route = scope.get("route")
+            HTTP_REQUEST_DURATION.observe(
+                time.perf_counter() - started,
+                method=scope["method"],
+                route=getattr(route, "path", None) or "unmatched",
+                status=status_code,
+            )
@@ -2,5 +2,11 @@ from ..database import Base
 
 from .user import User
 from .chat_history import ChatHistory
+from .answer_cache import AnswerCacheEntry
+from .faq import FaqEntry
+from .stats import QuestionCluster, QuestionClusterMember, QuestionCount, StatCounter
 
-__all__ = ["Base", "User", "ChatHistory"]
+__all__ = [
+    "Base", "User", "ChatHistory", "AnswerCacheEntry", "FaqEntry",
+    "QuestionCount", "StatCounter", "QuestionCluster", "QuestionClusterMember",
+]
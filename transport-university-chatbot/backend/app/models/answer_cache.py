@@ -0,0 +1,20 @@
+from datetime import datetime
+import uuid
+from sqlalchemy import Column, DateTime, LargeBinary, String, Text, Uuid
+
+from ..database import Base
+
+
+class AnswerCacheEntry(Base):
+    """Persisted copy of the RAG answer cache (optional, see ANSWER_CACHE_PERSIST)."""
+    __tablename__ = "answer_cache"
+
+    id = Column(Uuid, primary_key=True, default=uuid.uuid4)
+    question_key = Column(String(512), unique=True, nullable=False, index=True)
+    question = Column(Text, nullable=False)
+    answer = Column(Text, nullable=False)
+    embedding = Column(LargeBinary, nullable=True)  # float32 bytes of the question embedding
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+    def __repr__(self) -> str:
+        return f"<AnswerCacheEntry key={self.question_key!r} created_at={self.created_at}>"
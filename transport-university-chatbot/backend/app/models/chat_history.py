@@ -1,6 +1,6 @@
 from datetime import datetime
 import uuid
-from sqlalchemy import Column, ForeignKey, DateTime, Text, String
+from sqlalchemy import Column, ForeignKey, DateTime, Text, String, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 
@@ -21,3 +21,14 @@ class ChatHistory(Base):
 
     def __repr__(self) -> str:
         return f"<ChatHistory id={self.id} user_id={self.user_id} role={self.role} timestamp={self.timestamp}>"
+
+
+# Keyset pagination of a user's history: WHERE user_id = ? AND (timestamp, id) < (?, ?)
+# ORDER BY timestamp DESC, id DESC is a backward scan of this index (no sort step).
+# Replaces ix_chat_history_user_timestamp_id (timestamp DESC, id ASC), dropped by init_db
+Index(
+    "ix_chat_history_user_ts_id",
+    ChatHistory.user_id,
+    ChatHistory.timestamp,
+    ChatHistory.id,
+)
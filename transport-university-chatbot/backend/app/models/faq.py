@@ -0,0 +1,27 @@
+from datetime import datetime
+import uuid
+from sqlalchemy import JSON, Boolean, Column, DateTime, LargeBinary, String, Text, Uuid
+
+from ..database import Base
+
+
+class FaqEntry(Base):
+    """Precomputed answer to a hot question (written by app.rag.faq_warmer)."""
+    __tablename__ = "faq_entries"
+
+    id = Column(Uuid, primary_key=True, default=uuid.uuid4)
+    question_key = Column(String(512), unique=True, nullable=False, index=True)  # answer_cache.normalize_question
+    question = Column(Text, nullable=False)
+    answer = Column(Text, nullable=False)
+    sources = Column(JSON, nullable=False, default=list)   # [{"id", "source", "page"}] of the context chunks
+    embedding = Column(LargeBinary, nullable=True)          # float32 bytes of the question embedding
+    embedding_model = Column(String(255), nullable=False)   # vector space of the embedding
+    stale = Column(Boolean, nullable=False, default=False, index=True)  # a source chunk changed: regenerate
+    generated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    @property
+    def source_ids(self):
+        return [source["id"] for source in self.sources or [] if source.get("id")]
+
+    def __repr__(self) -> str:
+        return f"<FaqEntry key={self.question_key!r} stale={self.stale} generated_at={self.generated_at}>"
@@ -0,0 +1,78 @@
+from datetime import date, datetime
+from sqlalchemy import BigInteger, Column, Date, DateTime, ForeignKey, Index, Integer, LargeBinary, SmallInteger, String, Text
+from sqlalchemy.dialects.postgresql import UUID
+
+from ..database import Base
+
+# `day` value of the all-time rows (rollups are otherwise bucketed per UTC day)
+ALL_TIME = date(1970, 1, 1)
+
+
+class StatCounter(Base):
+    """
+    Incrementally maintained dashboard counters (see app.services.stats_service).
+
+    One row per (name, day, shard): writers add to a random shard so concurrent
+    chat saves don't all queue on the same row lock; readers SUM the shards.
+    """
+    __tablename__ = "stat_counters"
+
+    name = Column(String(64), primary_key=True)   # "questions", "users"
+    day = Column(Date, primary_key=True)          # UTC day, or ALL_TIME
+    shard = Column(SmallInteger, primary_key=True, default=0)
+    value = Column(BigInteger, nullable=False, default=0)
+
+    def __repr__(self) -> str:
+        return f"<StatCounter {self.name} day={self.day} shard={self.shard} value={self.value}>"
+
+
+class QuestionCount(Base):
+    """
+    Per-day (and all-time) number of times each normalized question was asked.
+
+    Sharded like StatCounter, so a trending question doesn't serialize every
+    chat save on its two rows; readers SUM the shards.
+    """
+    __tablename__ = "question_counts"
+
+    day = Column(Date, primary_key=True)               # UTC day, or ALL_TIME
+    question_key = Column(String(255), primary_key=True)
+    shard = Column(SmallInteger, primary_key=True, default=0)
+    question = Column(Text, nullable=False)            # first message seen with this key (for display)
+    count = Column(BigInteger, nullable=False, default=0)
+
+    def __repr__(self) -> str:
+        return f"<QuestionCount day={self.day} key={self.question_key!r} shard={self.shard} count={self.count}>"
+
+
+class QuestionCluster(Base):
+    """Group of near-duplicate user questions (see app.rag.question_clusters)."""
+    __tablename__ = "question_clusters"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    representative = Column(Text, nullable=False)      # most asked wording among the members
+    centroid = Column(LargeBinary, nullable=False)     # float32 bytes, L2-normalized mean of the members
+    size = Column(BigInteger, nullable=False, default=0)   # user questions assigned to the cluster
+    embedding_model = Column(String(255), nullable=False)  # vector space of the centroid
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    def __repr__(self) -> str:
+        return f"<QuestionCluster id={self.id} size={self.size} representative={self.representative!r}>"
+
+
+class QuestionClusterMember(Base):
+    """Cluster assignment of one user question (chat_history row)."""
+    __tablename__ = "question_cluster_members"
+
+    chat_id = Column(UUID(as_uuid=True), ForeignKey("chat_history.id", ondelete="CASCADE"), primary_key=True)
+    cluster_id = Column(Integer, ForeignKey("question_clusters.id", ondelete="CASCADE"), nullable=False, index=True)
+    question_key = Column(String(255), nullable=False, index=True)  # stats_service.question_key of the message
+    day = Column(Date, nullable=False, index=True)                  # UTC day the question was asked
+
+    def __repr__(self) -> str:
+        return f"<QuestionClusterMember chat_id={self.chat_id} cluster_id={self.cluster_id}>"
+
+
+# Top clusters of all time: ORDER BY size DESC LIMIT k
+Index("ix_question_clusters_size", QuestionCluster.size.desc())
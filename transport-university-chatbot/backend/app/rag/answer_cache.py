@@ -0,0 +1,298 @@
+"""
+Cache câu trả lời đặt trước generate_answer.
+
+Tầng 1: khớp chính xác trên câu hỏi đã chuẩn hoá (NFC, chữ thường, gộp khoảng
+trắng, bỏ dấu câu). Giữ nguyên dấu tiếng Việt: ba / bà / bá là các từ khác nhau.
+Tầng 2: khớp ngữ nghĩa, lấy câu hỏi đã cache có embedding gần nhất nếu độ tương
+đồng cosine >= ngưỡng cấu hình và hai câu hỏi có cùng các số / mã (năm, mã ngành,
+K65...): embedding gần như không phân biệt "học phí 2023" với "học phí 2024".
+
+Cache bị xoá mỗi khi vector index được build lại (câu trả lời cũ có thể dựa trên
+dữ liệu cũ).
+"""
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from dataclasses import dataclass
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from ..cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_MAXSIZE = int(os.getenv("ANSWER_CACHE_MAXSIZE", "1000"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "86400"))
+# Đặt rỗng để tắt tầng ngữ nghĩa
+ANSWER_CACHE_SIMILARITY = os.getenv("ANSWER_CACHE_SIMILARITY", "0.92")
+ANSWER_CACHE_PERSIST = os.getenv("ANSWER_CACHE_PERSIST", "false").lower() == "true"
+
+_PUNCTUATION = re.compile(r"[^\w\s]", re.UNICODE)
+_WHITESPACE = re.compile(r"\s+")
+# Token có chữ số (2024, K65, 7480201) hoặc viết hoa toàn bộ (CNTT, KTX)
+_CODE = re.compile(r"\b(?:\w*\d\w*|[A-ZĐ]{2,})\b", re.UNICODE)
+
+
+def normalize_question(text: str) -> str:
+    """Chuẩn hoá câu hỏi: NFC, chữ thường, bỏ dấu câu, gộp khoảng trắng (giữ dấu tiếng Việt)."""
+    text = unicodedata.normalize("NFC", text).lower()
+    text = _PUNCTUATION.sub(" ", text)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def question_codes(text: str) -> frozenset:
+    """Các số / mã trong câu hỏi; tầng ngữ nghĩa chỉ trả lời thay khi hai câu hỏi có cùng tập này."""
+    return frozenset(code.lower() for code in _CODE.findall(unicodedata.normalize("NFC", text)))
+
+
+def best_semantic_match(scores: np.ndarray, threshold: float, questions: List[str], question: Optional[str]) -> Optional[int]:
+    """
+    Vị trí câu hỏi gần nhất có độ tương đồng >= threshold và cùng số / mã với question
+    (question None: không kiểm tra mã), None nếu không có
+    """
+    codes = question_codes(question) if question is not None else None
+    for index in np.argsort(-scores):
+        if scores[index] < threshold:
+            break
+        if codes is None or question_codes(questions[index]) == codes:
+            return int(index)
+    return None
+
+
+@dataclass
+class CachedAnswer:
+    question: str
+    answer: str
+    embedding: Optional[np.ndarray]
+    created_at: float
+
+
+class CacheLookup(NamedTuple):
+    answer: Optional[str]
+    tier: Optional[str]               # "exact" | "semantic" | None
+    embedding: Optional[np.ndarray]   # embedding câu hỏi (tái sử dụng khi store)
+
+
+class AnswerCache:
+    """
+    Two-tier (exact + semantic) answer cache with LRU/TTL eviction.
+
+    Usage:
+        lookup = answer_cache.lookup(question)
+        if lookup.answer is None:
+            answer = ...  # retrieval + LLM
+            answer_cache.store(question, answer, embedding=lookup.embedding)
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1000,
+        ttl: Optional[float] = 86400,
+        semantic_threshold: Optional[float] = 0.92,
+        persist: bool = False,
+        embed_fn=None,
+    ):
+        self._entries = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.ttl = ttl
+        self.semantic_threshold = semantic_threshold
+        self.persist = persist
+        self._embed_fn = embed_fn
+        self._lock = threading.Lock()
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_keys: List[str] = []
+        self._matrix_questions: List[str] = []
+        self._dirty = True
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    # ============== Embedding ==============
+
+    def _embed(self, question: str) -> Optional[np.ndarray]:
+        try:
+            if self._embed_fn is not None:
+                vector = self._embed_fn(question)
+            else:
+                from .registry import registry
+                vector = registry.get_embeddings().embed_query(question)
+        except Exception as e:
+            logger.warning(f"⚠️ Answer cache: không thể embed câu hỏi, bỏ qua tầng ngữ nghĩa: {e}")
+            return None
+        return self._normalize(vector)
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _semantic_matrix(self):
+        with self._lock:
+            if self._dirty:
+                keys, questions, vectors = [], [], []
+                for key, entry in self._entries.items():
+                    if entry.embedding is not None:
+                        keys.append(key)
+                        questions.append(entry.question)
+                        vectors.append(entry.embedding)
+                self._matrix_keys = keys
+                self._matrix_questions = questions
+                self._matrix = np.vstack(vectors) if vectors else None
+                self._dirty = False
+            return self._matrix_keys, self._matrix_questions, self._matrix
+
+    # ============== Public API ==============
+
+    def lookup(self, question: str) -> CacheLookup:
+        exact = self._lookup_exact(question)
+        if exact is not None:
+            return exact
+        if self.semantic_threshold is None:
+            self.misses += 1
+            return CacheLookup(None, None, None)
+        return self._lookup_semantic(question, self._embed(question))
+
+    async def alookup(self, question: str, aembed_fn) -> CacheLookup:
+        """
+        Bản async của lookup: embed câu hỏi bằng aembed_fn (vd. bộ gom lô embedding)
+        thay vì encode đồng bộ.
+        """
+        exact = self._lookup_exact(question)
+        if exact is not None:
+            return exact
+        if self.semantic_threshold is None:
+            self.misses += 1
+            return CacheLookup(None, None, None)
+        try:
+            embedding = self._normalize(await aembed_fn(question))
+        except Exception as e:
+            logger.warning(f"⚠️ Answer cache: không thể embed câu hỏi, bỏ qua tầng ngữ nghĩa: {e}")
+            embedding = None
+        return self._lookup_semantic(question, embedding)
+
+    def _lookup_exact(self, question: str) -> Optional[CacheLookup]:
+        entry = self._entries.get(normalize_question(question))
+        if entry is None:
+            return None
+        self.exact_hits += 1
+        return CacheLookup(entry.answer, "exact", entry.embedding)
+
+    def _lookup_semantic(self, question: str, embedding: Optional[np.ndarray]) -> CacheLookup:
+        if embedding is not None:
+            keys, questions, matrix = self._semantic_matrix()
+            if matrix is not None:
+                best = best_semantic_match(matrix @ embedding, self.semantic_threshold, questions, question)
+                entry = self._entries.get(keys[best]) if best is not None else None
+                if entry is not None:
+                    self.semantic_hits += 1
+                    return CacheLookup(entry.answer, "semantic", embedding)
+
+        self.misses += 1
+        return CacheLookup(None, None, embedding)
+
+    def store(self, question: str, answer: str, embedding: Optional[np.ndarray] = None) -> None:
+        key = normalize_question(question)
+        if not key or not answer:
+            return
+        if embedding is None and self.semantic_threshold is not None:
+            embedding = self._embed(question)
+        self._entries.set(key, CachedAnswer(question, answer, embedding, time.time()))
+        self._dirty = True
+        if self.persist:
+            self._persist(key, question, answer, embedding)
+
+    def invalidate(self) -> None:
+        """Xoá toàn bộ cache (gọi sau khi vector index được build lại)."""
+        self._entries.clear()
+        self._dirty = True
+        self.invalidations += 1
+        if self.persist:
+            self._purge_persisted()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        hits = self.exact_hits + self.semantic_hits
+        return {
+            "size": len(self._entries),
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "llm_calls_saved": hits,
+            "evictions": self._entries.evictions,
+            "invalidations": self.invalidations,
+        }
+
+    # ============== Postgres persistence ==============
+
+    def load_persisted(self) -> int:
+        """Nạp các entry còn hạn từ bảng answer_cache (gọi lúc khởi động)."""
+        if not self.persist:
+            return 0
+        from datetime import datetime, timedelta
+        from ..database import SessionLocal
+        from ..models.answer_cache import AnswerCacheEntry
+
+        db = SessionLocal()
+        try:
+            query = db.query(AnswerCacheEntry)
+            if self.ttl is not None:
+                query = query.filter(AnswerCacheEntry.created_at >= datetime.utcnow() - timedelta(seconds=self.ttl))
+            rows = query.order_by(AnswerCacheEntry.created_at.desc()).limit(self._entries.maxsize).all()
+            for row in reversed(rows):
+                embedding = np.frombuffer(row.embedding, dtype=np.float32) if row.embedding else None
+                self._entries.set(row.question_key, CachedAnswer(row.question, row.answer, embedding, time.time()))
+            self._dirty = True
+            return len(rows)
+        finally:
+            db.close()
+
+    def _persist(self, key: str, question: str, answer: str, embedding: Optional[np.ndarray]) -> None:
+        from datetime import datetime
+        from ..database import SessionLocal
+        from ..models.answer_cache import AnswerCacheEntry
+
+        db = SessionLocal()
+        try:
+            row = db.query(AnswerCacheEntry).filter(AnswerCacheEntry.question_key == key).first()
+            if row is None:
+                row = AnswerCacheEntry(question_key=key)
+                db.add(row)
+            row.question = question
+            row.answer = answer
+            row.embedding = embedding.astype(np.float32).tobytes() if embedding is not None else None
+            row.created_at = datetime.utcnow()
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"⚠️ Answer cache: không thể lưu vào DB: {e}")
+        finally:
+            db.close()
+
+    def _purge_persisted(self) -> None:
+        from ..database import SessionLocal
+        from ..models.answer_cache import AnswerCacheEntry
+
+        db = SessionLocal()
+        try:
+            db.query(AnswerCacheEntry).delete()
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"⚠️ Answer cache: không thể xoá cache trong DB: {e}")
+        finally:
+            db.close()
+
+
+answer_cache = AnswerCache(
+    maxsize=ANSWER_CACHE_MAXSIZE,
+    ttl=ANSWER_CACHE_TTL_SECONDS,
+    semantic_threshold=float(ANSWER_CACHE_SIMILARITY) if ANSWER_CACHE_SIMILARITY else None,
+    persist=ANSWER_CACHE_PERSIST,
+)
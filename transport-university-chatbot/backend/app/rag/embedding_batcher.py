@@ -0,0 +1,150 @@
+"""
+Gom lô các lần encode câu hỏi đồng thời (micro-batching).
+
+Khi nhiều request chat đến cùng lúc, mỗi request encode một câu hỏi riêng lẻ, bỏ phí
+hiệu quả tính theo lô (SIMD/BLAS) của CPU. EmbeddingBatcher gom các yêu cầu encode
+trong một cửa sổ vài mili-giây (hoặc tới EMBEDDING_BATCH_SIZE câu), encode một lần
+bằng embed_documents trong thread pool RAG, rồi trả kết quả cho từng future.
+
+Câu hỏi đã có trong embedding cache được trả ngay, không vào lô.
+"""
+import asyncio
+import logging
+import os
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..concurrency import loop_local, run_cpu_bound
+from ..metrics import stage_timer
+from .embedding_cache import CachedEmbeddings
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_BATCH_ENABLED = os.getenv("EMBEDDING_BATCH_ENABLED", "true").lower() == "true"
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+EMBEDDING_BATCH_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_WAIT_MS", "3"))
+
+EmbedBatchFn = Callable[[List[str]], Sequence[Sequence[float]]]
+
+
+class EmbeddingBatcher:
+    """
+    Collects concurrent encode requests on one event loop into batches.
+
+    A batch is flushed when it reaches max_batch_size items or max_wait_ms after
+    its first item arrived, whichever comes first. Identical texts within a batch
+    are encoded once.
+
+    Usage:
+        batcher = EmbeddingBatcher(model.embed_documents, max_batch_size=32, max_wait_ms=3)
+        vector = await batcher.embed(question)
+    """
+
+    def __init__(
+        self,
+        embed_batch: EmbedBatchFn,
+        max_batch_size: int = EMBEDDING_BATCH_SIZE,
+        max_wait_ms: float = EMBEDDING_BATCH_WAIT_MS,
+        run: Optional[Callable[..., Any]] = None,
+    ):
+        self.embed_batch = embed_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        # Coroutine chạy hàm encode (mặc định: thread pool RAG)
+        self._run = run or run_cpu_bound
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+
+    async def embed(self, text: str) -> List[float]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        task = asyncio.get_running_loop().create_task(self._encode(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _encode(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        texts = list(dict.fromkeys(text for text, _ in batch))
+        self.batches += 1
+        self.items += len(batch)
+        self.largest_batch = max(self.largest_batch, len(texts))
+        try:
+            vectors = await self._run(self.embed_batch, texts)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        by_text = dict(zip(texts, vectors))
+        for text, future in batch:
+            # Caller có thể đã bị huỷ (client ngắt kết nối)
+            if not future.done():
+                future.set_result(by_text[text])
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+        }
+
+
+def _split_cache(embeddings) -> Tuple[Any, Any]:
+    """(model gốc, embedding cache hoặc None) từ embeddings của registry."""
+    if isinstance(embeddings, CachedEmbeddings):
+        return embeddings.embeddings, embeddings.cache
+    return embeddings, None
+
+
+def get_batcher() -> EmbeddingBatcher:
+    """Batcher của event loop hiện tại, encode bằng model dùng chung của registry."""
+    from .registry import registry
+
+    def embed_batch(texts):
+        model, _ = _split_cache(registry.get_embeddings())
+        return model.embed_documents(texts)
+
+    return loop_local("embedding_batcher", lambda: EmbeddingBatcher(embed_batch))
+
+
+async def aembed_query(text: str) -> List[float]:
+    """
+    Embedding của một câu hỏi cho đường async: lấy từ cache nếu có, nếu không thì
+    encode chung lô với các request đồng thời (hoặc riêng lẻ nếu tắt batching).
+    """
+    from .registry import registry
+
+    embeddings = registry.get_embeddings()
+    with stage_timer("embedding"):
+        if not EMBEDDING_BATCH_ENABLED:
+            return await run_cpu_bound(embeddings.embed_query, text)
+
+        _, cache = _split_cache(embeddings)
+        if cache is None:
+            return await get_batcher().embed(text)
+        vector = cache.get(text)
+        if vector is None:
+            # Cùng khoá với CachedEmbeddings.embed_query; encode câu hỏi gốc
+            vector = cache.put(text, await get_batcher().embed(text))
+        return vector.astype(np.float32).tolist()
@@ -0,0 +1,260 @@
+"""
+Cache embedding câu hỏi, đặt trước model embedding (encode trên CPU).
+
+Khoá là câu hỏi đã chuẩn hoá nhẹ (NFC, chữ thường, gộp khoảng trắng; giữ dấu tiếng
+Việt vì dấu đổi nghĩa). Khoá chỉ dùng để tra cache: model luôn encode câu hỏi gốc,
+nên vector khi cache miss giống hệt đường không cache. Vector được lưu dạng float16 (một nửa bộ nhớ, sai số không
+đáng kể với cosine):
+
+- Tầng bộ nhớ: LRU có giới hạn.
+- Tầng đĩa (tuỳ chọn, EMBEDDING_CACHE_SPILL_DIR): vòng đệm float16 memory-mapped có
+  dung lượng cố định, ghi xuyên (write-through) nên còn nguyên sau khi khởi động lại.
+
+Cấu trúc thư mục spill:
+    meta.json     {"namespace", "dim", "capacity"}; khác model/dung lượng -> xoá làm lại
+    vectors.f16   ma trận (capacity, dim) float16, mở bằng np.memmap
+    keys.log      mỗi dòng [slot, key], dòng sau ghi đè dòng trước
+"""
+import json
+import logging
+import os
+import re
+import threading
+import unicodedata
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from ..cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "20000"))
+# Để trống để chỉ dùng tầng bộ nhớ
+EMBEDDING_CACHE_SPILL_DIR = os.getenv("EMBEDDING_CACHE_SPILL_DIR", "")
+EMBEDDING_CACHE_SPILL_CAPACITY = int(os.getenv("EMBEDDING_CACHE_SPILL_CAPACITY", "100000"))
+
+META_FILE = "meta.json"
+VECTORS_FILE = "vectors.f16"
+KEYS_FILE = "keys.log"
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(text: str) -> str:
+    """Chuẩn hoá câu hỏi làm khoá cache: NFC, chữ thường, gộp khoảng trắng."""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text).lower()).strip()
+
+
+class EmbeddingCache:
+    """
+    Two-tier (LRU memory + memory-mapped disk ring) cache of float16 vectors.
+
+    Usage:
+        cache = EmbeddingCache(maxsize=20000, spill_dir="/var/cache/emb", namespace=model_name)
+        vector = cache.get_or_compute(question, embeddings.embed_query)
+    """
+
+    def __init__(
+        self,
+        maxsize: int = EMBEDDING_CACHE_SIZE,
+        spill_dir: Optional[str] = None,
+        spill_capacity: int = EMBEDDING_CACHE_SPILL_CAPACITY,
+        namespace: str = "",
+    ):
+        self._memory = LRUCache(maxsize=maxsize)
+        self.spill_dir = spill_dir or None
+        self.spill_capacity = spill_capacity
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self._vectors: Optional[np.memmap] = None
+        self._slots: Dict[str, int] = {}
+        self._slot_keys: List[Optional[str]] = []
+        self._next_slot = 0
+        self._log_lines = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if self.spill_dir:
+            try:
+                self._open_spill()
+            except Exception as e:
+                logger.warning(f"⚠️ Embedding cache: không mở được spill '{self.spill_dir}', chỉ dùng bộ nhớ: {e}")
+                self.spill_dir = None
+
+    # ============== Disk spill ==============
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.spill_dir, name)
+
+    def _open_spill(self) -> None:
+        os.makedirs(self.spill_dir, exist_ok=True)
+        meta = None
+        if os.path.exists(self._path(META_FILE)):
+            with open(self._path(META_FILE), encoding="utf-8") as f:
+                meta = json.load(f)
+        if not meta or meta.get("namespace") != self.namespace or meta.get("capacity") != self.spill_capacity:
+            self._reset_spill()
+            return
+        self._vectors = np.memmap(
+            self._path(VECTORS_FILE), dtype=np.float16, mode="r+", shape=(self.spill_capacity, meta["dim"])
+        )
+        self._slot_keys = [None] * self.spill_capacity
+        if os.path.exists(self._path(KEYS_FILE)):
+            with open(self._path(KEYS_FILE), encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        slot, key = json.loads(line)
+                    except ValueError:
+                        continue  # dòng cuối bị ghi dở
+                    self._assign(slot, key)
+                    self._next_slot = (slot + 1) % self.spill_capacity
+                    self._log_lines += 1
+
+    def _reset_spill(self) -> None:
+        for name in (META_FILE, VECTORS_FILE, KEYS_FILE):
+            if os.path.exists(self._path(name)):
+                os.remove(self._path(name))
+        self._vectors = None
+        self._slots, self._slot_keys = {}, [None] * self.spill_capacity
+        self._next_slot = 0
+        self._log_lines = 0
+
+    def _create_vectors(self, dim: int) -> None:
+        self._vectors = np.memmap(
+            self._path(VECTORS_FILE), dtype=np.float16, mode="w+", shape=(self.spill_capacity, dim)
+        )
+        with open(self._path(META_FILE), "w", encoding="utf-8") as f:
+            json.dump({"namespace": self.namespace, "dim": dim, "capacity": self.spill_capacity}, f)
+
+    def _assign(self, slot: int, key: str) -> None:
+        old = self._slot_keys[slot]
+        if old is not None and self._slots.get(old) == slot:
+            del self._slots[old]
+        previous_slot = self._slots.get(key)
+        if previous_slot is not None:
+            self._slot_keys[previous_slot] = None
+        self._slot_keys[slot] = key
+        self._slots[key] = slot
+
+    def _spill_get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            slot = self._slots.get(key)
+            if slot is None or self._vectors is None:
+                return None
+            return np.array(self._vectors[slot])
+
+    def _spill_put(self, key: str, vector: np.ndarray) -> None:
+        with self._lock:
+            if key in self._slots:
+                return
+            if self._vectors is None:
+                self._create_vectors(vector.shape[0])
+            elif self._vectors.shape[1] != vector.shape[0]:
+                return
+            slot = self._next_slot
+            self._next_slot = (slot + 1) % self.spill_capacity
+            self._vectors[slot] = vector
+            self._assign(slot, key)
+            if self._log_lines >= 2 * self.spill_capacity:
+                self._compact_log()
+            else:
+                with open(self._path(KEYS_FILE), "a", encoding="utf-8") as f:
+                    f.write(json.dumps([slot, key], ensure_ascii=False) + "\n")
+                self._log_lines += 1
+
+    def _compact_log(self) -> None:
+        """Ghi lại keys.log chỉ với các slot còn dùng, theo thứ tự ghi (slot cũ nhất trước)."""
+        order = sorted(self._slots.items(), key=lambda item: (item[1] - self._next_slot) % self.spill_capacity)
+        tmp = self._path(KEYS_FILE + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            for key, slot in order:
+                f.write(json.dumps([slot, key], ensure_ascii=False) + "\n")
+        os.replace(tmp, self._path(KEYS_FILE))
+        self._log_lines = len(order)
+
+    # ============== Public API ==============
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        """Vector float16 đã cache cho câu hỏi, hoặc None."""
+        key = normalize_query(text)
+        vector = self._memory.get(key)
+        if vector is not None:
+            self.memory_hits += 1
+            return vector
+        if self.spill_dir:
+            vector = self._spill_get(key)
+            if vector is not None:
+                self.disk_hits += 1
+                self._memory.set(key, vector)
+                return vector
+        self.misses += 1
+        return None
+
+    def put(self, text: str, vector) -> np.ndarray:
+        key = normalize_query(text)
+        vector = np.asarray(vector, dtype=np.float16)
+        self._memory.set(key, vector)
+        if self.spill_dir:
+            try:
+                self._spill_put(key, vector)
+            except Exception as e:
+                logger.warning(f"⚠️ Embedding cache: không ghi được spill: {e}")
+        return vector
+
+    def get_or_compute(self, text: str, compute: Callable[[str], Any]) -> np.ndarray:
+        """Vector của câu hỏi; chỉ gọi compute (encode) khi chưa có trong cache."""
+        vector = self.get(text)
+        if vector is None:
+            vector = self.put(text, compute(text))
+        return vector
+
+    def clear(self) -> None:
+        self._memory.clear()
+        if self.spill_dir:
+            with self._lock:
+                self._reset_spill()
+
+    def __len__(self) -> int:
+        return len(self._memory)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        hits = self.memory_hits + self.disk_hits
+        return {
+            "size": len(self._memory),
+            "maxsize": self._memory.maxsize,
+            "spill_size": len(self._slots) if self.spill_dir else None,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "evictions": self._memory.evictions,
+        }
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    LangChain Embeddings wrapper that serves embed_query from an EmbeddingCache.
+
+    embed_documents (ingestion) is passed through uncached.
+    """
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache):
+        self.embeddings = embeddings
+        self.cache = cache
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = self.cache.get_or_compute(text, self.embeddings.embed_query)
+        return vector.astype(np.float32).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def __getattr__(self, name):
+        # Thuộc tính riêng của model gốc (model_name, client...)
+        if name == "embeddings":
+            raise AttributeError(name)
+        return getattr(self.embeddings, name)
@@ -0,0 +1,289 @@
+"""
+Kho câu trả lời FAQ tính sẵn, đặt trước answer cache trong pipeline.
+
+Các câu hỏi nóng (cụm câu hỏi lớn nhất, xem question_clusters.py) được faq_warmer.py
+trả lời offline và lưu vào bảng faq_entries kèm id các chunk nguồn. Khi chat, câu hỏi
+khớp chính xác (đã chuẩn hoá) hoặc gần nghĩa (cosine >= FAQ_SIMILARITY, cùng các số / mã)
+với một FAQ được trả lời ngay, không truy xuất, không gọi LLM.
+
+Một FAQ hết hạn khi một chunk nguồn của nó không còn trong index (file/trang đã sửa
+hoặc bị xoá), hoặc khi index có thêm chunk mới sau lúc nó được sinh (tài liệu mới có
+thể đổi câu trả lời), theo manifest của ingest.py: worker không phục vụ nó nữa ngay ở
+lần nạp lại kế tiếp, và faq_warmer.py sinh lại nó ở lần chạy sau.
+"""
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Set
+
+import numpy as np
+
+from .answer_cache import best_semantic_match, normalize_question
+
+logger = logging.getLogger(__name__)
+
+FAQ_ENABLED = os.getenv("FAQ_ENABLED", "true").lower() == "true"
+FAQ_SIMILARITY = float(os.getenv("FAQ_SIMILARITY", "0.9"))
+# Worker nạp lại bảng faq_entries sau mỗi khoảng này (lấy FAQ mới từ warmer)
+FAQ_RELOAD_SECONDS = float(os.getenv("FAQ_RELOAD_SECONDS", "300"))
+
+
+class IndexState(NamedTuple):
+    chunk_ids: Optional[Set[str]]         # id các chunk đang có trong index
+    added_at: Optional[datetime]          # lần ingest gần nhất có thêm chunk mới (UTC)
+
+
+def index_state(manifest_path: Optional[str] = None) -> IndexState:
+    """Trạng thái index theo manifest của ingest, (None, None) nếu chưa có manifest."""
+    from .ingest import default_manifest_path, load_manifest
+    from .vector_store import VECTOR_BACKEND
+
+    path = manifest_path or default_manifest_path(VECTOR_BACKEND)
+    if not os.path.exists(path):
+        return IndexState(None, None)
+    manifest = load_manifest(path)
+    files = manifest.get("files", {})
+    added_at = manifest.get("chunks_added_at")
+    return IndexState(
+        {doc_id for entry in files.values() for doc_id in entry.get("chunks", [])},
+        datetime.fromisoformat(added_at) if added_at else None,
+    )
+
+
+def is_stale(
+    source_ids: Iterable[str],
+    chunk_ids: Optional[Set[str]],
+    generated_at: Optional[datetime] = None,
+    added_at: Optional[datetime] = None,
+) -> bool:
+    """
+    FAQ hết hạn nếu có chunk nguồn không còn trong index, hoặc nếu được sinh trước lần
+    index có thêm chunk mới (không kiểm tra được nếu chunk_ids / added_at là None)
+    """
+    if added_at is not None and generated_at is not None and generated_at < added_at:
+        return True
+    return chunk_ids is not None and any(doc_id not in chunk_ids for doc_id in source_ids)
+
+
+@dataclass
+class FaqAnswer:
+    question: str
+    answer: str
+    sources: List[Dict[str, Any]]
+    embedding: Optional[np.ndarray]
+
+
+class FaqMatch(NamedTuple):
+    answer: Optional[str]
+    tier: Optional[str]                   # "exact" | "semantic" | None
+    sources: List[Dict[str, Any]]
+
+
+MISS = FaqMatch(None, None, [])
+
+
+class FaqStore:
+    """
+    In-memory view of the faq_entries table (exact + semantic lookup).
+
+    Usage:
+        faq_store.load()                         # at startup, then reloaded every reload_seconds
+        match = await faq_store.alookup(question, aembed_fn)
+        if match.answer is not None:
+            ...                                  # served without retrieval / LLM
+    """
+
+    def __init__(self, semantic_threshold: float = 0.9, reload_seconds: Optional[float] = 300, embed_fn=None):
+        self.semantic_threshold = semantic_threshold
+        self.reload_seconds = reload_seconds
+        self._embed_fn = embed_fn
+        self._lock = threading.Lock()
+        self._entries: Dict[str, FaqAnswer] = {}
+        self._keys: List[str] = []
+        self._matrix: Optional[np.ndarray] = None
+        self._loaded_at: Optional[float] = None
+        self._reloading = False
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.reloads = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # ============== Loading ==============
+
+    def set_entries(self, entries: Dict[str, FaqAnswer]) -> None:
+        """Thay toàn bộ nội dung (key = normalize_question)."""
+        keys = [key for key, entry in entries.items() if entry.embedding is not None]
+        matrix = np.vstack([entries[key].embedding for key in keys]) if keys else None
+        with self._lock:
+            self._entries, self._keys, self._matrix = dict(entries), keys, matrix
+            self._loaded_at = time.monotonic()
+
+    def load(
+        self,
+        session_factory=None,
+        namespace: Optional[str] = None,
+        chunk_ids: Optional[Set[str]] = None,
+        added_at: Optional[datetime] = None,
+    ) -> int:
+        """
+        Nạp các FAQ còn hiệu lực từ DB
+        Args:
+            session_factory: Tạo Session DB (mặc định SessionLocal)
+            namespace: Không gian vector của model embedding hiện tại (mặc định theo EMBEDDING_MODEL)
+            chunk_ids: Id chunk đang có trong index (mặc định đọc từ manifest, cùng added_at)
+            added_at: Lần gần nhất index có thêm chunk mới
+        Returns:
+            Số FAQ đã nạp
+        """
+        from ..models.faq import FaqEntry
+
+        if session_factory is None:
+            from ..database import SessionLocal as session_factory
+        if namespace is None:
+            from .registry import EMBEDDING_MODEL
+            from .vector_store import embedding_namespace
+
+            namespace = embedding_namespace(EMBEDDING_MODEL)
+        if chunk_ids is None:
+            chunk_ids, added_at = index_state()
+
+        db = session_factory()
+        try:
+            rows = db.query(FaqEntry).filter(FaqEntry.stale.is_(False)).all()
+        finally:
+            db.close()
+        entries = {}
+        for row in rows:
+            if is_stale(row.source_ids, chunk_ids, row.generated_at, added_at):
+                continue
+            # Embedding của model khác không so được: chỉ còn khớp chính xác cho tới khi warmer chạy lại
+            embedding = (
+                np.frombuffer(row.embedding, dtype=np.float32)
+                if row.embedding and row.embedding_model == namespace else None
+            )
+            entries[row.question_key] = FaqAnswer(row.question, row.answer, list(row.sources or []), embedding)
+        self.set_entries(entries)
+        self.reloads += 1
+        return len(entries)
+
+    def _reload_due(self) -> bool:
+        return (
+            self._loaded_at is not None and self.reload_seconds is not None and not self._reloading
+            and time.monotonic() - self._loaded_at >= self.reload_seconds
+        )
+
+    def _reload(self) -> None:
+        self._reloading = True
+        try:
+            self.load()
+        except Exception as e:
+            # Giữ bản cũ, thử lại sau reload_seconds
+            self._loaded_at = time.monotonic()
+            logger.warning(f"⚠️ FAQ: không thể nạp lại từ DB: {e}")
+        finally:
+            self._reloading = False
+
+    def invalidate_sources(self, chunk_ids: Optional[Iterable[str]] = None) -> None:
+        """
+        Bỏ (trong process hiện tại) các FAQ dựa trên các chunk đã bị xoá/sửa, hoặc tất cả
+        nếu chunk_ids là None (index được build lại từ đầu). Bản ghi DB do warmer cập nhật.
+        """
+        if chunk_ids is None:
+            self.set_entries({})
+            return
+        removed = set(chunk_ids)
+        self.set_entries({
+            key: entry for key, entry in self._entries.items()
+            if not any(source.get("id") in removed for source in entry.sources)
+        })
+
+    # ============== Lookup ==============
+
+    def _lookup_exact(self, question: str) -> Optional[FaqMatch]:
+        entry = self._entries.get(normalize_question(question))
+        if entry is None:
+            return None
+        self.exact_hits += 1
+        return FaqMatch(entry.answer, "exact", entry.sources)
+
+    def _lookup_semantic(self, question: str, embedding) -> FaqMatch:
+        matrix, keys, entries = self._matrix, self._keys, self._entries
+        if embedding is not None and matrix is not None:
+            embedding = np.asarray(embedding, dtype=np.float32)
+            norm = np.linalg.norm(embedding)
+            scores = matrix @ (embedding / norm if norm else embedding)
+            questions = [entries[key].question if key in entries else "" for key in keys]
+            best = best_semantic_match(scores, self.semantic_threshold, questions, question)
+            entry = entries.get(keys[best]) if best is not None else None
+            if entry is not None:
+                self.semantic_hits += 1
+                return FaqMatch(entry.answer, "semantic", entry.sources)
+        self.misses += 1
+        return MISS
+
+    def lookup(self, question: str) -> FaqMatch:
+        if self._reload_due():
+            self._reload()
+        if not self._entries:
+            return MISS
+        exact = self._lookup_exact(question)
+        if exact is not None:
+            return exact
+        if self._matrix is None:
+            self.misses += 1
+            return MISS
+        try:
+            if self._embed_fn is not None:
+                embedding = self._embed_fn(question)
+            else:
+                from .registry import registry
+                embedding = registry.get_embeddings().embed_query(question)
+        except Exception as e:
+            logger.warning(f"⚠️ FAQ: không thể embed câu hỏi, bỏ qua tầng ngữ nghĩa: {e}")
+            embedding = None
+        return self._lookup_semantic(question, embedding)
+
+    async def alookup(self, question: str, aembed_fn) -> FaqMatch:
+        """
+        Bản async của lookup: embed bằng aembed_fn (vd. bộ gom lô embedding, kết quả
+        được cache nên answer cache phía sau không phải encode lại), nạp lại DB trong thread.
+        """
+        if self._reload_due():
+            from ..concurrency import run_blocking_io
+
+            await run_blocking_io(self._reload)
+        if not self._entries:
+            return MISS
+        exact = self._lookup_exact(question)
+        if exact is not None:
+            return exact
+        if self._matrix is None:
+            self.misses += 1
+            return MISS
+        try:
+            embedding = await aembed_fn(question)
+        except Exception as e:
+            logger.warning(f"⚠️ FAQ: không thể embed câu hỏi, bỏ qua tầng ngữ nghĩa: {e}")
+            embedding = None
+        return self._lookup_semantic(question, embedding)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        hits = self.exact_hits + self.semantic_hits
+        return {
+            "size": len(self._entries),
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "reloads": self.reloads,
+        }
+
+
+faq_store = FaqStore(semantic_threshold=FAQ_SIMILARITY, reload_seconds=FAQ_RELOAD_SECONDS)
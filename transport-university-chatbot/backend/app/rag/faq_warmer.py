@@ -0,0 +1,202 @@
+"""
+Tính sẵn câu trả lời cho các câu hỏi nóng (FAQ), chạy offline vào giờ thấp điểm.
+
+- Lấy top-N câu hỏi đại diện của các cụm câu hỏi lớn nhất (stats_service.hot_intents,
+  chạy question_clusters.py trước để có cụm; nếu chưa có thì dùng câu hỏi hay gặp nhất).
+- Đánh dấu hết hạn các FAQ có chunk nguồn không còn trong index, hoặc sinh trước lần
+  index có thêm chunk mới (theo manifest của ingest).
+- Với mỗi câu hỏi chưa có FAQ / FAQ đã hết hạn / đổi model embedding: truy xuất + sinh
+  câu trả lời như khi chat, kiểm tra (có nội dung, có nguồn, không phải câu "chưa có
+  thông tin") rồi lưu vào faq_entries kèm id các chunk nguồn.
+- Xoá các FAQ hết hạn không còn nằm trong top-N.
+
+Các worker nạp lại FAQ sau FAQ_RELOAD_SECONDS (xem faq_store.py).
+
+Chạy từ thư mục backend (vd. cron lúc 2h sáng, sau question_clusters.py):
+    python -m app.rag.faq_warmer                 # top FAQ_WARM_TOP_N câu hỏi
+    python -m app.rag.faq_warmer --top 100 --window 30d
+    python -m app.rag.faq_warmer --force         # sinh lại cả các FAQ còn hiệu lực
+    python -m app.rag.faq_warmer --dry-run       # chỉ báo cáo những gì sẽ làm
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Set
+
+import numpy as np
+
+from .answer_cache import normalize_question
+from .faq_store import index_state, is_stale
+
+logger = logging.getLogger(__name__)
+
+FAQ_WARM_TOP_N = int(os.getenv("FAQ_WARM_TOP_N", "50"))
+FAQ_WARM_WINDOW = os.getenv("FAQ_WARM_WINDOW", "30d")
+# Giờ thấp điểm (giờ máy chủ), vd. "1-5" hoặc "23-4"; rỗng = chạy bất cứ lúc nào
+FAQ_WARM_QUIET_HOURS = os.getenv("FAQ_WARM_QUIET_HOURS", "")
+FAQ_MIN_ANSWER_CHARS = int(os.getenv("FAQ_MIN_ANSWER_CHARS", "40"))
+
+# Câu trả lời mẫu khi ngữ cảnh không có thông tin (xem PROMPT_TEMPLATE trong generator.py)
+NO_INFORMATION = "chưa có thông tin"
+
+_UNCHECKED = object()
+
+
+def in_quiet_hours(hour: int, spec: str = FAQ_WARM_QUIET_HOURS) -> bool:
+    """True nếu giờ hour nằm trong khoảng "start-end" (tính cả hai đầu, cho phép qua nửa đêm)."""
+    if not spec.strip():
+        return True
+    start, end = (int(part) for part in spec.split("-", 1))
+    return start <= hour <= end if start <= end else hour >= start or hour <= end
+
+
+def vet_answer(answer: str, sources: List[Dict[str, Any]]) -> Optional[str]:
+    """Lý do loại câu trả lời, hoặc None nếu đủ tốt để phục vụ thay cho LLM."""
+    if not answer or len(answer.strip()) < FAQ_MIN_ANSWER_CHARS:
+        return "too_short"
+    if NO_INFORMATION in answer.lower():
+        return "no_information"
+    # Không có id chunk thì không biết khi nào câu trả lời hết hạn
+    if not any(source.get("id") for source in sources):
+        return "no_sources"
+    return None
+
+
+def warm_faq(
+    top_n: int = FAQ_WARM_TOP_N,
+    window: str = FAQ_WARM_WINDOW,
+    force: bool = False,
+    dry_run: bool = False,
+    session_factory: Optional[Callable] = None,
+    answer_fn: Optional[Callable] = None,
+    embed_fn: Optional[Callable] = None,
+    namespace: Optional[str] = None,
+    chunk_ids=_UNCHECKED,
+    added_at: Optional[datetime] = None,
+) -> Dict[str, Any]:
+    """
+    Làm mới kho FAQ cho các câu hỏi nóng
+    Args:
+        top_n: Số câu hỏi nóng cần có FAQ
+        window: Khoảng thời gian xếp hạng câu hỏi ("today", "7d", "30d", "all")
+        force: Sinh lại cả các FAQ còn hiệu lực
+        dry_run: Chỉ báo cáo, không gọi LLM / ghi DB
+        session_factory: Tạo Session DB (mặc định SessionLocal)
+        answer_fn: question -> (answer, docs) (mặc định pipeline.answer_with_sources)
+        embed_fn: question -> vector (mặc định embed_query của model dùng chung)
+        namespace: Không gian vector của embed_fn (mặc định theo EMBEDDING_MODEL)
+        chunk_ids: Id chunk đang có trong index (mặc định đọc từ manifest, cùng added_at; None = không kiểm tra)
+        added_at: Lần gần nhất index có thêm chunk mới (None = không kiểm tra)
+    Returns:
+        Báo cáo: số câu hỏi, đã sinh, còn hiệu lực, bị loại, hết hạn, đã xoá, thời gian
+    """
+    from ..models.faq import FaqEntry
+    from ..services.stats_service import hot_intents
+    from .retriever import describe_sources
+
+    if session_factory is None:
+        from ..database import SessionLocal as session_factory
+    if answer_fn is None:
+        from .pipeline import answer_with_sources as answer_fn
+    if embed_fn is None or namespace is None:
+        from .registry import EMBEDDING_MODEL, registry
+        from .vector_store import embedding_namespace
+
+        embed_fn = embed_fn or (lambda question: registry.get_embeddings().embed_query(question))
+        namespace = namespace or embedding_namespace(EMBEDDING_MODEL)
+    if chunk_ids is _UNCHECKED:
+        chunk_ids, added_at = index_state()
+
+    started = time.perf_counter()
+    report = {"targets": 0, "generated": 0, "fresh": 0, "rejected": 0, "marked_stale": 0, "deleted": 0}
+    db = session_factory()
+    try:
+        targets: Dict[str, str] = {}
+        for question in hot_intents(db, top_n, window):
+            targets.setdefault(normalize_question(question), question)
+        targets.pop("", None)
+        report["targets"] = len(targets)
+
+        # 1. Hết hạn theo manifest (chunk nguồn đã bị xoá / sửa, hoặc có chunk mới khi ingest lại)
+        entries = {entry.question_key: entry for entry in db.query(FaqEntry).all()}
+        for key, entry in entries.items():
+            # Khoá theo cách chuẩn hoá cũ cũng coi như hết hạn (bị xoá ở bước 3)
+            if not entry.stale and (
+                key != normalize_question(entry.question)
+                or is_stale(entry.source_ids, chunk_ids, entry.generated_at, added_at)
+            ):
+                entry.stale = True
+                report["marked_stale"] += 1
+
+        # 2. Sinh câu trả lời cho câu hỏi nóng chưa có FAQ dùng được
+        for key, question in targets.items():
+            entry = entries.get(key)
+            if entry is not None and not (force or entry.stale or entry.embedding_model != namespace):
+                report["fresh"] += 1
+                continue
+            if dry_run:
+                report["generated"] += 1
+                continue
+            answer, docs = answer_fn(question)
+            sources = describe_sources(docs)
+            reason = vet_answer(answer, sources)
+            if reason is not None:
+                report["rejected"] += 1
+                logger.warning(f"⚠️ FAQ: bỏ câu trả lời cho '{question}' ({reason})")
+                continue
+            if entry is None:
+                entry = entries[key] = FaqEntry(question_key=key)
+                db.add(entry)
+            entry.question = question
+            entry.answer = answer
+            entry.sources = sources
+            entry.embedding = np.asarray(embed_fn(question), dtype=np.float32).tobytes()
+            entry.embedding_model = namespace
+            entry.stale = False
+            entry.generated_at = datetime.utcnow()
+            # Mỗi câu trả lời tốn một lần gọi LLM: lưu ngay, chạy lại không phải sinh lại
+            db.commit()
+            report["generated"] += 1
+
+        # 3. FAQ hết hạn không còn nóng thì không sinh lại, xoá luôn
+        for key, entry in entries.items():
+            if entry.stale and key not in targets:
+                db.delete(entry)
+                report["deleted"] += 1
+        if dry_run:
+            db.rollback()
+        else:
+            db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    report["seconds"] = round(time.perf_counter() - started, 2)
+    logger.info(f"✅ FAQ warmer: {report}")
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Precompute answers for the hottest questions")
+    parser.add_argument("--top", type=int, default=FAQ_WARM_TOP_N, help="Number of hot questions to cover")
+    parser.add_argument("--window", default=FAQ_WARM_WINDOW, choices=["today", "7d", "30d", "all"])
+    parser.add_argument("--force", action="store_true", help="Regenerate entries that are still valid")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would change")
+    parser.add_argument("--ignore-quiet-hours", action="store_true", help="Run even outside FAQ_WARM_QUIET_HOURS")
+    args = parser.parse_args(argv)
+
+    if not args.ignore_quiet_hours and not in_quiet_hours(datetime.now().hour):
+        print(f"⚠️ Ngoài giờ thấp điểm ({FAQ_WARM_QUIET_HOURS}), bỏ qua. Dùng --ignore-quiet-hours để chạy ngay.")
+        sys.exit(0)
+
+    report = warm_faq(top_n=args.top, window=args.window, force=args.force, dry_run=args.dry_run)
+    print(json.dumps(report, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
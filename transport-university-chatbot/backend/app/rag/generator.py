@@ -1,25 +1,11 @@
-from openai import OpenAI
-import os
-from dotenv import load_dotenv, find_dotenv
+from .llm_client import get_llm_client
 
-load_dotenv(find_dotenv())  # finds and loads transport-university-chatbot/.env
-
-
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-
-def generate_answer(question, context):
-    """Sinh câu trả lời dựa trên ngữ cảnh."""
-    model = OpenAI(
-        api_key= GROQ_API_KEY,
-        base_url="https://api.groq.com/openai/v1",
-    )
-
-    prompt_template = """
+PROMPT_TEMPLATE = """
     Bạn là trợ lý ảo AI thông minh của Trường Đại học Giao thông Vận tải (UTC). Nhiệm vụ của bạn là hỗ trợ sinh viên và cán bộ giảng viên giải đáp thắc mắc một cách CHÍNH XÁC, THÂN THIỆN và CHUYÊN NGHIỆP dựa trên thông tin được cung cấp.
 
     Thông tin ngữ cảnh:
     {context}
-
+{history}
     Câu hỏi của người dùng: {question}
 
     👉 **YÊU CẦU VỀ NỘI DUNG VÀ HÌNH THỨC:**
@@ -41,12 +27,38 @@ def generate_answer(question, context):
 
     Nếu thông tin không có trong ngữ cảnh, hãy thành thật trả lời: "Xin lỗi, hiện tại mình chưa có thông tin cụ thể về vấn đề này trong cơ sở dữ liệu."
     """
-    
-    input_text = prompt_template.format(context=context, question=question)
-    
-    response = model.responses.create(
-        model="openai/gpt-oss-20b", 
-        input = input_text,
-    )
-    
-    return response.output[1].content[0].text
+
+
+HISTORY_TEMPLATE = """
+    Lịch sử hội thoại gần đây (dùng để hiểu các câu hỏi nối tiếp):
+    {history}
+"""
+
+
+def build_prompt(question, context, history=""):
+    """Ghép câu hỏi, ngữ cảnh và (nếu có) lịch sử hội thoại vào prompt."""
+    history_block = HISTORY_TEMPLATE.format(history=history) if history else ""
+    return PROMPT_TEMPLATE.format(context=context, history=history_block, question=question)
+
+
+def generate_answer(question, context, history=""):
+    """Sinh câu trả lời dựa trên ngữ cảnh."""
+    return get_llm_client().generate(build_prompt(question, context, history))
+
+
+def stream_answer(question, context, history=""):
+    """Sinh câu trả lời dạng stream, yield từng đoạn text ngay khi model trả về."""
+    yield from get_llm_client().stream(build_prompt(question, context, history))
+
+
+# ============== Async (chat request path) ==============
+
+async def agenerate_answer(question, context, history=""):
+    """Bản async của generate_answer, không chiếm thread trong lúc chờ LLM."""
+    return await get_llm_client().agenerate(build_prompt(question, context, history))
+
+
+async def astream_answer(question, context, history=""):
+    """Bản async của stream_answer."""
+    async for delta in get_llm_client().astream(build_prompt(question, context, history)):
+        yield delta
@@ -0,0 +1,433 @@
+"""
+Pipeline nạp dữ liệu tăng dần (incremental) vào vector store.
+
+- Băm SHA-256 từng file nguồn: file không đổi thì bỏ qua, không parse lại.
+- File mới/đã sửa được parse song song bằng process pool. Mỗi chunk có id là hash
+  của (file, trang, nội dung), nên chỉ những chunk mới thực sự được embed lại.
+- Embed theo batch cấu hình được, upsert song song theo batch.
+- Chunk không còn tồn tại (trang bị sửa, file bị xoá) được xoá khỏi vector store.
+- Manifest JSON ghi lại file nào / chunk nào đang có trong index.
+
+Chạy (từ thư mục backend):
+    python -m app.rag.ingest                    # index thư mục data/
+    python -m app.rag.ingest --dry-run          # chỉ báo cáo những gì sẽ thay đổi
+    python -m app.rag.ingest --full             # bỏ qua manifest, index lại toàn bộ
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .vector_store import LOCAL_INDEX_DIR, VECTOR_BACKEND, create_lexical_index
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+INGEST_DATA_DIR = os.getenv("INGEST_DATA_DIR", os.path.join(ROOT_DIR, "data"))
+INGEST_PATTERN = os.getenv("INGEST_PATTERN", "*.pdf")
+INGEST_MANIFEST_PATH = os.getenv("INGEST_MANIFEST_PATH")
+INGEST_EMBED_BATCH_SIZE = int(os.getenv("INGEST_EMBED_BATCH_SIZE", "64"))
+INGEST_UPSERT_BATCH_SIZE = int(os.getenv("INGEST_UPSERT_BATCH_SIZE", "100"))
+INGEST_UPSERT_WORKERS = int(os.getenv("INGEST_UPSERT_WORKERS", "4"))
+INGEST_PARSE_WORKERS = int(os.getenv("INGEST_PARSE_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+MANIFEST_VERSION = 1
+
+
+def default_manifest_path(backend: str) -> str:
+    """Index local: manifest nằm cạnh index; Pinecone: trong thư mục data/."""
+    if INGEST_MANIFEST_PATH:
+        return INGEST_MANIFEST_PATH
+    if backend == "local":
+        return os.path.join(LOCAL_INDEX_DIR, "manifest.json")
+    return os.path.join(ROOT_DIR, "data", "index_manifest.json")
+
+
+# ============== Hashing ==============
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_ids(source: str, chunks: Sequence[Tuple[str, Dict[str, Any]]]) -> List[str]:
+    """
+    Id ổn định cho từng chunk: hash(file, trang, nội dung). Chunk trùng nội dung trong
+    cùng trang được đánh số thứ tự để id không bị đụng nhau.
+    """
+    ids, seen = [], {}
+    for text, metadata in chunks:
+        key = f"{source}\x00{metadata.get('page', '')}\x00{text}"
+        occurrence = seen.get(key, 0)
+        seen[key] = occurrence + 1
+        if occurrence:
+            key += f"\x00{occurrence}"
+        ids.append(hashlib.sha256(key.encode("utf-8")).hexdigest()[:32])
+    return ids
+
+
+# ============== Parsing ==============
+
+def parse_file(path: str) -> List[Tuple[str, Dict[str, Any]]]:
+    """Đọc + chia một file thành các chunk (text, metadata). Chạy trong process pool."""
+    from .preprocessor import load_and_split_file
+
+    return [(doc.page_content, dict(doc.metadata)) for doc in load_and_split_file(path)]
+
+
+def _parse_files(paths: List[str], workers: int) -> Dict[str, List[Tuple[str, Dict[str, Any]]]]:
+    if not paths:
+        return {}
+    parsed = {}
+    if workers <= 0 or len(paths) == 1:
+        results = map(parse_file, paths)
+        for i, (path, chunks) in enumerate(zip(paths, results), 1):
+            parsed[path] = chunks
+            print(f"📄 [{i}/{len(paths)}] {os.path.basename(path)}: {len(chunks)} chunks")
+        return parsed
+    with ProcessPoolExecutor(max_workers=min(workers, len(paths))) as pool:
+        for i, (path, chunks) in enumerate(zip(paths, pool.map(parse_file, paths)), 1):
+            parsed[path] = chunks
+            print(f"📄 [{i}/{len(paths)}] {os.path.basename(path)}: {len(chunks)} chunks")
+    return parsed
+
+
+# ============== Index writers ==============
+
+class LocalIndexWriter:
+    """
+    Buffers changes for a LocalVectorStore and applies them in one pass
+    (one IVF rebuild, one atomic save) on commit.
+    """
+
+    parallel = False
+
+    def __init__(self, store):
+        self.store = store
+        self._deletes: List[str] = []
+        self._texts: List[str] = []
+        self._vectors: List[np.ndarray] = []
+        self._metadatas: List[Dict[str, Any]] = []
+        self._ids: List[str] = []
+
+    def upsert(self, texts, vectors, metadatas, ids) -> None:
+        self._texts.extend(texts)
+        self._vectors.append(np.asarray(vectors, dtype=np.float32))
+        self._metadatas.extend(metadatas)
+        self._ids.extend(ids)
+
+    def delete(self, ids) -> None:
+        self._deletes.extend(ids)
+
+    def commit(self) -> None:
+        # Xoá + thêm không dựng lại IVF, k-means chỉ chạy một lần cho cả lần ingest
+        if self._deletes:
+            self.store.delete(self._deletes, reindex=False)
+        if self._ids:
+            self.store.add_embeddings(self._texts, np.concatenate(self._vectors), self._metadatas, self._ids, reindex=False)
+        if self._deletes or self._ids:
+            self.store.rebuild_ivf()
+        self.store.save()
+
+
+class PineconeIndexWriter:
+    """Upserts/deletes straight against the Pinecone index (thread-safe, batches run in parallel)."""
+
+    parallel = True
+    # langchain_pinecone đọc nội dung chunk từ metadata["text"]
+    TEXT_KEY = "text"
+    DELETE_BATCH = 1000
+
+    def __init__(self):
+        from .vector_store import get_pinecone_index
+
+        self.index = get_pinecone_index()
+
+    def upsert(self, texts, vectors, metadatas, ids) -> None:
+        self.index.upsert(vectors=[
+            {
+                "id": doc_id,
+                "values": [float(x) for x in vector],
+                "metadata": {**metadata, "id": doc_id, self.TEXT_KEY: text},
+            }
+            for text, vector, metadata, doc_id in zip(texts, vectors, metadatas, ids)
+        ])
+
+    def delete(self, ids) -> None:
+        ids = list(ids)
+        for start in range(0, len(ids), self.DELETE_BATCH):
+            self.index.delete(ids=ids[start:start + self.DELETE_BATCH])
+
+    def commit(self) -> None:
+        pass
+
+
+def create_index_writer(backend: str, embeddings):
+    if backend == "local":
+        from .vector_store import _create_local_store
+
+        return LocalIndexWriter(_create_local_store(embeddings))
+    if backend == "pinecone":
+        return PineconeIndexWriter()
+    raise ValueError(f"Unknown VECTOR_BACKEND '{backend}'. Expected one of: local, pinecone")
+
+
+# ============== Manifest ==============
+
+def load_manifest(path: str) -> Dict[str, Any]:
+    if not os.path.exists(path):
+        return {"version": MANIFEST_VERSION, "files": {}}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(path: str, manifest: Dict[str, Any]) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+# ============== Pipeline ==============
+
+@dataclass
+class IngestReport:
+    files_scanned: int = 0
+    files_changed: int = 0
+    files_removed: int = 0
+    chunks_embedded: int = 0
+    chunks_deleted: int = 0
+    chunks_unchanged: int = 0
+    seconds: float = 0.0
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.chunks_embedded or self.chunks_deleted)
+
+
+def ingest(
+    data_dir: str = INGEST_DATA_DIR,
+    pattern: str = INGEST_PATTERN,
+    manifest_path: Optional[str] = None,
+    backend: Optional[str] = None,
+    full: bool = False,
+    dry_run: bool = False,
+    embed_batch_size: int = INGEST_EMBED_BATCH_SIZE,
+    upsert_batch_size: int = INGEST_UPSERT_BATCH_SIZE,
+    upsert_workers: int = INGEST_UPSERT_WORKERS,
+    parse_workers: int = INGEST_PARSE_WORKERS,
+    embeddings=None,
+    writer=None,
+    lexical_dir: Optional[str] = None,
+) -> IngestReport:
+    """
+    Đồng bộ vector store với các file trong data_dir, chỉ embed những chunk mới
+    Args:
+        data_dir: Thư mục chứa tài liệu nguồn
+        pattern: Glob của file cần index (hỗ trợ "**")
+        manifest_path: File manifest (mặc định theo backend)
+        backend: "local" hoặc "pinecone" (mặc định VECTOR_BACKEND)
+        full: Bỏ qua manifest, embed lại toàn bộ
+        dry_run: Chỉ tính toán thay đổi, không embed/ghi gì
+        embeddings: Model embedding (mặc định lấy từ registry)
+        writer: Index writer (mặc định theo backend)
+        lexical_dir: Thư mục index BM25 (mặc định LEXICAL_INDEX_DIR)
+    Returns:
+        IngestReport
+    """
+    from .registry import EMBEDDING_MODEL
+
+    started = time.perf_counter()
+    backend = (backend or VECTOR_BACKEND).lower()
+    manifest_path = manifest_path or default_manifest_path(backend)
+    old_manifest = load_manifest(manifest_path)
+    old_files: Dict[str, Dict[str, Any]] = old_manifest.get("files", {})
+
+    if old_manifest.get("embedding_model") not in (None, EMBEDDING_MODEL) and not full:
+        print(f"⚠️ Model embedding đã đổi ({old_manifest['embedding_model']} -> {EMBEDDING_MODEL}), index lại toàn bộ.")
+        full = True
+
+    report = IngestReport()
+    paths = sorted(p for p in glob.glob(os.path.join(data_dir, pattern), recursive=True) if os.path.isfile(p))
+    report.files_scanned = len(paths)
+
+    # 1. Tìm file mới / đã sửa
+    new_files: Dict[str, Dict[str, Any]] = {}
+    to_parse: Dict[str, str] = {}  # path -> relative name
+    unchanged: Dict[str, str] = {}
+    for path in paths:
+        name = os.path.relpath(path, data_dir).replace(os.sep, "/")
+        stat = os.stat(path)
+        previous = old_files.get(name)
+        if not full and previous and previous["size"] == stat.st_size and previous["mtime"] == stat.st_mtime:
+            new_files[name] = previous
+            unchanged[path] = name
+            continue
+        sha256 = file_sha256(path)
+        if not full and previous and previous["sha256"] == sha256:
+            new_files[name] = dict(previous, mtime=stat.st_mtime)
+            unchanged[path] = name
+            continue
+        new_files[name] = {"sha256": sha256, "size": stat.st_size, "mtime": stat.st_mtime, "chunks": []}
+        to_parse[path] = name
+    report.files_changed = len(to_parse)
+    report.files_removed = len(set(old_files) - set(new_files))
+
+    # Index BM25 chưa có (vd. nâng cấp từ bản cũ): parse lại cả file không đổi để dựng nó,
+    # các chunk đó vẫn không bị embed lại
+    lexical = create_lexical_index(lexical_dir)
+    rebuild_lexical = not dry_run and (full or not lexical.exists())
+    parse_targets = dict(to_parse, **unchanged) if rebuild_lexical else to_parse
+    lexical_records: List[Tuple[str, str, Dict[str, Any]]] = []
+
+    # 2. Parse song song, tính id chunk, so với manifest cũ
+    pending: List[Tuple[str, str, Dict[str, Any]]] = []  # (id, text, metadata)
+    for path, chunks in _parse_files(list(parse_targets), parse_workers).items():
+        name = parse_targets[path]
+        ids = chunk_ids(name, chunks)
+        if rebuild_lexical:
+            lexical_records.extend((doc_id, text, metadata) for doc_id, (text, metadata) in zip(ids, chunks))
+        if path not in to_parse:
+            continue
+        known = set() if full else set(old_files.get(name, {}).get("chunks", []))
+        for doc_id, (text, metadata) in zip(ids, chunks):
+            if doc_id in known:
+                report.chunks_unchanged += 1
+            else:
+                pending.append((doc_id, text, metadata))
+        new_files[name]["chunks"] = ids
+
+    old_ids = {doc_id for entry in old_files.values() for doc_id in entry.get("chunks", [])}
+    new_ids = {doc_id for entry in new_files.values() for doc_id in entry.get("chunks", [])}
+    removed = sorted(old_ids - new_ids)
+    report.chunks_embedded = len(pending)
+    report.chunks_deleted = len(removed)
+    report.chunks_unchanged += sum(len(new_files[name]["chunks"]) for name in new_files if name not in to_parse.values())
+
+    print(
+        f"🔎 {report.files_scanned} file, {report.files_changed} mới/đã sửa, {report.files_removed} bị xoá | "
+        f"chunk: +{report.chunks_embedded} -{report.chunks_deleted} ={report.chunks_unchanged}"
+    )
+    if dry_run:
+        report.seconds = time.perf_counter() - started
+        return report
+
+    if pending or removed:
+        # 3. Embed theo batch, upsert song song
+        if embeddings is None:
+            from .registry import registry
+
+            embeddings = registry.get_embeddings()
+        if writer is None:
+            writer = create_index_writer(backend, embeddings)
+
+        if removed:
+            writer.delete(removed)
+
+        lock = threading.Lock()
+        done = 0
+
+        def upsert(batch, vectors):
+            nonlocal done
+            writer.upsert(
+                [text for _, text, _ in batch],
+                vectors,
+                [metadata for _, _, metadata in batch],
+                [doc_id for doc_id, _, _ in batch],
+            )
+            with lock:
+                done += len(batch)
+                print(f"⬆️  Upsert {done}/{len(pending)} chunks")
+
+        workers = max(1, upsert_workers) if writer.parallel else 1
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = []
+            for start in range(0, len(pending), embed_batch_size):
+                batch = pending[start:start + embed_batch_size]
+                vectors = np.asarray(embeddings.embed_documents([text for _, text, _ in batch]), dtype=np.float32)
+                print(f"🧮 Embed {min(start + embed_batch_size, len(pending))}/{len(pending)} chunks")
+                for offset in range(0, len(batch), upsert_batch_size):
+                    futures.append(pool.submit(
+                        upsert, batch[offset:offset + upsert_batch_size], vectors[offset:offset + upsert_batch_size]
+                    ))
+            for future in futures:
+                future.result()
+
+        writer.commit()
+
+    if rebuild_lexical:
+        lexical.build(lexical_records)
+        lexical.save()
+    elif pending or removed:
+        lexical.update(added=pending, removed=removed)
+        lexical.save()
+
+    # 4. Manifest + làm mới vector store / answer cache của process hiện tại
+    save_manifest(manifest_path, {
+        "version": MANIFEST_VERSION,
+        "backend": backend,
+        "embedding_model": EMBEDDING_MODEL,
+        "updated_at": datetime.utcnow().isoformat(),
+        # FAQ sinh trước mốc này có thể đã thiếu thông tin mới (xem faq_store.is_stale)
+        "chunks_added_at": datetime.utcnow().isoformat() if pending else old_manifest.get("chunks_added_at"),
+        "files": new_files,
+    })
+    if report.changed or rebuild_lexical:
+        from .answer_cache import answer_cache
+        from .faq_store import faq_store
+        from .registry import registry
+
+        registry.reset_vector_store()
+        answer_cache.invalidate()
+        # FAQ dựa trên chunk đã bị xoá/sửa, hoặc tất cả nếu có chunk mới; các worker khác
+        # nhận ra qua manifest khi nạp lại
+        faq_store.invalidate_sources(None if pending else removed)
+
+    report.seconds = time.perf_counter() - started
+    print(f"✅ Xong sau {report.seconds:.1f}s")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incremental ingestion into the vector store")
+    parser.add_argument("--data-dir", default=INGEST_DATA_DIR)
+    parser.add_argument("--pattern", default=INGEST_PATTERN, help='Glob of files to index, e.g. "**/*.pdf"')
+    parser.add_argument("--manifest", default=None, help="Manifest path (default depends on the backend)")
+    parser.add_argument("--backend", default=None, choices=["local", "pinecone"])
+    parser.add_argument("--full", action="store_true", help="Ignore the manifest and re-embed everything")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would change")
+    parser.add_argument("--embed-batch-size", type=int, default=INGEST_EMBED_BATCH_SIZE)
+    parser.add_argument("--upsert-batch-size", type=int, default=INGEST_UPSERT_BATCH_SIZE)
+    parser.add_argument("--upsert-workers", type=int, default=INGEST_UPSERT_WORKERS)
+    parser.add_argument("--parse-workers", type=int, default=INGEST_PARSE_WORKERS)
+    args = parser.parse_args()
+
+    report = ingest(
+        data_dir=args.data_dir,
+        pattern=args.pattern,
+        manifest_path=args.manifest,
+        backend=args.backend,
+        full=args.full,
+        dry_run=args.dry_run,
+        embed_batch_size=args.embed_batch_size,
+        upsert_batch_size=args.upsert_batch_size,
+        upsert_workers=args.upsert_workers,
+        parse_workers=args.parse_workers,
+    )
+    print(json.dumps(asdict(report), ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""
+Index từ khoá (BM25) cục bộ cho các chunk tài liệu, dùng song song với tìm kiếm vector.
+
+Tìm kiếm vector hay bỏ lỡ các chunk chứa đúng mã ngành, mức học phí, số phòng, ngày
+tháng... Index này chấm điểm BM25 trên chính các chunk đó; retriever trộn hai danh
+sách kết quả bằng reciprocal rank fusion (RRF).
+
+Tách từ cho tiếng Việt: chuẩn hoá Unicode (NFC), chữ thường, giữ nguyên các mã có dấu
+chấm/gạch (7580201, A2-301, 15/08/2024), thêm dạng bỏ dấu của mỗi âm tiết (để
+"hoc phi" khớp "học phí") và cặp âm tiết liền nhau (từ ghép: "học_phí").
+
+Cấu trúc thư mục index (postings dạng CSR, trọng số BM25 tính sẵn):
+    postings.npz  indptr (V + 1,), doc_ids (P,), weights (P,)
+    terms.json    danh sách term theo thứ tự id
+    docs.jsonl    mỗi dòng {"id", "text", "metadata"} theo thứ tự doc
+"""
+import json
+import os
+import re
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+POSTINGS_FILE = "postings.npz"
+TERMS_FILE = "terms.json"
+DOCS_FILE = "docs.jsonl"
+
+# Âm tiết / mã: chữ-số, cho phép nối bằng . - / _ (7.580.201, A2-301, 15/08/2024)
+_TOKEN = re.compile(r"\w+(?:[./\-_]\w+)*", re.UNICODE)
+_CODE_SEPARATORS = re.compile(r"[./\-_]")
+
+
+def fold_accents(text: str) -> str:
+    """Bỏ dấu tiếng Việt: "học phí" -> "hoc phi", "đ" -> "d"."""
+    text = unicodedata.normalize("NFD", text)
+    text = "".join(ch for ch in text if unicodedata.category(ch) != "Mn")
+    return text.replace("đ", "d").replace("Đ", "D")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Tách text thành các term cho BM25
+    Returns:
+        Âm tiết/mã (có dấu), dạng bỏ dấu nếu khác, các phần của mã ghép,
+        và cặp âm tiết liền nhau (dạng bỏ dấu, nối bằng "_")
+    """
+    text = unicodedata.normalize("NFC", text).lower()
+    terms: List[str] = []
+    folded_tokens: List[str] = []
+    for token in _TOKEN.findall(text):
+        terms.append(token)
+        folded = fold_accents(token)
+        if folded != token:
+            terms.append(folded)
+        if _CODE_SEPARATORS.search(token):
+            # "7.580.201" còn khớp "7580201", "a2-301" khớp "a2" / "301"
+            parts = [part for part in _CODE_SEPARATORS.split(token) if part]
+            terms.append("".join(parts))
+            terms.extend(parts)
+        folded_tokens.append(folded)
+    terms.extend(f"{a}_{b}" for a, b in zip(folded_tokens, folded_tokens[1:]))
+    return terms
+
+
+class LexicalIndex:
+    """
+    BM25 over an in-memory CSR postings matrix.
+
+    Weights are precomputed per posting (idf * saturated tf with length
+    normalisation), so a query costs one vectorised scatter-add per query term.
+    """
+
+    def __init__(self, index_dir: str, k1: float = 1.2, b: float = 0.75):
+        self.index_dir = index_dir
+        self.k1 = k1
+        self.b = b
+        self._ids: List[str] = []
+        self._texts: List[str] = []
+        self._metadatas: List[Dict[str, Any]] = []
+        self._term_ids: Dict[str, int] = {}
+        self._indptr = np.zeros(1, dtype=np.int64)
+        self._doc_ids = np.zeros(0, dtype=np.int32)
+        self._weights = np.zeros(0, dtype=np.float32)
+        self._load()
+
+    # ============== Persistence ==============
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.index_dir, name)
+
+    def exists(self) -> bool:
+        return os.path.exists(self._path(POSTINGS_FILE))
+
+    def _load(self) -> None:
+        if not self.exists():
+            return
+        with np.load(self._path(POSTINGS_FILE)) as data:
+            self._indptr = data["indptr"]
+            self._doc_ids = data["doc_ids"]
+            self._weights = data["weights"]
+        with open(self._path(TERMS_FILE), encoding="utf-8") as f:
+            self._term_ids = {term: i for i, term in enumerate(json.load(f))}
+        with open(self._path(DOCS_FILE), encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                self._ids.append(record["id"])
+                self._texts.append(record["text"])
+                self._metadatas.append(record.get("metadata") or {})
+
+    def save(self) -> None:
+        """Ghi index xuống đĩa (file tạm rồi os.replace, reader không bao giờ thấy file dở)."""
+        os.makedirs(self.index_dir, exist_ok=True)
+        tmp_postings = self._path(POSTINGS_FILE + ".tmp.npz")
+        np.savez(tmp_postings, indptr=self._indptr, doc_ids=self._doc_ids, weights=self._weights)
+
+        terms = sorted(self._term_ids, key=self._term_ids.get)
+        tmp_terms = self._path(TERMS_FILE + ".tmp")
+        with open(tmp_terms, "w", encoding="utf-8") as f:
+            json.dump(terms, f, ensure_ascii=False)
+
+        tmp_docs = self._path(DOCS_FILE + ".tmp")
+        with open(tmp_docs, "w", encoding="utf-8") as f:
+            for doc_id, text, metadata in zip(self._ids, self._texts, self._metadatas):
+                f.write(json.dumps({"id": doc_id, "text": text, "metadata": metadata}, ensure_ascii=False))
+                f.write("\n")
+
+        os.replace(tmp_terms, self._path(TERMS_FILE))
+        os.replace(tmp_docs, self._path(DOCS_FILE))
+        os.replace(tmp_postings, self._path(POSTINGS_FILE))
+
+    # ============== Build ==============
+
+    def build(self, records: Iterable[Tuple[str, str, Dict[str, Any]]]) -> None:
+        """Xây lại toàn bộ index từ các bản ghi (id, text, metadata)."""
+        self._ids, self._texts, self._metadatas = [], [], []
+        for doc_id, text, metadata in records:
+            self._ids.append(doc_id)
+            self._texts.append(text)
+            self._metadatas.append(dict(metadata or {}))
+        self._rebuild_postings()
+
+    def update(self, added: Sequence[Tuple[str, str, Dict[str, Any]]] = (), removed: Sequence[str] = ()) -> None:
+        """Thêm/ghi đè theo id và xoá các chunk, rồi tính lại postings."""
+        drop = set(removed) | {doc_id for doc_id, _, _ in added}
+        records = [
+            (doc_id, text, metadata)
+            for doc_id, text, metadata in zip(self._ids, self._texts, self._metadatas)
+            if doc_id not in drop
+        ]
+        self.build(records + list(added))
+
+    def _rebuild_postings(self) -> None:
+        term_ids: Dict[str, int] = {}
+        rows, cols, counts = [], [], []
+        lengths = np.zeros(len(self._texts), dtype=np.float32)
+        for doc, text in enumerate(self._texts):
+            tf: Dict[int, int] = {}
+            terms = tokenize(text)
+            lengths[doc] = len(terms)
+            for term in terms:
+                term_id = term_ids.setdefault(term, len(term_ids))
+                tf[term_id] = tf.get(term_id, 0) + 1
+            for term_id, count in tf.items():
+                rows.append(term_id)
+                cols.append(doc)
+                counts.append(count)
+
+        self._term_ids = term_ids
+        n_terms = len(term_ids)
+        rows = np.asarray(rows, dtype=np.int64)
+        order = np.lexsort((np.asarray(cols, dtype=np.int64), rows))
+        self._doc_ids = np.asarray(cols, dtype=np.int32)[order]
+        tf = np.asarray(counts, dtype=np.float32)[order]
+        df = np.bincount(rows, minlength=n_terms)
+        self._indptr = np.zeros(n_terms + 1, dtype=np.int64)
+        np.cumsum(df, out=self._indptr[1:])
+
+        n_docs = len(self._texts)
+        if not n_docs:
+            self._weights = np.zeros(0, dtype=np.float32)
+            return
+        idf = np.log1p((n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+        avg_length = float(lengths.mean()) or 1.0
+        norm = self.k1 * (1 - self.b + self.b * lengths[self._doc_ids] / avg_length)
+        posting_idf = np.repeat(idf, df)
+        self._weights = (posting_idf * tf * (self.k1 + 1) / (tf + norm)).astype(np.float32)
+
+    # ============== Search ==============
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(len(self._ids), dtype=np.float32)
+        for term in set(tokenize(query)):
+            term_id = self._term_ids.get(term)
+            if term_id is None:
+                continue
+            start, end = self._indptr[term_id], self._indptr[term_id + 1]
+            # doc_ids không lặp trong một posting list nên += an toàn
+            scores[self._doc_ids[start:end]] += self._weights[start:end]
+        return scores
+
+    def search_with_score(self, query: str, k: int = 4) -> List[Tuple[Document, float]]:
+        if not self._ids:
+            return []
+        scores = self.scores(query)
+        candidates = np.flatnonzero(scores)
+        if not len(candidates):
+            return []
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [
+            (Document(page_content=self._texts[i], metadata=dict(self._metadatas[i], id=self._ids[i])), float(scores[i]))
+            for i in candidates
+        ]
+
+    def search(self, query: str, k: int = 4) -> List[Document]:
+        return [doc for doc, _ in self.search_with_score(query, k=k)]
+
+
+def reciprocal_rank_fusion(result_lists: Sequence[Sequence[Document]], k: int = 60, top_k: Optional[int] = None) -> List[Document]:
+    """
+    Trộn nhiều danh sách kết quả đã xếp hạng: score(d) = sum 1 / (k + rank)
+    Document được nhận diện theo metadata["id"] (hoặc nội dung nếu không có id).
+    """
+    scores: Dict[str, float] = {}
+    docs: Dict[str, Document] = {}
+    for results in result_lists:
+        for rank, doc in enumerate(results, 1):
+            key = (doc.metadata or {}).get("id") or getattr(doc, "id", None) or doc.page_content
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            docs.setdefault(key, doc)
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    return [docs[key] for key in ranked[:top_k]]
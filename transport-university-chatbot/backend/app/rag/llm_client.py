@@ -0,0 +1,289 @@
+"""
+Client LLM dùng chung (OpenAI-compatible Responses API, mặc định là Groq).
+
+- Một connection pool httpx được giữ suốt vòng đời worker (keep-alive, HTTP/2 nếu có `h2`).
+- Timeout cấu hình được, retry có giới hạn với backoff + jitter khi gặp 429/5xx/lỗi kết nối.
+- Semaphore giới hạn số request đồng thời theo từng model.
+- Model và base URL lấy từ cấu hình thay vì hard-code.
+"""
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from typing import AsyncIterator, Dict, Iterator, Optional
+
+import httpx
+from openai import (
+    APIConnectionError,
+    APIStatusError,
+    APITimeoutError,
+    AsyncOpenAI,
+    OpenAI,
+)
+
+from ..concurrency import get_semaphore, loop_local, pop_loop_local
+from ..metrics import record_llm_usage
+
+logger = logging.getLogger(__name__)
+
+LLM_API_KEY = os.getenv("LLM_API_KEY") or os.getenv("GROQ_API_KEY")
+LLM_BASE_URL = os.getenv("LLM_BASE_URL", "https://api.groq.com/openai/v1")
+LLM_MODEL = os.getenv("LLM_MODEL", "openai/gpt-oss-20b")
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+LLM_CONNECT_TIMEOUT_SECONDS = float(os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", "5"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "8"))
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "true").lower() == "true"
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "30"))
+# Số request đồng thời tối đa cho mỗi model, ví dụ "256" hoặc "openai/gpt-oss-20b=128,other=16"
+LLM_MAX_CONCURRENCY = os.getenv("LLM_MAX_CONCURRENCY", "256")
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+def _parse_concurrency(value: str):
+    """'256' -> (256, {}) ; 'a=8,b=4' -> (256, {'a': 8, 'b': 4})."""
+    default, per_model = 256, {}
+    for part in value.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "=" in part:
+            model, limit = part.rsplit("=", 1)
+            per_model[model.strip()] = int(limit)
+        else:
+            default = int(part)
+    return default, per_model
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, (APIConnectionError, APITimeoutError)):
+        return True
+    return isinstance(error, APIStatusError) and error.status_code in RETRYABLE_STATUS
+
+
+class LLMClient:
+    """
+    Pooled, retrying client for an OpenAI-compatible Responses API.
+
+    Usage:
+        from app.rag.llm_client import get_llm_client
+        text = await get_llm_client().agenerate(prompt)
+        async for delta in get_llm_client().astream(prompt):
+            ...
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = LLM_API_KEY,
+        base_url: str = LLM_BASE_URL,
+        model: str = LLM_MODEL,
+        timeout: float = LLM_TIMEOUT_SECONDS,
+        connect_timeout: float = LLM_CONNECT_TIMEOUT_SECONDS,
+        max_retries: int = LLM_MAX_RETRIES,
+        retry_base_delay: float = LLM_RETRY_BASE_DELAY,
+        retry_max_delay: float = LLM_RETRY_MAX_DELAY,
+        http2: bool = LLM_HTTP2,
+        max_connections: int = LLM_MAX_CONNECTIONS,
+        max_keepalive_connections: int = LLM_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry: float = LLM_KEEPALIVE_EXPIRY,
+        max_concurrency: str = LLM_MAX_CONCURRENCY,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        sync_transport: Optional[httpx.BaseTransport] = None,
+    ):
+        # Groq/OpenAI SDK từ chối api_key rỗng; stub server cục bộ không kiểm tra key
+        self.api_key = api_key or "not-set"
+        self.base_url = base_url
+        self.model = model
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.http2 = http2 and _http2_available()
+        if http2 and not self.http2:
+            logger.warning("⚠️ LLM_HTTP2 bật nhưng chưa cài 'h2', dùng HTTP/1.1 keep-alive.")
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.default_concurrency, self.model_concurrency = _parse_concurrency(max_concurrency)
+        self._transport = transport
+        self._sync_transport = sync_transport
+        self._sync_client: Optional[OpenAI] = None
+        self._sync_lock = threading.Lock()
+        self._sync_semaphores: Dict[str, threading.BoundedSemaphore] = {}
+
+    # ============== Clients ==============
+
+    def _concurrency_for(self, model: str) -> int:
+        return self.model_concurrency.get(model, self.default_concurrency)
+
+    def _async_client(self) -> AsyncOpenAI:
+        """AsyncOpenAI + httpx pool dùng chung cho event loop hiện tại."""
+        def factory():
+            http_client = httpx.AsyncClient(
+                http2=self.http2,
+                limits=self.limits,
+                timeout=self.timeout,
+                transport=self._transport,
+            )
+            return AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, http_client=http_client, max_retries=0)
+
+        return loop_local(f"llm_client:{id(self)}", factory)
+
+    def _client(self) -> OpenAI:
+        if self._sync_client is None:
+            with self._sync_lock:
+                if self._sync_client is None:
+                    http_client = httpx.Client(
+                        http2=self.http2,
+                        limits=self.limits,
+                        timeout=self.timeout,
+                        transport=self._sync_transport,
+                    )
+                    self._sync_client = OpenAI(api_key=self.api_key, base_url=self.base_url, http_client=http_client, max_retries=0)
+        return self._sync_client
+
+    def _sync_semaphore(self, model: str) -> threading.BoundedSemaphore:
+        with self._sync_lock:
+            if model not in self._sync_semaphores:
+                self._sync_semaphores[model] = threading.BoundedSemaphore(self._concurrency_for(model))
+            return self._sync_semaphores[model]
+
+    # ============== Retry ==============
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        """Full-jitter exponential backoff, honouring Retry-After when the server sends it."""
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), self.retry_max_delay)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * (2 ** attempt)))
+
+    def _should_retry(self, attempt: int, error: Exception) -> bool:
+        return attempt < self.max_retries and _is_retryable(error)
+
+    # ============== Sync API ==============
+
+    def generate(self, prompt: str, model: Optional[str] = None) -> str:
+        model = model or self.model
+        with self._sync_semaphore(model):
+            attempt = 0
+            while True:
+                try:
+                    response = self._client().responses.create(model=model, input=prompt)
+                    record_llm_usage(model, getattr(response, "usage", None))
+                    return response.output_text
+                except Exception as e:
+                    if not self._should_retry(attempt, e):
+                        raise
+                    delay = self._backoff(attempt, e)
+                    logger.warning(f"⚠️ LLM lỗi ({e}), thử lại sau {delay:.2f}s (lần {attempt + 1})")
+                    time.sleep(delay)
+                    attempt += 1
+
+    def stream(self, prompt: str, model: Optional[str] = None) -> Iterator[str]:
+        model = model or self.model
+        with self._sync_semaphore(model):
+            attempt = 0
+            while True:
+                started = False
+                try:
+                    for event in self._client().responses.create(model=model, input=prompt, stream=True):
+                        if event.type == "response.output_text.delta" and event.delta:
+                            started = True
+                            yield event.delta
+                        elif event.type == "response.completed":
+                            # usage (token vào/ra) chỉ có trong event cuối
+                            record_llm_usage(model, getattr(event.response, "usage", None))
+                    return
+                except Exception as e:
+                    # Không retry khi đã gửi token cho client (tránh lặp nội dung)
+                    if started or not self._should_retry(attempt, e):
+                        raise
+                    time.sleep(self._backoff(attempt, e))
+                    attempt += 1
+
+    # ============== Async API ==============
+
+    async def agenerate(self, prompt: str, model: Optional[str] = None) -> str:
+        model = model or self.model
+        async with get_semaphore(f"llm:{id(self)}:{model}", self._concurrency_for(model)):
+            attempt = 0
+            while True:
+                try:
+                    response = await self._async_client().responses.create(model=model, input=prompt)
+                    record_llm_usage(model, getattr(response, "usage", None))
+                    return response.output_text
+                except Exception as e:
+                    if not self._should_retry(attempt, e):
+                        raise
+                    delay = self._backoff(attempt, e)
+                    logger.warning(f"⚠️ LLM lỗi ({e}), thử lại sau {delay:.2f}s (lần {attempt + 1})")
+                    await asyncio.sleep(delay)
+                    attempt += 1
+
+    async def astream(self, prompt: str, model: Optional[str] = None) -> AsyncIterator[str]:
+        model = model or self.model
+        async with get_semaphore(f"llm:{id(self)}:{model}", self._concurrency_for(model)):
+            attempt = 0
+            while True:
+                started = False
+                try:
+                    stream = await self._async_client().responses.create(model=model, input=prompt, stream=True)
+                    async for event in stream:
+                        if event.type == "response.output_text.delta" and event.delta:
+                            started = True
+                            yield event.delta
+                        elif event.type == "response.completed":
+                            # usage (token vào/ra) chỉ có trong event cuối
+                            record_llm_usage(model, getattr(event.response, "usage", None))
+                    return
+                except Exception as e:
+                    if started or not self._should_retry(attempt, e):
+                        raise
+                    await asyncio.sleep(self._backoff(attempt, e))
+                    attempt += 1
+
+    def close(self) -> None:
+        if self._sync_client is not None:
+            self._sync_client.close()
+            self._sync_client = None
+
+    async def aclose(self) -> None:
+        """Đóng pool của event loop hiện tại (gọi lúc shutdown)."""
+        client = pop_loop_local(f"llm_client:{id(self)}")
+        if client is not None:
+            await client.close()
+        self.close()
+
+
+_llm_client: Optional[LLMClient] = None
+_llm_client_lock = threading.Lock()
+
+
+def get_llm_client() -> LLMClient:
+    """LLMClient dùng chung cho cả worker."""
+    global _llm_client
+    if _llm_client is None:
+        with _llm_client_lock:
+            if _llm_client is None:
+                _llm_client = LLMClient()
+    return _llm_client
@@ -0,0 +1,300 @@
+"""
+Vector store cục bộ (in-process) thay thế cho Pinecone.
+
+Embedding của các chunk được lưu thành ma trận float32/float16 (.npy) trên đĩa và
+được mở bằng memory-map, tìm kiếm top-k cosine chính xác bằng NumPy. Khi số chunk
+lớn có thể bật index xấp xỉ IVF (k-means) để chỉ quét một phần các cụm.
+
+Cấu trúc thư mục index:
+    vectors.npy   ma trận (N, D) đã chuẩn hoá L2
+    docs.jsonl    mỗi dòng {"id", "text", "metadata"} theo đúng thứ tự hàng
+    ivf.npz       (tuỳ chọn) centroids + danh sách hàng của từng cụm
+"""
+import json
+import os
+import uuid
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+VECTORS_FILE = "vectors.npy"
+DOCS_FILE = "docs.jsonl"
+IVF_FILE = "ivf.npz"
+
+# Số hàng được nhân ma trận mỗi lần, tránh upcast cả ma trận float16 một lúc
+SEARCH_BLOCK_ROWS = 65536
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Chỉ số của k điểm cao nhất, sắp xếp giảm dần."""
+    if k >= scores.shape[0]:
+        return np.argsort(-scores)
+    idx = np.argpartition(-scores, k - 1)[:k]
+    return idx[np.argsort(-scores[idx])]
+
+
+class LocalVectorStore:
+    """
+    Exact (optionally IVF-accelerated) cosine search over a memory-mapped matrix.
+
+    Mirrors the subset of the LangChain VectorStore API used by the app
+    (similarity_search, add_texts/add_documents, delete), so it can be swapped
+    in for PineconeVectorStore via VECTOR_BACKEND=local.
+    """
+
+    def __init__(
+        self,
+        embedding,
+        index_dir: str,
+        dtype: str = "float32",
+        ivf_min_rows: int = 20000,
+        ivf_nprobe: int = 8,
+    ):
+        self.embedding = embedding
+        self.index_dir = index_dir
+        self.dtype = np.dtype(dtype)
+        self.ivf_min_rows = ivf_min_rows
+        self.ivf_nprobe = ivf_nprobe
+
+        self._vectors: Optional[np.ndarray] = None
+        self._ids: List[str] = []
+        self._texts: List[str] = []
+        self._metadatas: List[Dict[str, Any]] = []
+        self._id_to_row: Dict[str, int] = {}
+        self._ivf: Optional[Dict[str, np.ndarray]] = None
+        self._load()
+
+    # ============== Persistence ==============
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.index_dir, name)
+
+    def _load(self) -> None:
+        vectors_path = self._path(VECTORS_FILE)
+        if not os.path.exists(vectors_path):
+            return
+
+        self._vectors = np.load(vectors_path, mmap_mode="r")
+        with open(self._path(DOCS_FILE), encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                self._ids.append(record["id"])
+                self._texts.append(record["text"])
+                self._metadatas.append(record.get("metadata") or {})
+        self._id_to_row = {doc_id: row for row, doc_id in enumerate(self._ids)}
+
+        ivf_path = self._path(IVF_FILE)
+        if os.path.exists(ivf_path):
+            with np.load(ivf_path) as data:
+                self._ivf = {key: data[key] for key in data.files}
+
+    def save(self) -> None:
+        """Ghi index xuống đĩa (ghi file tạm rồi thay thế để reader không đọc file dở)."""
+        os.makedirs(self.index_dir, exist_ok=True)
+        vectors = self._vectors if self._vectors is not None else np.zeros((0, 0), dtype=self.dtype)
+
+        tmp_vectors = self._path(VECTORS_FILE + ".tmp")
+        with open(tmp_vectors, "wb") as f:
+            np.save(f, np.ascontiguousarray(vectors, dtype=self.dtype))
+
+        tmp_docs = self._path(DOCS_FILE + ".tmp")
+        with open(tmp_docs, "w", encoding="utf-8") as f:
+            for doc_id, text, metadata in zip(self._ids, self._texts, self._metadatas):
+                f.write(json.dumps({"id": doc_id, "text": text, "metadata": metadata}, ensure_ascii=False))
+                f.write("\n")
+
+        os.replace(tmp_vectors, self._path(VECTORS_FILE))
+        os.replace(tmp_docs, self._path(DOCS_FILE))
+
+        ivf_path = self._path(IVF_FILE)
+        if self._ivf is not None:
+            tmp_ivf = ivf_path + ".tmp.npz"
+            np.savez(tmp_ivf, **self._ivf)
+            os.replace(tmp_ivf, ivf_path)
+        elif os.path.exists(ivf_path):
+            os.remove(ivf_path)
+
+        # Mở lại bằng memory-map để không giữ bản sao trong RAM
+        self._vectors = np.load(self._path(VECTORS_FILE), mmap_mode="r")
+
+    # ============== Writes ==============
+
+    def add_embeddings(
+        self,
+        texts: Sequence[str],
+        vectors: np.ndarray,
+        metadatas: Optional[Sequence[Dict[str, Any]]] = None,
+        ids: Optional[Sequence[str]] = None,
+        reindex: bool = True,
+    ) -> List[str]:
+        """
+        Thêm (hoặc ghi đè theo id) các vector đã tính sẵn.
+        reindex=False bỏ qua việc dựng lại IVF (k-means trên toàn bộ ma trận): người gọi
+        gộp nhiều thay đổi rồi gọi rebuild_ivf() một lần trước khi tìm kiếm / save.
+        """
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32)).astype(self.dtype)
+        ids = list(ids) if ids is not None else [str(uuid.uuid4()) for _ in texts]
+        metadatas = list(metadatas) if metadatas is not None else [{} for _ in texts]
+
+        existing = [doc_id for doc_id in ids if doc_id in self._id_to_row]
+        if existing:
+            self.delete(existing, reindex=False)
+
+        if self._vectors is None or self._vectors.size == 0:
+            self._vectors = vectors
+        else:
+            self._vectors = np.concatenate([np.asarray(self._vectors), vectors])
+        self._ids.extend(ids)
+        self._texts.extend(texts)
+        self._metadatas.extend(dict(m) for m in metadatas)
+        self._id_to_row = {doc_id: row for row, doc_id in enumerate(self._ids)}
+        if reindex:
+            self.rebuild_ivf()
+        return ids
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[Sequence[Dict[str, Any]]] = None,
+        ids: Optional[Sequence[str]] = None,
+        **kwargs,
+    ) -> List[str]:
+        texts = list(texts)
+        if not texts:
+            return []
+        vectors = np.asarray(self.embedding.embed_documents(texts), dtype=np.float32)
+        return self.add_embeddings(texts, vectors, metadatas=metadatas, ids=ids)
+
+    def add_documents(self, documents: List[Document], ids: Optional[Sequence[str]] = None, **kwargs) -> List[str]:
+        return self.add_texts(
+            [d.page_content for d in documents],
+            metadatas=[d.metadata for d in documents],
+            ids=ids,
+        )
+
+    def delete(self, ids: Optional[Sequence[str]] = None, reindex: bool = True, **kwargs) -> bool:
+        """Xoá theo id (reindex=False: như add_embeddings, IVF dựng lại sau bằng rebuild_ivf())."""
+        rows = {self._id_to_row[doc_id] for doc_id in (ids or []) if doc_id in self._id_to_row}
+        if not rows:
+            return False
+        keep = np.array([row for row in range(len(self._ids)) if row not in rows], dtype=np.int64)
+        self._vectors = np.asarray(self._vectors)[keep]
+        self._ids = [self._ids[row] for row in keep]
+        self._texts = [self._texts[row] for row in keep]
+        self._metadatas = [self._metadatas[row] for row in keep]
+        self._id_to_row = {doc_id: row for row, doc_id in enumerate(self._ids)}
+        if reindex:
+            self.rebuild_ivf()
+        return True
+
+    @classmethod
+    def from_documents(cls, documents: List[Document], embedding, index_dir: str, **kwargs) -> "LocalVectorStore":
+        store = cls(embedding, index_dir, **kwargs)
+        store.add_documents(documents)
+        store.save()
+        return store
+
+    # ============== Approximate index (IVF) ==============
+
+    def rebuild_ivf(self) -> None:
+        """Dựng lại IVF theo các vector hiện có (bỏ IVF nếu ít hơn ivf_min_rows dòng)."""
+        n_rows = len(self._ids)
+        if n_rows < self.ivf_min_rows:
+            self._ivf = None
+            return
+        self._ivf = build_ivf(np.asarray(self._vectors, dtype=np.float32))
+
+    def _candidate_rows(self, query: np.ndarray) -> Optional[np.ndarray]:
+        if self._ivf is None:
+            return None
+        centroids = self._ivf["centroids"]
+        offsets = self._ivf["offsets"]
+        order = self._ivf["order"]
+        nearest = _top_k(centroids @ query, min(self.ivf_nprobe, centroids.shape[0]))
+        return np.concatenate([order[offsets[c]:offsets[c + 1]] for c in nearest])
+
+    # ============== Search ==============
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def _scores(self, query: np.ndarray, rows: Optional[np.ndarray]) -> np.ndarray:
+        if rows is not None:
+            return np.asarray(self._vectors[np.sort(rows)], dtype=np.float32) @ query
+        blocks = []
+        for start in range(0, len(self._ids), SEARCH_BLOCK_ROWS):
+            block = self._vectors[start:start + SEARCH_BLOCK_ROWS]
+            blocks.append(np.asarray(block, dtype=np.float32) @ query)
+        return np.concatenate(blocks)
+
+    def similarity_search_by_vector_with_score(self, embedding: Sequence[float], k: int = 4) -> List[Tuple[Document, float]]:
+        if not self._ids:
+            return []
+        query = _normalize(np.asarray(embedding, dtype=np.float32))
+        rows = self._candidate_rows(query)
+        scores = self._scores(query, rows)
+        row_ids = np.sort(rows) if rows is not None else None
+
+        results = []
+        for i in _top_k(scores, k):
+            row = int(row_ids[i]) if row_ids is not None else int(i)
+            metadata = dict(self._metadatas[row], id=self._ids[row])
+            results.append((Document(page_content=self._texts[row], metadata=metadata), float(scores[i])))
+        return results
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self.embedding.embed_query(query), k=k)
+
+    def similarity_search_by_vector(self, embedding: Sequence[float], k: int = 4, **kwargs) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k=k)]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k)]
+
+    async def asimilarity_search_by_vector(self, embedding: Sequence[float], k: int = 4, **kwargs) -> List[Document]:
+        from ..concurrency import run_cpu_bound
+
+        return await run_cpu_bound(self.similarity_search_by_vector, embedding, k)
+
+    async def asimilarity_search(self, query: str, k: int = 4, **kwargs) -> List[Document]:
+        from ..concurrency import run_cpu_bound
+
+        return await run_cpu_bound(self.similarity_search, query, k)
+
+
+def build_ivf(vectors: np.ndarray, n_lists: Optional[int] = None, n_iter: int = 10, seed: int = 0) -> Dict[str, np.ndarray]:
+    """
+    Build an inverted-file index with spherical k-means
+    Args:
+        vectors: L2-normalized matrix (N, D)
+        n_lists: Number of clusters (default ~ 4 * sqrt(N))
+        n_iter: Lloyd iterations
+        seed: Random seed for centroid initialisation
+    Returns:
+        Dict with centroids (C, D), order (N,) rows grouped by cluster, offsets (C + 1,)
+    """
+    n_rows = vectors.shape[0]
+    n_lists = n_lists or max(1, min(n_rows, int(4 * np.sqrt(n_rows))))
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(n_rows, size=n_lists, replace=False)].copy()
+
+    for _ in range(n_iter):
+        assignments = np.argmax(vectors @ centroids.T, axis=1)
+        for c in range(n_lists):
+            members = vectors[assignments == c]
+            if len(members):
+                centroids[c] = members.mean(axis=0)
+        centroids = _normalize(centroids)
+
+    assignments = np.argmax(vectors @ centroids.T, axis=1)
+    order = np.argsort(assignments, kind="stable")
+    offsets = np.zeros(n_lists + 1, dtype=np.int64)
+    np.cumsum(np.bincount(assignments, minlength=n_lists), out=offsets[1:])
+    return {"centroids": centroids.astype(np.float32), "order": order.astype(np.int64), "offsets": offsets}
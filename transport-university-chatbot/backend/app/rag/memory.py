@@ -0,0 +1,352 @@
+"""
+Bộ nhớ hội thoại cho RAG.
+
+- Lấy N lượt gần nhất của người dùng (một query dùng index (user_id, timestamp, id)).
+- Viết lại câu hỏi nối tiếp thành câu hỏi độc lập trước khi truy xuất
+  ("còn học phí thì sao?" -> "Học phí ngành Kỹ thuật xây dựng là bao nhiêu?").
+  Chỉ gọi LLM khi câu hỏi trông như câu nối tiếp (rất ngắn, hoặc có đại từ / từ
+  tham chiếu) và lượt trước mới diễn ra trong MEMORY_CONDENSE_WINDOW_SECONDS.
+- Các lượt cũ hơn được tóm tắt và cache theo người dùng; bản tóm tắt được cập nhật
+  dần (theo lô) ở background nên mỗi lượt mới không phải gửi lại cả transcript.
+  Nếu tóm tắt bị tụt lại sau các lượt đã đọc (vd. lần cập nhật trước lỗi), nó được
+  cập nhật tiếp từ mốc đã tóm tắt, mỗi lần một lô. Worker chưa có tóm tắt (cache
+  theo process) tóm tắt từ các lượt nó đọc được và ghi rõ là thiếu các lượt cũ hơn.
+- Lịch sử + các chunk truy xuất được ghép dưới một ngân sách token cố định
+  (tokenizer tiktoken, ước lượng theo ký tự nếu không tải được).
+"""
+import asyncio
+import logging
+import math
+import os
+import re
+import threading
+import unicodedata
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from ..cache import LRUCache
+from .llm_client import get_llm_client
+
+logger = logging.getLogger(__name__)
+
+MEMORY_ENABLED = os.getenv("MEMORY_ENABLED", "true").lower() == "true"
+# Số lượt gần nhất được đưa nguyên văn vào prompt
+MEMORY_RECENT_TURNS = int(os.getenv("MEMORY_RECENT_TURNS", "4"))
+# Cập nhật tóm tắt khi có từng này lượt cũ chưa được tóm tắt
+MEMORY_SUMMARY_BATCH = int(os.getenv("MEMORY_SUMMARY_BATCH", "4"))
+# Viết lại câu hỏi nối tiếp bằng LLM trước khi truy xuất
+MEMORY_CONDENSE = os.getenv("MEMORY_CONDENSE", "true").lower() == "true"
+# Chỉ viết lại khi lượt trước cách đây không quá khoảng này (người dùng quay lại sau đó là hỏi câu mới)
+MEMORY_CONDENSE_WINDOW_SECONDS = float(os.getenv("MEMORY_CONDENSE_WINDOW_SECONDS", "1800"))
+# Câu hỏi có từ này số từ trở xuống được coi là câu nối tiếp ("còn cơ sở 2?")
+MEMORY_FOLLOW_UP_MAX_WORDS = int(os.getenv("MEMORY_FOLLOW_UP_MAX_WORDS", "3"))
+# Ngân sách token cho toàn bộ prompt và phần lịch sử (tóm tắt + các lượt gần nhất)
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "3500"))
+MEMORY_HISTORY_TOKEN_BUDGET = int(os.getenv("MEMORY_HISTORY_TOKEN_BUDGET", "1000"))
+MEMORY_SUMMARY_MAX_TOKENS = int(os.getenv("MEMORY_SUMMARY_MAX_TOKENS", "300"))
+MEMORY_SUMMARY_CACHE_SIZE = int(os.getenv("MEMORY_SUMMARY_CACHE_SIZE", "10000"))
+MEMORY_SUMMARY_CACHE_TTL_SECONDS = float(os.getenv("MEMORY_SUMMARY_CACHE_TTL_SECONDS", "86400"))
+# Bảng mã tiktoken (o200k_base gần với tokenizer của các model gpt-oss / gpt-4o)
+LLM_TOKENIZER = os.getenv("LLM_TOKENIZER", "o200k_base")
+
+CONDENSE_PROMPT = """Dựa vào đoạn hội thoại dưới đây, hãy viết lại câu hỏi cuối của người dùng thành MỘT câu hỏi độc lập, đầy đủ ý, bằng tiếng Việt, để dùng cho việc tìm kiếm tài liệu. Chỉ trả về câu hỏi, không giải thích.
+
+Hội thoại:
+{history}
+
+Câu hỏi cuối: {question}
+
+Câu hỏi độc lập:"""
+
+# Đại từ / từ tham chiếu tới lượt trước
+_FOLLOW_UP = re.compile(
+    r"(?:^còn\b|^thế còn\b|\bthì sao\b|\bnó\b|\bđó\b|\bđấy\b|\bnày\b|\bấy\b|\bkia\b"
+    r"|\bhọ\b|\bvậy\b|\btrên\b|\bnữa\b|\btương tự\b)",
+    re.UNICODE,
+)
+
+SUMMARY_PROMPT = """Tóm tắt ngắn gọn (tối đa {max_words} từ) cuộc hội thoại giữa sinh viên và trợ lý của Trường Đại học Giao thông Vận tải. Giữ lại các thông tin quan trọng: ngành, cơ sở, năm, con số, tên riêng mà người dùng quan tâm.
+
+Tóm tắt trước đó:
+{summary}
+
+Các lượt mới:
+{history}
+
+Tóm tắt mới:"""
+
+
+# ============== Tokens ==============
+
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    """Bảng mã tiktoken, hoặc None nếu không có (chưa cài / không tải được khi offline)."""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        with _encoding_lock:
+            if not _encoding_loaded:
+                try:
+                    import tiktoken
+
+                    _encoding = tiktoken.get_encoding(LLM_TOKENIZER)
+                except Exception as e:
+                    logger.warning(f"⚠️ Không nạp được tokenizer '{LLM_TOKENIZER}' ({e}), ước lượng token theo ký tự.")
+                    _encoding = None
+                _encoding_loaded = True
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """Số token của text (ước lượng dư ~1 token / 3 ký tự nếu không có tiktoken)."""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is None:
+        return math.ceil(len(text) / 3)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cắt text để không vượt quá max_tokens."""
+    if max_tokens <= 0:
+        return ""
+    encoding = _get_encoding()
+    if encoding is None:
+        return text[:max_tokens * 3]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
+
+
+# ============== Conversation ==============
+
+@dataclass
+class Turn:
+    id: UUID
+    timestamp: datetime
+    question: str
+    answer: str
+
+    def render(self) -> str:
+        return f"Người dùng: {self.question}\nTrợ lý: {self.answer}"
+
+
+@dataclass
+class Conversation:
+    """Ngữ cảnh hội thoại của một người dùng, cũ -> mới."""
+    user_id: Optional[UUID] = None
+    summary: str = ""
+    turns: List[Turn] = field(default_factory=list)
+    # Thời điểm lượt mới nhất (kể cả lượt đã được tóm tắt)
+    last_turn_at: Optional[datetime] = None
+
+    def __bool__(self) -> bool:
+        return bool(self.summary or self.turns)
+
+
+@dataclass
+class _Summary:
+    text: str
+    # Lượt mới nhất đã được gộp vào tóm tắt
+    until: Tuple[datetime, UUID]
+
+
+summary_cache = LRUCache(maxsize=MEMORY_SUMMARY_CACHE_SIZE, ttl=MEMORY_SUMMARY_CACHE_TTL_SECONDS)
+_summarizing = set()
+_background_tasks = set()
+
+
+def _render_turns(turns: Sequence[Turn]) -> str:
+    return "\n\n".join(turn.render() for turn in turns)
+
+
+def _turn(row) -> Turn:
+    return Turn(id=row.id, timestamp=row.timestamp, question=row.message, answer=row.response or "")
+
+
+async def aload_conversation(db, user_id: UUID) -> Conversation:
+    """
+    Lấy ngữ cảnh hội thoại: tóm tắt đã cache + các lượt chưa được tóm tắt.
+    Chỉ đọc tối đa MEMORY_RECENT_TURNS + MEMORY_SUMMARY_BATCH lượt mới nhất. Khi đã đủ
+    một lô lượt cũ chưa tóm tắt, tóm tắt được cập nhật ở background cho các lượt sau;
+    nếu mốc tóm tắt nằm trước các lượt đọc được thì lô đó được đọc ngay sau mốc.
+    """
+    from ..services.chat_service import get_chat_history_after_async, get_recent_chat_history_async
+
+    window = MEMORY_RECENT_TURNS + MEMORY_SUMMARY_BATCH
+    rows = await get_recent_chat_history_async(db, user_id, limit=window)
+    turns = [_turn(row) for row in reversed(rows)]
+    # Cửa sổ đầy: có thể còn các lượt cũ hơn lượt đầu tiên đọc được
+    truncated = len(rows) >= window
+
+    cached: Optional[_Summary] = summary_cache.get(user_id)
+    if cached is not None:
+        unsummarized = [turn for turn in turns if (turn.timestamp, turn.id) > cached.until]
+        behind = truncated and len(unsummarized) == len(turns)
+        turns = unsummarized
+    else:
+        behind = False
+
+    if behind:
+        # Mốc tóm tắt nằm trước cửa sổ: tóm tắt tiếp lô kế tiếp sau mốc, không bỏ sót lượt nào
+        older = [_turn(row) for row in await get_chat_history_after_async(db, user_id, cached.until, MEMORY_SUMMARY_BATCH)]
+    else:
+        older = turns[:-MEMORY_RECENT_TURNS] if MEMORY_RECENT_TURNS else turns
+    if len(older) >= MEMORY_SUMMARY_BATCH and user_id not in _summarizing:
+        _summarizing.add(user_id)
+        earlier_missing = cached is None and truncated
+        task = asyncio.create_task(_refresh_summary(user_id, cached, older, earlier_missing))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+
+    # Các lượt cũ chưa tóm tắt vẫn được giữ lại; fit_prompt sẽ bỏ bớt nếu vượt ngân sách
+    return Conversation(
+        user_id=user_id,
+        summary=cached.text if cached else "",
+        turns=turns,
+        last_turn_at=rows[0].timestamp if rows else None,
+    )
+
+
+async def _refresh_summary(
+    user_id: UUID, previous: Optional[_Summary], turns: List[Turn], earlier_missing: bool = False
+) -> None:
+    try:
+        text = await asummarize(previous.text if previous else "", turns, earlier_missing)
+        summary_cache.set(user_id, _Summary(text=text, until=(turns[-1].timestamp, turns[-1].id)))
+    except Exception as e:
+        logger.warning(f"⚠️ Không cập nhật được tóm tắt hội thoại: {e}")
+    finally:
+        _summarizing.discard(user_id)
+
+
+def forget_conversation(user_id: UUID) -> None:
+    """Xoá tóm tắt đã cache (gọi khi người dùng xoá lịch sử)."""
+    summary_cache.pop(user_id)
+
+
+# ============== LLM helpers ==============
+
+async def asummarize(previous_summary: str, turns: Sequence[Turn], earlier_missing: bool = False) -> str:
+    """
+    Gộp các lượt mới vào bản tóm tắt trước đó.
+    earlier_missing: có các lượt cũ hơn không nằm trong tóm tắt trước đó (chỉ đọc được cửa sổ gần nhất)
+    """
+    if previous_summary:
+        previous = previous_summary
+    else:
+        previous = "(chưa có; có thể còn các lượt cũ hơn chưa được tóm tắt)" if earlier_missing else "(chưa có)"
+    prompt = SUMMARY_PROMPT.format(
+        max_words=MEMORY_SUMMARY_MAX_TOKENS // 2,
+        summary=previous,
+        history=truncate_to_tokens(_render_turns(turns), MEMORY_HISTORY_TOKEN_BUDGET * 2),
+    )
+    summary = await get_llm_client().agenerate(prompt)
+    return truncate_to_tokens(summary.strip(), MEMORY_SUMMARY_MAX_TOKENS)
+
+
+def looks_like_follow_up(question: str) -> bool:
+    """Câu hỏi rất ngắn hoặc có đại từ / từ tham chiếu tới lượt trước."""
+    text = unicodedata.normalize("NFC", question).lower().strip()
+    return len(text.split()) <= MEMORY_FOLLOW_UP_MAX_WORDS or _FOLLOW_UP.search(text) is not None
+
+
+def needs_condense(question: str, conversation: Optional[Conversation], now: Optional[datetime] = None) -> bool:
+    """
+    Có cần viết lại câu hỏi bằng LLM không: chỉ với câu nối tiếp của một cuộc hội
+    thoại còn đang diễn ra (lượt trước trong MEMORY_CONDENSE_WINDOW_SECONDS).
+    """
+    if not MEMORY_CONDENSE or not conversation or conversation.last_turn_at is None:
+        return False
+    elapsed = ((now or datetime.utcnow()) - conversation.last_turn_at).total_seconds()
+    return elapsed <= MEMORY_CONDENSE_WINDOW_SECONDS and looks_like_follow_up(question)
+
+
+async def acondense_question(question: str, conversation: Conversation) -> str:
+    """Câu hỏi độc lập dùng cho truy xuất (giữ nguyên nếu không phải câu nối tiếp)."""
+    if not needs_condense(question, conversation):
+        return question
+    history = conversation.summary
+    if conversation.turns:
+        recent = _render_turns(conversation.turns[-2:])
+        history = f"{history}\n\n{recent}" if history else recent
+    prompt = CONDENSE_PROMPT.format(
+        history=truncate_to_tokens(history, MEMORY_HISTORY_TOKEN_BUDGET),
+        question=question,
+    )
+    try:
+        condensed = (await get_llm_client().agenerate(prompt)).strip()
+    except Exception as e:
+        logger.warning(f"⚠️ Không viết lại được câu hỏi, dùng câu gốc: {e}")
+        return question
+    return condensed.splitlines()[0].strip() if condensed else question
+
+
+# ============== Prompt budget ==============
+
+def fit_history(conversation: Optional[Conversation], max_tokens: int) -> str:
+    """Tóm tắt + các lượt gần nhất (ưu tiên lượt mới), không vượt quá max_tokens."""
+    if not conversation or max_tokens <= 0:
+        return ""
+    parts: List[str] = []
+    used = 0
+    for turn in reversed(conversation.turns):
+        text = turn.render()
+        tokens = count_tokens(text) + 1
+        if used + tokens > max_tokens:
+            break
+        parts.append(text)
+        used += tokens
+    parts.reverse()
+    if conversation.summary and used < max_tokens:
+        summary = truncate_to_tokens(f"(Tóm tắt trước đó) {conversation.summary}", max_tokens - used)
+        if summary:
+            parts.insert(0, summary)
+    return "\n\n".join(parts)
+
+
+def fit_context(chunks: Sequence[str], max_tokens: int) -> str:
+    """Các chunk theo thứ tự xếp hạng cho tới khi hết ngân sách (chunk cuối có thể bị cắt)."""
+    parts: List[str] = []
+    used = 0
+    for chunk in chunks:
+        remaining = max_tokens - used
+        if remaining <= 0:
+            break
+        tokens = count_tokens(chunk) + 1
+        if tokens > remaining:
+            chunk = truncate_to_tokens(chunk, remaining - 1)
+            tokens = remaining
+        if chunk:
+            parts.append(chunk)
+        used += tokens
+    return "\n".join(parts)
+
+
+def fit_prompt(
+    fixed_tokens: int,
+    chunks: Sequence[str],
+    conversation: Optional[Conversation] = None,
+    budget: int = PROMPT_TOKEN_BUDGET,
+    history_budget: int = MEMORY_HISTORY_TOKEN_BUDGET,
+) -> Tuple[str, str]:
+    """
+    Chia ngân sách token của prompt giữa lịch sử và ngữ cảnh truy xuất.
+    Args:
+        fixed_tokens: Token của phần cố định (chỉ dẫn + câu hỏi)
+        chunks: Nội dung các Document đã truy xuất, theo thứ tự xếp hạng
+        conversation: Ngữ cảnh hội thoại (có thể None)
+    Returns:
+        (context, history) sao cho tổng prompt không vượt quá budget
+    """
+    available = max(0, budget - fixed_tokens)
+    history = fit_history(conversation, min(history_budget, available // 2))
+    context = fit_context(chunks, available - count_tokens(history))
+    return context, history
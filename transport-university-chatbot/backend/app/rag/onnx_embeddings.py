@@ -0,0 +1,221 @@
+"""
+Backend embedding chạy bằng ONNX Runtime trên CPU (EMBEDDING_BACKEND=onnx).
+
+So với sentence-transformers/PyTorch: import nhẹ (không cần torch khi chạy), nạp
+nhanh, encode nhanh hơn và tốn ít RAM hơn, nhất là với bản lượng tử hoá int8 động.
+
+Export một lần (cần torch + transformers, chỉ ở máy build):
+    python -m app.rag.onnx_embeddings --model AITeamVN/Vietnamese_Embedding --output ../data/onnx_embedding --quantize
+
+Cấu trúc thư mục model:
+    model.onnx         đồ thị fp32
+    model.int8.onnx    (tuỳ chọn) bản lượng tử hoá int8 động
+    tokenizer.json     tokenizer (thư viện `tokenizers`, không cần transformers)
+    embedding.json     {"model", "pooling": "cls" | "mean", "normalize", "max_length", "dim", "pad_id", "pad_token"}
+
+Kiểm tra chất lượng so với fp32: python -m benchmarks.embedding_quality
+"""
+import argparse
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+ONNX_MODEL_DIR = os.getenv(
+    "ONNX_MODEL_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))), "data", "onnx_embedding"),
+)
+# Dùng model.int8.onnx (nếu đã export) thay cho model.onnx
+ONNX_QUANTIZED = os.getenv("ONNX_QUANTIZED", "true").lower() == "true"
+ONNX_THREADS = int(os.getenv("ONNX_THREADS", str(min(4, os.cpu_count() or 1))))
+ONNX_BATCH_SIZE = int(os.getenv("ONNX_BATCH_SIZE", "16"))
+
+FP32_FILE = "model.onnx"
+INT8_FILE = "model.int8.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+CONFIG_FILE = "embedding.json"
+
+
+def pool(last_hidden: np.ndarray, attention_mask: np.ndarray, mode: str = "cls", normalize: bool = True) -> np.ndarray:
+    """
+    Gộp hidden state (B, T, H) thành vector câu (B, H) như sentence-transformers
+    Args:
+        mode: "cls" (token đầu, như BGE-M3) hoặc "mean" (trung bình các token thật)
+    """
+    if mode == "cls":
+        vectors = last_hidden[:, 0]
+    elif mode == "mean":
+        mask = attention_mask[..., None].astype(last_hidden.dtype)
+        vectors = (last_hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+    else:
+        raise ValueError(f"Unknown pooling mode '{mode}'")
+    vectors = vectors.astype(np.float32)
+    if normalize:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        vectors = vectors / norms
+    return vectors
+
+
+def model_file(model_dir: str = ONNX_MODEL_DIR, quantized: bool = ONNX_QUANTIZED) -> str:
+    """Đường dẫn file .onnx sẽ dùng (int8 nếu được yêu cầu và đã export)."""
+    int8_path = os.path.join(model_dir, INT8_FILE)
+    if quantized and os.path.exists(int8_path):
+        return int8_path
+    return os.path.join(model_dir, FP32_FILE)
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    LangChain Embeddings over an exported ONNX encoder.
+
+    Usage:
+        embeddings = OnnxEmbeddings("../data/onnx_embedding", quantized=True, threads=4)
+        vector = embeddings.embed_query("Học phí bao nhiêu?")
+    """
+
+    def __init__(
+        self,
+        model_dir: str = ONNX_MODEL_DIR,
+        quantized: bool = ONNX_QUANTIZED,
+        threads: int = ONNX_THREADS,
+        batch_size: int = ONNX_BATCH_SIZE,
+    ):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(model_dir, CONFIG_FILE), encoding="utf-8") as f:
+            self.config: Dict[str, Any] = json.load(f)
+        self.model_path = model_file(model_dir, quantized)
+        self.batch_size = max(1, batch_size)
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(self.model_path, options, providers=["CPUExecutionProvider"])
+        self._input_names = {i.name for i in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=self.config.get("max_length", 512))
+        self.tokenizer.enable_padding(pad_id=self.config.get("pad_id", 0), pad_token=self.config.get("pad_token", "[PAD]"))
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        inputs = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+        }
+        if "token_type_ids" in self._input_names:
+            inputs["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+        last_hidden = self.session.run(None, inputs)[0]
+        return pool(
+            last_hidden,
+            inputs["attention_mask"],
+            mode=self.config.get("pooling", "cls"),
+            normalize=self.config.get("normalize", True),
+        )
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        # Xếp theo độ dài để mỗi lô ít padding, rồi trả lại đúng thứ tự
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        vectors = np.zeros((len(texts), self.config["dim"]), dtype=np.float32)
+        for start in range(0, len(order), self.batch_size):
+            rows = order[start:start + self.batch_size]
+            vectors[rows] = self._encode_batch([texts[i] for i in rows])
+        return vectors.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+# ============== Export ==============
+
+def _sentence_transformers_pooling(model_name: str) -> Dict[str, Any]:
+    """Đọc cấu hình pooling/normalize của model sentence-transformers (mặc định CLS + normalize)."""
+    from huggingface_hub import hf_hub_download
+
+    pooling, normalize = "cls", True
+    try:
+        with open(hf_hub_download(model_name, "modules.json"), encoding="utf-8") as f:
+            modules = json.load(f)
+        normalize = any(m.get("type", "").endswith("Normalize") for m in modules)
+        pooling_module = next(m for m in modules if m.get("type", "").endswith("Pooling"))
+        with open(hf_hub_download(model_name, f"{pooling_module['path']}/config.json"), encoding="utf-8") as f:
+            config = json.load(f)
+        pooling = "cls" if config.get("pooling_mode_cls_token") else "mean"
+    except Exception:
+        pass
+    return {"pooling": pooling, "normalize": normalize}
+
+
+def export(model_name: str, output_dir: str, quantize: bool = True, max_length: int = 512, opset: int = 17) -> str:
+    """
+    Export model HuggingFace sang ONNX (trục batch/sequence động), tuỳ chọn lượng tử hoá int8
+    Returns:
+        Đường dẫn file .onnx sẽ được dùng
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+
+    sample = tokenizer(["Trường Đại học Giao thông Vận tải"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+    fp32_path = os.path.join(output_dir, FP32_FILE)
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+        )
+
+    tokenizer.backend_tokenizer.save(os.path.join(output_dir, TOKENIZER_FILE))
+    config = {
+        "model": model_name,
+        "max_length": max_length,
+        "dim": model.config.hidden_size,
+        "pad_id": tokenizer.pad_token_id or 0,
+        "pad_token": tokenizer.pad_token or "[PAD]",
+        **_sentence_transformers_pooling(model_name),
+    }
+    with open(os.path.join(output_dir, CONFIG_FILE), "w", encoding="utf-8") as f:
+        json.dump(config, f, ensure_ascii=False, indent=2)
+
+    if not quantize:
+        return fp32_path
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    int8_path = os.path.join(output_dir, INT8_FILE)
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    return int8_path
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    from .registry import EMBEDDING_MODEL
+
+    parser = argparse.ArgumentParser(description="Export the embedding model to ONNX (optionally int8)")
+    parser.add_argument("--model", default=EMBEDDING_MODEL)
+    parser.add_argument("--output", default=ONNX_MODEL_DIR)
+    parser.add_argument("--quantize", action="store_true", help="also write a dynamic int8 model")
+    parser.add_argument("--max-length", type=int, default=512)
+    args = parser.parse_args(argv)
+
+    path = export(args.model, args.output, quantize=args.quantize, max_length=args.max_length)
+    print(f"✅ Đã export {args.model} -> {path} ({os.path.getsize(path) / 1e6:.0f} MB)")
+
+
+if __name__ == "__main__":
+    main()
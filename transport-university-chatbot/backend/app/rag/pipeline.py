@@ -0,0 +1,204 @@
+"""
+Luồng RAG đầy đủ cho một câu hỏi: FAQ tính sẵn -> cache -> truy xuất -> rerank (tuỳ chọn) -> sinh câu trả lời.
+
+Các hàm a* là bản async dùng cho route chat: phần CPU (embed) chạy trong thread
+pool RAG riêng, phần mạng (vector DB, LLM) dùng client async nên không chiếm
+worker thread của Starlette.
+"""
+import time
+
+from ..concurrency import run_blocking_io, run_cpu_bound
+from ..metrics import observe_stage, stage_timer
+from .answer_cache import ANSWER_CACHE_ENABLED, answer_cache
+from .embedding_batcher import aembed_query
+from .faq_store import FAQ_ENABLED, faq_store
+from .retriever import (
+    aretrieve_documents,
+    describe_sources,
+    format_context,
+    retrieve_documents,
+)
+from .generator import agenerate_answer, astream_answer, build_prompt, generate_answer, stream_answer
+from .memory import acondense_question, count_tokens, fit_prompt, needs_condense
+from .registry import registry
+from .reranker import RERANK_ENABLED, RERANK_MAX_CANDIDATES
+
+# Số chunk đưa vào prompt khi không rerank
+RETRIEVAL_TOP_K = 3
+
+
+def _retrieval_depth():
+    """Rerank cần tập ứng viên rộng hơn số chunk cuối cùng đưa vào prompt."""
+    return RERANK_MAX_CANDIDATES if RERANK_ENABLED else RETRIEVAL_TOP_K
+
+
+def _rerank(question, docs):
+    """(docs đã rerank, thời gian rerank tính bằng ms); giữ nguyên nếu tắt rerank."""
+    reranker = registry.get_reranker()
+    if reranker is None:
+        return docs, None
+    result = reranker.rerank(question, docs)
+    observe_stage("rerank", result.seconds)
+    return result.docs, round(result.seconds * 1000, 2)
+
+
+def _retrieve(question):
+    return _rerank(question, retrieve_documents(question, top_k=_retrieval_depth()))[0]
+
+
+def _faq_context(match):
+    return {"cached": True, "cache_tier": "faq", "sources": match.sources, "rerank_ms": None}
+
+
+def answer_with_sources(question):
+    """Trả lời không qua FAQ / answer cache, kèm các Document làm ngữ cảnh (dùng khi tính sẵn FAQ)."""
+    docs = _retrieve(question)
+    return generate_answer(question, format_context(docs)), docs
+
+
+def answer_question(question):
+    """Trả lời câu hỏi, dùng FAQ / answer cache nếu câu hỏi (hoặc câu tương tự) đã được trả lời."""
+    faq = faq_store.lookup(question) if FAQ_ENABLED else None
+    if faq is not None and faq.answer is not None:
+        return faq.answer
+    if not ANSWER_CACHE_ENABLED:
+        return generate_answer(question, format_context(_retrieve(question)))
+
+    lookup = answer_cache.lookup(question)
+    if lookup.answer is not None:
+        return lookup.answer
+
+    context = format_context(_retrieve(question))
+    answer = generate_answer(question, context)
+    answer_cache.store(question, answer, embedding=lookup.embedding)
+    return answer
+
+
+def stream_answer_events(question):
+    """
+    Trả lời câu hỏi dạng stream.
+    Yield lần lượt ("context", metadata truy xuất) rồi nhiều ("token", đoạn text).
+    """
+    faq = faq_store.lookup(question) if FAQ_ENABLED else None
+    if faq is not None and faq.answer is not None:
+        yield "context", _faq_context(faq)
+        yield "token", faq.answer
+        return
+
+    lookup = answer_cache.lookup(question) if ANSWER_CACHE_ENABLED else None
+    if lookup is not None and lookup.answer is not None:
+        yield "context", {"cached": True, "cache_tier": lookup.tier, "sources": [], "rerank_ms": None}
+        yield "token", lookup.answer
+        return
+
+    docs, rerank_ms = _rerank(question, retrieve_documents(question, top_k=_retrieval_depth()))
+    yield "context", {"cached": False, "cache_tier": None, "sources": describe_sources(docs), "rerank_ms": rerank_ms}
+
+    parts = []
+    for delta in stream_answer(question, format_context(docs)):
+        parts.append(delta)
+        yield "token", delta
+
+    if lookup is not None:
+        answer_cache.store(question, "".join(parts), embedding=lookup.embedding)
+
+
+# ============== Async ==============
+
+async def _lookup_faq(question):
+    if not FAQ_ENABLED:
+        return None
+    return await faq_store.alookup(question, aembed_query)
+
+
+async def _lookup_cache(question):
+    if not ANSWER_CACHE_ENABLED:
+        return None
+    # Tầng ngữ nghĩa cần embedding câu hỏi: encode chung lô với các request đồng thời
+    return await answer_cache.alookup(question, aembed_query)
+
+
+async def _store_cache(question, answer, lookup):
+    if lookup is not None:
+        # store có thể ghi xuống Postgres (ANSWER_CACHE_PERSIST)
+        await run_blocking_io(answer_cache.store, question, answer, lookup.embedding)
+
+
+async def _aretrieve(question, lookup):
+    """Truy xuất + rerank (cross-encoder chạy trong thread pool RAG); trả về (docs, rerank_ms)."""
+    docs = await aretrieve_documents(
+        question, top_k=_retrieval_depth(), embedding=lookup.embedding if lookup else None
+    )
+    if not RERANK_ENABLED:
+        return docs, None
+    return await run_cpu_bound(_rerank, question, docs)
+
+
+def _fit_prompt(question, docs, conversation):
+    """(context, history) của prompt, giới hạn trong PROMPT_TOKEN_BUDGET."""
+    fixed_tokens = count_tokens(build_prompt(question, "", ""))
+    return fit_prompt(fixed_tokens, [d.page_content for d in docs], conversation)
+
+
+async def _search_question(question, conversation, lookup):
+    """
+    Câu hỏi dùng cho truy xuất và lookup cache tương ứng. FAQ / cache đã được tra bằng
+    câu gốc; chỉ câu nối tiếp mới được viết lại (một lần gọi LLM), và khi đó lookup bị
+    bỏ: embedding của câu gốc không dùng cho truy xuất được, còn câu trả lời phụ thuộc
+    vào hội thoại nên không được cache theo câu gốc.
+    """
+    if not needs_condense(question, conversation):
+        return question, lookup
+    with stage_timer("condense"):
+        return await acondense_question(question, conversation), None
+
+
+async def aanswer_question(question, conversation=None):
+    """
+    Bản async của answer_question.
+    conversation (memory.Conversation) cho phép trả lời câu hỏi nối tiếp.
+    """
+    faq = await _lookup_faq(question)
+    if faq is not None and faq.answer is not None:
+        return faq.answer
+    lookup = await _lookup_cache(question)
+    if lookup is not None and lookup.answer is not None:
+        return lookup.answer
+
+    search_question, lookup = await _search_question(question, conversation, lookup)
+    docs, _ = await _aretrieve(search_question, lookup)
+    context, history = _fit_prompt(question, docs, conversation)
+    with stage_timer("llm_total"):
+        answer = await agenerate_answer(question, context, history)
+    await _store_cache(question, answer, lookup)
+    return answer
+
+
+async def astream_answer_events(question, conversation=None):
+    """Bản async của stream_answer_events."""
+    faq = await _lookup_faq(question)
+    if faq is not None and faq.answer is not None:
+        yield "context", _faq_context(faq)
+        yield "token", faq.answer
+        return
+    lookup = await _lookup_cache(question)
+    if lookup is not None and lookup.answer is not None:
+        yield "context", {"cached": True, "cache_tier": lookup.tier, "sources": [], "rerank_ms": None}
+        yield "token", lookup.answer
+        return
+
+    search_question, lookup = await _search_question(question, conversation, lookup)
+    docs, rerank_ms = await _aretrieve(search_question, lookup)
+    yield "context", {"cached": False, "cache_tier": None, "sources": describe_sources(docs), "rerank_ms": rerank_ms}
+
+    context, history = _fit_prompt(question, docs, conversation)
+    parts = []
+    started = time.perf_counter()
+    async for delta in astream_answer(question, context, history):
+        if not parts:
+            observe_stage("llm_first_token", time.perf_counter() - started)
+        parts.append(delta)
+        yield "token", delta
+    observe_stage("llm_total", time.perf_counter() - started)
+
+    await _store_cache(question, "".join(parts), lookup)
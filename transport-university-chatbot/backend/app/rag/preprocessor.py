@@ -1,6 +1,19 @@
 from langchain_community.document_loaders import PyPDFLoader, DirectoryLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+
+
+def create_splitter():
+    """Bộ chia đoạn dùng chung cho mọi nguồn dữ liệu."""
+    return RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
+        separators=["\n\n", "\n", ".", " "]
+    )
+
+
 def load_and_split_pdf(file_path):
     """Đọc PDF và chia thành các đoạn nhỏ."""
     loader= DirectoryLoader(file_path,
@@ -8,10 +21,11 @@ def load_and_split_pdf(file_path):
                             loader_cls=PyPDFLoader)
     documents = loader.load()
 
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=200,
-        separators=["\n\n", "\n", ".", " "]
-    )
-    chunks = splitter.split_documents(documents)
+    chunks = create_splitter().split_documents(documents)
     return chunks
+
+
+def load_and_split_file(file_path):
+    """Đọc một file PDF và chia thành các đoạn nhỏ."""
+    documents = PyPDFLoader(file_path).load()
+    return create_splitter().split_documents(documents)
@@ -0,0 +1,292 @@
+"""
+Gom cụm các câu hỏi gần trùng nhau của người dùng (cho thống kê câu hỏi thường gặp).
+
+"Học phí bao nhiêu?" và "học phí của trường là bao nhiêu" là cùng một ý định nhưng
+khác chuỗi, nên đếm theo chuỗi chính xác sẽ tách rời chúng. Job này:
+
+- đọc theo lô các câu hỏi (chat_history, role="user") chưa được gán cụm;
+- câu hỏi có question_key đã gặp thì dùng lại cụm cũ, không cần embed;
+- embed các câu mới theo lô bằng model embedding dùng chung của registry;
+- gán tăng dần (leader clustering): vào cụm có tâm gần nhất nếu cosine >=
+  QUESTION_CLUSTER_THRESHOLD, ngược lại mở cụm mới; tâm cụm là trung bình đã chuẩn hoá;
+- cuối mỗi lần chạy đếm lại kích thước cụm (bỏ các câu đã bị xoá) và chọn câu đại
+  diện là cách hỏi được hỏi nhiều nhất trong cụm.
+
+/api/dashboard đọc top cụm từ bảng question_clusters (xem stats_service.top_clusters).
+
+Chạy định kỳ (cron), từ thư mục backend:
+    python -m app.rag.question_clusters                 # xử lý các câu hỏi mới
+    python -m app.rag.question_clusters --rebuild       # xoá cụm cũ, gom lại từ đầu (đổi model/ngưỡng)
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+QUESTION_CLUSTER_THRESHOLD = float(os.getenv("QUESTION_CLUSTER_THRESHOLD", "0.85"))
+QUESTION_CLUSTER_BATCH_SIZE = int(os.getenv("QUESTION_CLUSTER_BATCH_SIZE", "256"))
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class ClusterIndex:
+    """
+    In-memory centroids for incremental (leader) clustering.
+
+    Usage:
+        index = ClusterIndex(threshold=0.85)
+        slot = index.assign(vector)      # existing slot, or a new one
+        index.centroid(slot)             # normalized running mean
+    """
+
+    def __init__(self, threshold: float = QUESTION_CLUSTER_THRESHOLD, dim: Optional[int] = None):
+        self.threshold = threshold
+        self._sums = np.zeros((0, dim or 0), dtype=np.float32)     # tổng vector của các thành viên
+        self._centroids = np.zeros((0, dim or 0), dtype=np.float32)
+        self.ids: List[Optional[int]] = []                          # id trong DB (None: cụm mới)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, centroid: np.ndarray, size: int, cluster_id: Optional[int] = None) -> int:
+        centroid = _normalize(np.asarray(centroid, dtype=np.float32).reshape(1, -1))
+        if self._centroids.shape[1] == 0:
+            self._sums = np.zeros((0, centroid.shape[1]), dtype=np.float32)
+            self._centroids = np.zeros((0, centroid.shape[1]), dtype=np.float32)
+        self._sums = np.vstack([self._sums, centroid * max(size, 1)])
+        self._centroids = np.vstack([self._centroids, centroid])
+        self.ids.append(cluster_id)
+        return len(self.ids) - 1
+
+    def assign(self, vector: np.ndarray) -> int:
+        """Slot of the closest cluster (updating its centroid), or of a new cluster."""
+        vector = _normalize(np.asarray(vector, dtype=np.float32).reshape(1, -1))[0]
+        if len(self):
+            scores = self._centroids @ vector
+            best = int(np.argmax(scores))
+            if scores[best] >= self.threshold:
+                self._sums[best] += vector
+                self._centroids[best] = _normalize(self._sums[best:best + 1])[0]
+                return best
+        return self.add(vector, 1)
+
+    def centroid(self, slot: int) -> np.ndarray:
+        return self._centroids[slot]
+
+
+def _load_index(db, namespace: str, threshold: float) -> ClusterIndex:
+    from sqlalchemy import select
+
+    from ..models.stats import QuestionCluster
+
+    index = ClusterIndex(threshold)
+    rows = db.execute(select(QuestionCluster.id, QuestionCluster.centroid, QuestionCluster.size, QuestionCluster.embedding_model))
+    for cluster_id, centroid, size, model in rows:
+        if model != namespace:
+            raise RuntimeError(
+                f"Cụm câu hỏi được tạo bằng model '{model}', khác model hiện tại '{namespace}'; chạy lại với --rebuild"
+            )
+        index.add(np.frombuffer(centroid, dtype=np.float32), size, cluster_id)
+    return index
+
+
+def _pending_questions(db, limit: int):
+    """Câu hỏi của người dùng chưa được gán cụm, cũ nhất trước."""
+    from sqlalchemy import select
+
+    from ..models.chat_history import ChatHistory
+    from ..models.stats import QuestionClusterMember
+
+    return db.execute(
+        select(ChatHistory.id, ChatHistory.message, ChatHistory.timestamp)
+        .outerjoin(QuestionClusterMember, QuestionClusterMember.chat_id == ChatHistory.id)
+        .where(ChatHistory.role == "user", QuestionClusterMember.chat_id.is_(None))
+        .order_by(ChatHistory.timestamp, ChatHistory.id)
+        .limit(limit)
+    ).all()
+
+
+def _known_keys(db, keys) -> Dict[str, int]:
+    """question_key -> cụm đã gán trước đó (không cần embed lại)."""
+    from sqlalchemy import select
+
+    from ..models.stats import QuestionClusterMember
+
+    if not keys:
+        return {}
+    rows = db.execute(
+        select(QuestionClusterMember.question_key, QuestionClusterMember.cluster_id)
+        .where(QuestionClusterMember.question_key.in_(list(keys)))
+    )
+    return {key: cluster_id for key, cluster_id in rows}
+
+
+def _refresh_clusters(db, cluster_ids=None) -> None:
+    """Đếm lại kích thước và chọn câu đại diện (cách hỏi phổ biến nhất) cho các cụm."""
+    from sqlalchemy import delete, func, select
+
+    from ..models.chat_history import ChatHistory
+    from ..models.stats import QuestionCluster, QuestionClusterMember
+
+    query = (
+        select(QuestionClusterMember.cluster_id, QuestionClusterMember.question_key, func.min(ChatHistory.message), func.count())
+        .join(ChatHistory, ChatHistory.id == QuestionClusterMember.chat_id)
+        .group_by(QuestionClusterMember.cluster_id, QuestionClusterMember.question_key)
+    )
+    if cluster_ids is not None:
+        query = query.where(QuestionClusterMember.cluster_id.in_(list(cluster_ids)))
+    sizes: Counter = Counter()
+    best: Dict[int, tuple] = {}
+    for cluster_id, _, message, count in db.execute(query):
+        sizes[cluster_id] += count
+        if cluster_id not in best or count > best[cluster_id][1]:
+            best[cluster_id] = (message, count)
+
+    clusters = db.scalars(
+        select(QuestionCluster) if cluster_ids is None else select(QuestionCluster).where(QuestionCluster.id.in_(list(cluster_ids)))
+    )
+    empty = []
+    for cluster in clusters:
+        if not sizes[cluster.id]:
+            empty.append(cluster.id)
+            continue
+        cluster.size = sizes[cluster.id]
+        cluster.representative = best[cluster.id][0]
+    if empty:
+        # Mọi câu hỏi của cụm đã bị xoá
+        db.execute(delete(QuestionClusterMember).where(QuestionClusterMember.cluster_id.in_(empty)))
+        db.execute(delete(QuestionCluster).where(QuestionCluster.id.in_(empty)))
+
+
+def cluster_questions(
+    session_factory: Optional[Callable] = None,
+    embeddings=None,
+    namespace: Optional[str] = None,
+    threshold: float = QUESTION_CLUSTER_THRESHOLD,
+    batch_size: int = QUESTION_CLUSTER_BATCH_SIZE,
+    rebuild: bool = False,
+    max_batches: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Gán cụm cho các câu hỏi mới (tăng dần)
+    Args:
+        session_factory: Tạo Session DB (mặc định SessionLocal)
+        embeddings: Model embedding (mặc định model dùng chung của registry)
+        namespace: Định danh không gian vector lưu kèm tâm cụm (mặc định theo EMBEDDING_MODEL)
+        rebuild: Xoá toàn bộ cụm và gom lại từ đầu
+        max_batches: Dừng sau số lô này (None: tới khi hết câu hỏi mới)
+    Returns:
+        Báo cáo: số câu đã xử lý, số câu phải embed, số cụm mới, tổng số cụm, thời gian
+    """
+    from sqlalchemy import delete
+
+    from ..models.stats import QuestionCluster, QuestionClusterMember
+    from ..services.stats_service import dashboard_cache, question_key
+
+    if session_factory is None:
+        from ..database import SessionLocal as session_factory
+    if embeddings is None or namespace is None:
+        from .registry import EMBEDDING_MODEL, registry
+        from .vector_store import embedding_namespace
+
+        embeddings = embeddings or registry.get_embeddings()
+        namespace = namespace or embedding_namespace(EMBEDDING_MODEL)
+
+    started = time.perf_counter()
+    report = {"questions": 0, "embedded": 0, "new_clusters": 0, "clusters": 0, "batches": 0}
+    db = session_factory()
+    try:
+        if rebuild:
+            db.execute(delete(QuestionClusterMember))
+            db.execute(delete(QuestionCluster))
+            db.commit()
+        index = _load_index(db, namespace, threshold)
+
+        while max_batches is None or report["batches"] < max_batches:
+            rows = _pending_questions(db, batch_size)
+            if not rows:
+                break
+            keys = [question_key(message) for _, message, _ in rows]
+            assigned = _known_keys(db, set(keys))
+            slot_of = {cluster_id: slot for slot, cluster_id in enumerate(index.ids)}
+
+            # Chỉ embed mỗi cách hỏi mới một lần
+            new_keys = {}
+            for key, (_, message, _) in zip(keys, rows):
+                if key not in assigned and key not in new_keys:
+                    new_keys[key] = message
+            key_slot = {}
+            if new_keys:
+                vectors = np.asarray(embeddings.embed_documents(list(new_keys.values())), dtype=np.float32)
+                report["embedded"] += len(new_keys)
+                for key, vector in zip(new_keys, vectors):
+                    key_slot[key] = index.assign(vector)
+
+            # Lưu cụm mới / tâm cụm đã cập nhật, lấy id cho cụm mới
+            touched_slots = set(key_slot.values())
+            for slot in touched_slots:
+                centroid = index.centroid(slot).astype(np.float32).tobytes()
+                if index.ids[slot] is None:
+                    message = next(new_keys[k] for k, s in key_slot.items() if s == slot)
+                    cluster = QuestionCluster(representative=message, centroid=centroid, size=0, embedding_model=namespace)
+                    db.add(cluster)
+                    db.flush()
+                    index.ids[slot] = cluster.id
+                    report["new_clusters"] += 1
+                else:
+                    cluster = db.get(QuestionCluster, index.ids[slot])
+                    cluster.centroid = centroid
+
+            members = []
+            for key, (chat_id, _, timestamp) in zip(keys, rows):
+                cluster_id = assigned[key] if key in assigned else index.ids[key_slot[key]]
+                members.append({"chat_id": chat_id, "cluster_id": cluster_id, "question_key": key, "day": timestamp.date()})
+            db.execute(QuestionClusterMember.__table__.insert(), members)
+            _refresh_clusters(db, {m["cluster_id"] for m in members})
+            db.commit()
+
+            report["questions"] += len(rows)
+            report["batches"] += 1
+
+        # Câu hỏi bị xoá khỏi chat_history không còn được tính
+        _refresh_clusters(db)
+        db.commit()
+        report["clusters"] = len(index)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    dashboard_cache.clear()
+    report["seconds"] = round(time.perf_counter() - started, 2)
+    logger.info(f"✅ Gom cụm câu hỏi: {report}")
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Incrementally cluster near-duplicate user questions")
+    parser.add_argument("--threshold", type=float, default=QUESTION_CLUSTER_THRESHOLD)
+    parser.add_argument("--batch-size", type=int, default=QUESTION_CLUSTER_BATCH_SIZE)
+    parser.add_argument("--max-batches", type=int, default=None)
+    parser.add_argument("--rebuild", action="store_true", help="drop existing clusters and start over")
+    args = parser.parse_args(argv)
+
+    report = cluster_questions(
+        threshold=args.threshold, batch_size=args.batch_size, rebuild=args.rebuild, max_batches=args.max_batches
+    )
+    print(json.dumps(report, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
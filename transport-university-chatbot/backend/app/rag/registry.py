@@ -0,0 +1,166 @@
+"""
+Registry giữ embedding model và vector store dùng chung cho mỗi worker.
+
+Model embedding chỉ được nạp một lần (lúc FastAPI startup hoặc ở lần gọi đầu tiên),
+sau đó mọi request dùng lại cùng một instance.
+"""
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from .embedding_cache import (
+    EMBEDDING_CACHE_ENABLED,
+    EMBEDDING_CACHE_SPILL_DIR,
+    CachedEmbeddings,
+    EmbeddingCache,
+)
+from .reranker import RERANK_ENABLED, RERANK_MODEL, Reranker, create_cross_encoder
+from .vector_store import (
+    EMBEDDING_BACKEND,
+    VECTOR_BACKEND,
+    create_embeddings,
+    create_lexical_index,
+    create_vector_store,
+    embedding_namespace,
+)
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "AITeamVN/Vietnamese_Embedding")
+WARMUP_TEXT = "Trường Đại học Giao thông Vận tải"
+
+
+class RAGRegistry:
+    """
+    Process-wide holder for the embedding model and the vector store.
+
+    Usage:
+        from app.rag.registry import registry
+        registry.load(warmup=True)          # at startup
+        store = registry.get_vector_store() # per request, no model reload
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._embeddings = None
+        self._vector_store = None
+        self._lexical_index = None
+        self._reranker = None
+        self._embedding_cache: Optional[EmbeddingCache] = None
+        self._error: Optional[str] = None
+        self._load_seconds: Optional[float] = None
+        self._warmup_seconds: Optional[float] = None
+
+    def get_embeddings(self):
+        """Return the shared embedding model, loading it on first use (query encodes are cached)."""
+        if self._embeddings is None:
+            with self._lock:
+                if self._embeddings is None:
+                    embeddings = create_embeddings(EMBEDDING_MODEL)
+                    if EMBEDDING_CACHE_ENABLED:
+                        if self._embedding_cache is None:
+                            self._embedding_cache = EmbeddingCache(
+                                spill_dir=EMBEDDING_CACHE_SPILL_DIR, namespace=embedding_namespace(EMBEDDING_MODEL)
+                            )
+                        embeddings = CachedEmbeddings(embeddings, self._embedding_cache)
+                    self._embeddings = embeddings
+        return self._embeddings
+
+    def get_vector_store(self):
+        """Return the shared vector store bound to the shared embedding model."""
+        if self._vector_store is None:
+            with self._lock:
+                if self._vector_store is None:
+                    self._vector_store = create_vector_store(self.get_embeddings())
+        return self._vector_store
+
+    def get_lexical_index(self):
+        """Return the shared BM25 index (empty if it has not been built yet)."""
+        if self._lexical_index is None:
+            with self._lock:
+                if self._lexical_index is None:
+                    self._lexical_index = create_lexical_index()
+        return self._lexical_index
+
+    def get_reranker(self):
+        """Return the shared cross-encoder reranker, or None when RERANK_ENABLED is off."""
+        if not RERANK_ENABLED:
+            return None
+        if self._reranker is None:
+            with self._lock:
+                if self._reranker is None:
+                    self._reranker = Reranker(create_cross_encoder(RERANK_MODEL))
+        return self._reranker
+
+    def load(self, warmup: bool = False) -> None:
+        """
+        Eagerly load the embedding model and vector store
+        Args:
+            warmup: Also run one encode so the first user request does not pay for it
+        """
+        started = time.perf_counter()
+        try:
+            self.get_vector_store()
+            self.get_lexical_index()
+            reranker = self.get_reranker()
+            self._load_seconds = time.perf_counter() - started
+            if warmup:
+                warmup_started = time.perf_counter()
+                self.get_embeddings().embed_query(WARMUP_TEXT)
+                if reranker is not None:
+                    reranker.score_fn([(WARMUP_TEXT, WARMUP_TEXT)])
+                self._warmup_seconds = time.perf_counter() - warmup_started
+            self._error = None
+        except Exception as e:
+            self._error = str(e)
+            raise
+        logger.info(f"✅ RAG registry loaded in {self._load_seconds:.2f}s (model={EMBEDDING_MODEL}, embeddings={EMBEDDING_BACKEND}, backend={VECTOR_BACKEND})")
+
+    def is_ready(self) -> bool:
+        return self._embeddings is not None and self._vector_store is not None
+
+    def status(self) -> Dict[str, Any]:
+        """Readiness details for the health endpoint."""
+        return {
+            "ready": self.is_ready(),
+            "embedding_model": EMBEDDING_MODEL,
+            "embedding_backend": EMBEDDING_BACKEND,
+            "vector_backend": VECTOR_BACKEND,
+            "reranker": RERANK_MODEL if RERANK_ENABLED else None,
+            "lexical_docs": len(self._lexical_index) if self._lexical_index is not None else None,
+            "load_seconds": self._load_seconds,
+            "warmup_seconds": self._warmup_seconds,
+            "error": self._error,
+        }
+
+    def embedding_cache_stats(self) -> Optional[Dict[str, Any]]:
+        """Query embedding cache hit-rate statistics (None when disabled or not yet loaded)."""
+        cache = self._embedding_cache
+        return cache.stats() if cache is not None else None
+
+    def reranker_stats(self) -> Optional[Dict[str, Any]]:
+        """Rerank latency/depth statistics (None until the reranker is loaded)."""
+        reranker = self._reranker
+        return reranker.stats() if reranker is not None else None
+
+    def reset_vector_store(self) -> None:
+        """Drop only the vector store (and BM25 index) so the next request reopens the rebuilt index."""
+        with self._lock:
+            self._vector_store = None
+            self._lexical_index = None
+
+    def reset(self) -> None:
+        """Drop the cached instances (e.g. after rebuilding the index)."""
+        with self._lock:
+            self._embeddings = None
+            self._vector_store = None
+            self._lexical_index = None
+            self._reranker = None
+            self._load_seconds = None
+            self._warmup_seconds = None
+            self._error = None
+
+
+registry = RAGRegistry()
@@ -0,0 +1,144 @@
+"""
+Rerank bằng cross-encoder, đặt giữa truy xuất và sinh câu trả lời.
+
+Truy xuất lấy rộng (RERANK_MAX_CANDIDATES ứng viên), cross-encoder nhỏ chạy trên CPU
+chấm lại từng cặp (câu hỏi, chunk) theo lô và chỉ giữ top RERANK_TOP_K. Độ sâu chấm
+điểm thích ứng theo khoảng cách điểm: chấm lô đầu (RERANK_MIN_CANDIDATES), nếu top-k
+đã cách biệt rõ với các ứng viên còn lại (>= RERANK_MARGIN) thì dừng, nếu không thì
+chấm tiếp lô sau. Câu hỏi dễ chỉ tốn một lô.
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").lower() == "true"
+# Cross-encoder đa ngôn ngữ nhỏ (MiniLM-L12, ~120M tham số), đủ nhanh trên CPU
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1")
+RERANK_TOP_K = int(os.getenv("RERANK_TOP_K", "3"))
+RERANK_MIN_CANDIDATES = int(os.getenv("RERANK_MIN_CANDIDATES", "8"))
+RERANK_MAX_CANDIDATES = int(os.getenv("RERANK_MAX_CANDIDATES", "24"))
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "8"))
+# Khoảng cách điểm (logit) giữa chunk thứ k và chunk tốt nhất bị loại để dừng sớm
+RERANK_MARGIN = float(os.getenv("RERANK_MARGIN", "2.0"))
+RERANK_MAX_LENGTH = int(os.getenv("RERANK_MAX_LENGTH", "512"))
+
+ScoreFn = Callable[[List[Tuple[str, str]]], Sequence[float]]
+
+
+class RerankResult(NamedTuple):
+    docs: List[Document]
+    scored: int        # số ứng viên đã chấm điểm
+    seconds: float
+
+
+def create_cross_encoder(model_name: str = RERANK_MODEL) -> ScoreFn:
+    """Nạp cross-encoder trên CPU (tốn thời gian, chỉ nên gọi qua registry)."""
+    from sentence_transformers import CrossEncoder
+
+    model = CrossEncoder(model_name, device="cpu", max_length=RERANK_MAX_LENGTH)
+
+    def score(pairs):
+        return model.predict(pairs, batch_size=RERANK_BATCH_SIZE, show_progress_bar=False)
+
+    return score
+
+
+class Reranker:
+    """
+    Adaptive-depth cross-encoder reranker with latency statistics.
+
+    Usage:
+        result = reranker.rerank(question, candidates)
+        docs = result.docs  # best first, at most top_k
+    """
+
+    def __init__(
+        self,
+        score_fn: ScoreFn,
+        top_k: int = RERANK_TOP_K,
+        min_candidates: int = RERANK_MIN_CANDIDATES,
+        max_candidates: int = RERANK_MAX_CANDIDATES,
+        batch_size: int = RERANK_BATCH_SIZE,
+        margin: float = RERANK_MARGIN,
+        window: int = 1000,
+    ):
+        self.score_fn = score_fn
+        self.top_k = top_k
+        self.min_candidates = max(min_candidates, top_k)
+        self.max_candidates = max(max_candidates, self.min_candidates)
+        self.batch_size = max(1, batch_size)
+        self.margin = margin
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self.calls = 0
+        self.scored = 0
+        self.early_stops = 0
+
+    def _confident(self, scores: List[float], k: int) -> bool:
+        """Top-k đã tách biệt khỏi các ứng viên đã chấm còn lại?"""
+        if len(scores) <= k:
+            return False
+        ranked = sorted(scores, reverse=True)
+        return ranked[k - 1] - ranked[k] >= self.margin
+
+    def rerank(self, question: str, docs: Sequence[Document], top_k: Optional[int] = None) -> RerankResult:
+        """
+        Chấm lại các ứng viên (theo thứ tự truy xuất) và trả về top_k tốt nhất
+        Args:
+            question: Câu hỏi (đã viết lại nếu là câu nối tiếp)
+            docs: Ứng viên từ bước truy xuất, tốt nhất trước
+        Returns:
+            RerankResult(docs, scored, seconds)
+        """
+        top_k = top_k or self.top_k
+        started = time.perf_counter()
+        candidates = list(docs)[:self.max_candidates]
+        scores: List[float] = []
+        early_stop = False
+
+        # Lô đầu đủ lớn để có top-k + vài ứng viên so sánh, các lô sau theo batch_size
+        end = min(len(candidates), self.min_candidates)
+        while len(scores) < len(candidates):
+            batch = candidates[len(scores):end]
+            scores.extend(float(s) for s in self.score_fn([(question, d.page_content) for d in batch]))
+            if len(scores) < len(candidates) and self._confident(scores, top_k):
+                early_stop = True
+                break
+            end = min(len(candidates), end + self.batch_size)
+
+        order = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:top_k]
+        ranked = [candidates[i] for i in order]
+        seconds = time.perf_counter() - started
+
+        with self._lock:
+            self.calls += 1
+            self.scored += len(scores)
+            self.early_stops += early_stop
+            self._latencies.append(seconds)
+        return RerankResult(docs=ranked, scored=len(scores), seconds=seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            calls, scored, early_stops = self.calls, self.scored, self.early_stops
+
+        def percentile(q):
+            if not latencies:
+                return 0.0
+            return round(latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000, 2)
+
+        return {
+            "calls": calls,
+            "avg_candidates_scored": round(scored / calls, 2) if calls else 0.0,
+            "early_stop_rate": round(early_stops / calls, 4) if calls else 0.0,
+            "p50_ms": percentile(0.5),
+            "p95_ms": percentile(0.95),
+            "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        }
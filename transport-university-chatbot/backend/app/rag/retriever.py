@@ -1,8 +1,86 @@
+import os
+
+from ..metrics import stage_timer
+from .lexical_index import reciprocal_rank_fusion
 from .vector_store import load_vector_store
 
-def retrieve_context(question, top_k=3):
-    """Truy vấn Pinecone để lấy ngữ cảnh liên quan nhất."""
+# Tìm kiếm lai: trộn kết quả vector với BM25 (nếu index từ khoá đã được build)
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() == "true"
+# Số ứng viên lấy từ mỗi nguồn trước khi trộn
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+
+def _lexical_index():
+    """Index BM25 dùng chung, hoặc None nếu tắt / chưa build."""
+    if not HYBRID_SEARCH:
+        return None
+    from .registry import registry
+
+    index = registry.get_lexical_index()
+    return index if len(index) else None
+
+
+def _candidates(top_k):
+    return max(top_k, HYBRID_CANDIDATES)
+
+
+def _fuse(dense_docs, question, top_k, lexical):
+    """Trộn kết quả vector + BM25 bằng reciprocal rank fusion."""
+    lexical_docs = lexical.search(question, k=_candidates(top_k))
+    return reciprocal_rank_fusion([dense_docs, lexical_docs], k=RRF_K, top_k=top_k)
+
+
+def retrieve_documents(question, top_k=3):
+    """Truy vấn vector store (Pinecone hoặc local), trả về danh sách Document liên quan nhất."""
     vectorstore = load_vector_store()
-    docs = vectorstore.similarity_search(question, k=top_k)
-    context = "\n".join([d.page_content for d in docs])
-    return context
+    lexical = _lexical_index()
+    if lexical is None:
+        return vectorstore.similarity_search(question, k=top_k)
+    dense_docs = vectorstore.similarity_search(question, k=_candidates(top_k))
+    return _fuse(dense_docs, question, top_k, lexical)
+
+
+def format_context(docs):
+    """Ghép nội dung các Document thành ngữ cảnh cho prompt."""
+    return "\n".join([d.page_content for d in docs])
+
+
+def describe_sources(docs):
+    """Metadata gọn của các Document (nguồn, trang) để trả về cho client."""
+    sources = []
+    for d in docs:
+        metadata = d.metadata or {}
+        sources.append({
+            key: metadata[key]
+            for key in ("id", "source", "page")
+            if key in metadata
+        })
+    return sources
+
+
+def retrieve_context(question, top_k=3):
+    """Truy vấn vector store (Pinecone hoặc local) để lấy ngữ cảnh liên quan nhất."""
+    return format_context(retrieve_documents(question, top_k=top_k))
+
+
+async def aretrieve_documents(question, top_k=3, embedding=None):
+    """
+    Bản async của retrieve_documents.
+    Encode câu hỏi được gom lô với các request đồng thời và chạy trong thread pool RAG (CPU),
+    truy vấn vector store dùng API async nếu có.
+    """
+    from ..concurrency import run_blocking_io
+    from .embedding_batcher import aembed_query
+
+    # Chỉ tốn thời gian ở lần đầu (nạp model), sau đó trả về instance dùng chung
+    vectorstore = await run_blocking_io(load_vector_store)
+    lexical = await run_blocking_io(_lexical_index)
+    if embedding is None:
+        embedding = await aembed_query(question)
+    with stage_timer("vector_search"):
+        if lexical is None:
+            return await vectorstore.asimilarity_search_by_vector(embedding, k=top_k)
+        dense_docs = await vectorstore.asimilarity_search_by_vector(embedding, k=_candidates(top_k))
+        # BM25 chỉ tốn vài ms: chạy thẳng trên event loop, không cần thread
+        return _fuse(dense_docs, question, top_k, lexical)
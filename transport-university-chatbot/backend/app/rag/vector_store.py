@@ -1,17 +1,90 @@
+import logging
 import os
-from langchain_pinecone import PineconeVectorStore
-from pinecone import Pinecone, ServerlessSpec
-from langchain_huggingface import HuggingFaceEmbeddings
-from dotenv import load_dotenv, find_dotenv
 
-load_dotenv(find_dotenv())  # finds and loads transport-university-chatbot/.env
+logger = logging.getLogger(__name__)
 
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 INDEX_NAME = os.getenv("PINECONE_INDEX")
 
-def build_vector_store(chunks):
-    """Tạo index Pinecone và upload dữ liệu."""
-    embeddings = HuggingFaceEmbeddings(model_name="AITeamVN/Vietnamese_Embedding")
+# "huggingface" (sentence-transformers, mặc định) hoặc "onnx" (ONNX Runtime, xem onnx_embeddings.py)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "huggingface").lower()
+
+# "pinecone" (mặc định) hoặc "local" (index NumPy memory-mapped trên đĩa)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone").lower()
+LOCAL_INDEX_DIR = os.getenv(
+    "LOCAL_INDEX_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))), "data", "vector_index"),
+)
+LOCAL_INDEX_DTYPE = os.getenv("LOCAL_INDEX_DTYPE", "float32")
+LOCAL_INDEX_IVF_MIN_ROWS = int(os.getenv("LOCAL_INDEX_IVF_MIN_ROWS", "20000"))
+LOCAL_INDEX_IVF_NPROBE = int(os.getenv("LOCAL_INDEX_IVF_NPROBE", "8"))
+
+# Index từ khoá BM25 (dùng cho tìm kiếm lai, với mọi VECTOR_BACKEND)
+LEXICAL_INDEX_DIR = os.getenv(
+    "LEXICAL_INDEX_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))), "data", "lexical_index"),
+)
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+
+
+def create_embeddings(model_name, backend=None):
+    """
+    Khởi tạo model embedding (tốn thời gian, chỉ nên gọi qua registry)
+    Args:
+        backend: "huggingface" (sentence-transformers/PyTorch) hoặc "onnx"
+                 (ONNX Runtime, model đã export vào ONNX_MODEL_DIR); mặc định EMBEDDING_BACKEND
+    """
+    backend = (backend or EMBEDDING_BACKEND).lower()
+    if backend == "onnx":
+        from .onnx_embeddings import OnnxEmbeddings
+
+        embeddings = OnnxEmbeddings()
+        exported = embeddings.config.get("model")
+        if exported and exported != model_name:
+            logger.warning(f"⚠️ Model ONNX được export từ '{exported}', khác EMBEDDING_MODEL '{model_name}'")
+        return embeddings
+    if backend != "huggingface":
+        raise ValueError(f"Unknown EMBEDDING_BACKEND '{backend}'. Expected one of: huggingface, onnx")
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    return HuggingFaceEmbeddings(model_name=model_name)
+
+
+def embedding_namespace(model_name):
+    """Định danh không gian vector (model + backend + lượng tử hoá), dùng làm khoá cache."""
+    backend = EMBEDDING_BACKEND.lower()
+    if backend == "onnx":
+        from . import onnx_embeddings
+
+        # Theo file thực sự được nạp: ONNX_QUANTIZED mà chưa export int8 thì vẫn là fp32
+        path = onnx_embeddings.model_file(onnx_embeddings.ONNX_MODEL_DIR, onnx_embeddings.ONNX_QUANTIZED)
+        return f"{model_name}|onnx{'-int8' if os.path.basename(path) == onnx_embeddings.INT8_FILE else ''}"
+    return f"{model_name}|{backend}"
+
+
+def _create_pinecone_store(embeddings):
+    from langchain_pinecone import PineconeVectorStore
+
+    return PineconeVectorStore(index_name=INDEX_NAME, embedding=embeddings)
+
+
+def _create_local_store(embeddings):
+    from .local_store import LocalVectorStore
+
+    return LocalVectorStore(
+        embeddings,
+        LOCAL_INDEX_DIR,
+        dtype=LOCAL_INDEX_DTYPE,
+        ivf_min_rows=LOCAL_INDEX_IVF_MIN_ROWS,
+        ivf_nprobe=LOCAL_INDEX_IVF_NPROBE,
+    )
+
+
+def get_pinecone_index():
+    """Mở index Pinecone (tạo mới nếu chưa có)."""
+    from pinecone import Pinecone, ServerlessSpec
+
     pc = Pinecone(api_key=PINECONE_API_KEY)
 
     # Kiểm tra index
@@ -26,18 +99,89 @@ def build_vector_store(chunks):
             )
 
         )
+    return pc.Index(INDEX_NAME)
+
+
+def _build_pinecone_store(chunks, embeddings):
+    from langchain_pinecone import PineconeVectorStore
 
-    vectorstore = PineconeVectorStore.from_documents(
+    get_pinecone_index()
+
+    return PineconeVectorStore.from_documents(
         documents=chunks,
         embedding=embeddings,
         index_name=INDEX_NAME
     )
+
+
+def _build_local_store(chunks, embeddings):
+    store = _create_local_store(embeddings)
+    store.add_documents(chunks)
+    store.save()
+    return store
+
+
+def create_lexical_index(index_dir=None):
+    """Mở index BM25 trên đĩa (rỗng nếu chưa được build)."""
+    from .lexical_index import LexicalIndex
+
+    return LexicalIndex(index_dir or LEXICAL_INDEX_DIR, k1=BM25_K1, b=BM25_B)
+
+
+def build_lexical_index(chunks, index_dir=None):
+    """Xây lại index BM25 từ các chunk (Document)."""
+    import hashlib
+
+    index = create_lexical_index(index_dir)
+    index.build(
+        (
+            (d.metadata or {}).get("id") or hashlib.sha256(d.page_content.encode("utf-8")).hexdigest()[:32],
+            d.page_content,
+            d.metadata,
+        )
+        for d in chunks
+    )
+    index.save()
+    return index
+
+
+# backend name -> (create, build)
+BACKENDS = {
+    "pinecone": (_create_pinecone_store, _build_pinecone_store),
+    "local": (_create_local_store, _build_local_store),
+}
+
+
+def _get_backend(name=None):
+    name = (name or VECTOR_BACKEND).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown VECTOR_BACKEND '{name}'. Expected one of: {', '.join(BACKENDS)}")
+    return BACKENDS[name]
+
+
+def create_vector_store(embeddings, backend=None):
+    """Kết nối tới vector store đã cấu hình (VECTOR_BACKEND) với model embedding cho trước."""
+    create, _ = _get_backend(backend)
+    return create(embeddings)
+
+
+def build_vector_store(chunks, backend=None):
+    """Tạo index (Pinecone hoặc local) và upload dữ liệu."""
+    from .answer_cache import answer_cache
+    from .faq_store import faq_store
+    from .registry import registry
+
+    _, build = _get_backend(backend)
+    vectorstore = build(chunks, registry.get_embeddings())
+    build_lexical_index(chunks)
+    registry.reset_vector_store()
+    answer_cache.invalidate()
+    faq_store.invalidate_sources(None)
     return vectorstore
 
 
 def load_vector_store():
-    """Tải vector store từ Pinecone."""
-    embeddings = HuggingFaceEmbeddings(model_name="AITeamVN/Vietnamese_Embedding")
-    return PineconeVectorStore(index_name=INDEX_NAME, embedding=embeddings)
-
+    """Lấy vector store dùng chung (model embedding chỉ được nạp một lần mỗi worker)."""
+    from .registry import registry
 
+    return registry.get_vector_store()
@@ -3,11 +3,14 @@
 from datetime import timedelta
 from fastapi import APIRouter, Depends, HTTPException, status, Request
 from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from ..database import get_db
+from ..database import get_db, get_async_db
 from ..models.user import User
-from ..services.auth_service import hash_password, verify_password, create_access_token
+from ..services.auth_service import create_access_token, create_user_async, verify_user_credentials_async
+from ..services.password_hasher import PasswordHasherBusy
 from ..schemas import UserCreate, UserLogin, UserOut, Token
 
 router = APIRouter(prefix="/auth", tags=["auth"])
@@ -24,13 +27,23 @@ def get_current_user(token: str = Depends(lambda: None), db: Session = Depends(g
     return None
 
 
+def _hasher_busy() -> HTTPException:
+    """503 returned when the password hashing backlog is full (login storms)."""
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Authentication service is busy, please retry shortly",
+        headers={"Retry-After": "1"}
+    )
+
+
 @router.post("/register", response_model=UserOut, status_code=status.HTTP_201_CREATED)
-def register(user_in: UserCreate, db: Session = Depends(get_db)):
+async def register(user_in: UserCreate, db: AsyncSession = Depends(get_async_db)):
     """Register a new user."""
     # Check if user already exists
-    existing_user = db.query(User).filter(
-        (User.username == user_in.username) | (User.email == user_in.email)
-    ).first()
+    result = await db.execute(
+        select(User).where((User.username == user_in.username) | (User.email == user_in.email)).limit(1)
+    )
+    existing_user = result.scalars().first()
     
     if existing_user:
         raise HTTPException(
@@ -38,29 +51,30 @@ def register(user_in: UserCreate, db: Session = Depends(get_db)):
             detail="Username or email already registered"
         )
     
-    # Create new user
-    new_user = User(
-        username=user_in.username,
-        email=user_in.email,
-        password_hash=hash_password(user_in.password),
-        is_active=True
-    )
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    # Create new user (bcrypt runs in the password hasher pool)
+    try:
+        new_user = await create_user_async(
+            db,
+            username=user_in.username,
+            email=user_in.email,
+            password=user_in.password
+        )
+    except PasswordHasherBusy:
+        raise _hasher_busy()
     
     return new_user
 
 
 @router.post("/login", response_model=Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
     """Login with username and password, return JWT token."""
     # Try to find user by username or email
-    user = db.query(User).filter(
-        (User.username == form_data.username) | (User.email == form_data.username)
-    ).first()
+    try:
+        user = await verify_user_credentials_async(db, form_data.username, form_data.password)
+    except PasswordHasherBusy:
+        raise _hasher_busy()
     
-    if not user or not verify_password(form_data.password, user.password_hash):
+    if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid username or password",
@@ -84,14 +98,14 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
 
 
 @router.post("/login/json", response_model=Token)
-def login_json(user_in: UserLogin, db: Session = Depends(get_db)):
+async def login_json(user_in: UserLogin, db: AsyncSession = Depends(get_async_db)):
     """Login with JSON body (alternative to form-data)."""
-    print(f"[DEBUG] login_json received: username={user_in.username}, password_len={len(user_in.password) if user_in.password else 0}")
-    user = db.query(User).filter(
-        (User.username == user_in.username) | (User.email == user_in.username)
-    ).first()
+    try:
+        user = await verify_user_credentials_async(db, user_in.username, user_in.password)
+    except PasswordHasherBusy:
+        raise _hasher_busy()
     
-    if not user or not verify_password(user_in.password, user.password_hash):
+    if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid username or password"
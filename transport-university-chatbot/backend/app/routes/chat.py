@@ -1,21 +1,41 @@
-"""Chat history routes (save and retrieve messages)."""
+"""Chat history routes (save and retrieve messages).
+
+All handlers are async: retrieval, the LLM call and the database writes are
+awaited on the event loop instead of occupying Starlette's worker threadpool.
+New messages go through the write-behind queue (app.services.chat_writer); reads
+of a user's history first wait for that user's queued rows.
+"""
+
+import json
+import logging
+from typing import Optional
 
 from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
-from sqlalchemy.orm import Session
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..database import get_db
-from ..services.chat_service import save_chat, get_chat_history
+from ..database import get_async_db, release_connection
+from ..metrics import stage_timer
+from ..services.chat_service import (
+    get_chat_history_async,
+    get_chat_count_async,
+    delete_chat_async,
+    encode_cursor,
+)
+from ..services.chat_writer import chat_writer, save_chat_deferred
 from ..schemas import ChatMessageCreate, ChatMessageOut, ChatHistoryOut
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/chat", tags=["chat"])
 
 
 @router.post("/send", response_model=ChatMessageOut, status_code=status.HTTP_201_CREATED)
-def chat_with_bot(chat_in: ChatMessageCreate, request: Request, db: Session = Depends(get_db)):
+async def chat_with_bot(chat_in: ChatMessageCreate, request: Request, db: AsyncSession = Depends(get_async_db)):
     """Chat with the bot: validates user, generates RAG response, and saves history."""
     # Get current user from request.state (set by AuthMiddleware)
     user = getattr(request.state, "user", None)
-    
+
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -24,85 +44,190 @@ def chat_with_bot(chat_in: ChatMessageCreate, request: Request, db: Session = De
 
     # Import RAG modules here to avoid circular imports or context issues
     try:
-        from ..rag.retriever import retrieve_context
-        from ..rag.generator import generate_answer
+        from ..rag.pipeline import aanswer_question
     except ImportError as e:
-         print(f"RAG IMPORT ERROR: {e}")
-         raise HTTPException(
+        logger.exception("❌ RAG import failed")
+        raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"RAG module not found: {str(e)}"
         )
 
-    # Generate Response
+    # Generate Response (aware of the user's previous turns)
     try:
-        context = retrieve_context(chat_in.message)
-        answer = generate_answer(chat_in.message, context)
+        conversation = await _load_conversation(db, user.id)
+        answer = await aanswer_question(chat_in.message, conversation)
     except Exception as e:
          raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"RAG Error: {str(e)}"
         )
-    
+
     # Save chat entry
-    entry = save_chat(
-        db=db,
-        user_id=user.id,
-        message=chat_in.message,
-        response=answer, # The AI response
-        role="user" # The initiator
-    )
-    
+    with stage_timer("db_save"):
+        entry = await save_chat_deferred(
+            db=db,
+            user_id=user.id,
+            message=chat_in.message,
+            response=answer, # The AI response
+            role="user" # The initiator
+        )
+
     return entry
 
 
+async def _load_conversation(db: AsyncSession, user_id):
+    """Recent turns + cached summary for follow-up questions (None if memory is disabled)."""
+    from ..rag.memory import MEMORY_ENABLED, aload_conversation
+
+    if not MEMORY_ENABLED:
+        return None
+    with stage_timer("conversation_load"):
+        await chat_writer.wait_for_user(user_id)
+        conversation = await aload_conversation(db, user_id)
+    # Do not hold a pooled connection while the LLM generates the answer
+    await release_connection(db)
+    return conversation
+
+
+def _sse(event: str, data) -> str:
+    """Format one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+@router.post("/send/stream")
+async def chat_with_bot_stream(chat_in: ChatMessageCreate, request: Request, db: AsyncSession = Depends(get_async_db)):
+    """
+    Streaming variant of /send (Server-Sent Events).
+
+    Events, in order:
+        context  retrieval metadata ({"cached", "cache_tier", "sources", "rerank_ms"});
+                 cache_tier is "faq" for a precomputed answer (app.rag.faq_store)
+        token    {"text": "..."} for every chunk produced by the LLM
+        done     the saved chat entry (same shape as /send) once the answer is persisted
+        error    {"detail": "..."} if retrieval or generation fails mid-stream
+    """
+    user = getattr(request.state, "user", None)
+
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated"
+        )
+
+    try:
+        from ..rag.pipeline import astream_answer_events
+    except ImportError as e:
+        logger.exception("❌ RAG import failed")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"RAG module not found: {str(e)}"
+        )
+
+    user_id = user.id
+
+    async def event_stream():
+        parts = []
+        try:
+            conversation = await _load_conversation(db, user_id)
+            async for event, data in astream_answer_events(chat_in.message, conversation):
+                if event == "token":
+                    parts.append(data)
+                    yield _sse("token", {"text": data})
+                else:
+                    yield _sse(event, data)
+        except Exception as e:
+            yield _sse("error", {"detail": f"RAG Error: {str(e)}"})
+            return
+
+        # Persist only once the full answer is known
+        with stage_timer("db_save"):
+            entry = await save_chat_deferred(
+                db=db,
+                user_id=user_id,
+                message=chat_in.message,
+                response="".join(parts),
+                role="user"
+            )
+        yield _sse("done", ChatMessageOut.model_validate(entry).model_dump(mode="json"))
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",  # disable proxy (nginx) buffering
+        },
+    )
+
+
 @router.get("/history", response_model=ChatHistoryOut)
-def get_history(
+async def get_history(
     limit: int = Query(50, ge=1, le=200, description="Max items per page"),
-    offset: int = Query(0, ge=0, description="Pagination offset"),
+    offset: int = Query(0, ge=0, description="Pagination offset (legacy; prefer cursor)"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    include_total: bool = Query(True, description="Also return the total number of messages"),
     request: Request = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get chat history for the current user with pagination."""
+    """
+    Get chat history for the current user with pagination.
+
+    Cursor paging (keyset on timestamp, id) costs the same on every page: pass the
+    previous response's next_cursor as ?cursor=. ?offset= keeps working for old clients.
+    """
     # Get current user from request.state (set by AuthMiddleware)
     user = getattr(request.state, "user", None)
-    
+
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Not authenticated"
         )
-    
-    # Get total count
-    from ..models.chat_history import ChatHistory
-    total = db.query(ChatHistory).filter(ChatHistory.user_id == user.id).count()
-    
-    # Get paginated items
-    items = get_chat_history(db, user_id=user.id, limit=limit, offset=offset)
-    
+
+    if cursor and offset:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Use either cursor or offset, not both"
+        )
+
+    # Get one extra item to know whether another page exists
+    await chat_writer.wait_for_user(user.id)
+    try:
+        items = await get_chat_history_async(db, user_id=user.id, limit=limit + 1, offset=offset, cursor=cursor)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+    next_cursor = encode_cursor(items[limit - 1]) if len(items) > limit else None
+    items = items[:limit]
+
+    # Get total count (cached per user)
+    total = await get_chat_count_async(db, user_id=user.id) if include_total else None
+
     # Convert to Pydantic models
     items_validated = [ChatMessageOut.model_validate(item) for item in items]
-    
+
     return ChatHistoryOut(
         total=total,
         limit=limit,
         offset=offset,
-        items=items_validated
+        items=items_validated,
+        next_cursor=next_cursor
     )
 
 
 @router.delete("/history/{chat_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_message(chat_id: str, request: Request, db: Session = Depends(get_db)):
+async def delete_message(chat_id: str, request: Request, db: AsyncSession = Depends(get_async_db)):
     """Delete a chat message (only if owned by current user)."""
-    from ..models.chat_history import ChatHistory
-    
     user = getattr(request.state, "user", None)
-    
+
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Not authenticated"
         )
-    
+
     # Find and verify ownership
     import uuid
     try:
@@ -112,18 +237,19 @@ def delete_message(chat_id: str, request: Request, db: Session = Depends(get_db)
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid chat ID format"
         )
-    
-    entry = db.query(ChatHistory).filter(
-        (ChatHistory.id == chat_uuid) & (ChatHistory.user_id == user.id)
-    ).first()
-    
-    if not entry:
+
+    # The message may still be in the write-behind queue
+    await chat_writer.wait_for_user(user.id)
+    deleted = await delete_chat_async(db, chat_id=chat_uuid, user_id=user.id)
+    if deleted:
+        # The cached conversation summary may mention the deleted turn
+        from ..rag.memory import forget_conversation
+        forget_conversation(user.id)
+
+    if not deleted:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Chat message not found or not owned by you"
         )
-    
-    db.delete(entry)
-    db.commit()
-    
+
     return None
@@ -1,34 +1,32 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
-from typing import List
+from typing import Literal
 
 from ..database import get_db
-from ..models.user import User
-from ..models.chat_history import ChatHistory
 from ..schemas.dashboard import DashboardStats
+from ..services.stats_service import get_dashboard_stats as read_dashboard_stats
 
 router = APIRouter(prefix="/dashboard", tags=["dashboard"])
 
 @router.get("", response_model=DashboardStats)
-def get_dashboard_stats(request: Request, db: Session = Depends(get_db)):
+def get_dashboard_stats(
+    request: Request,
+    window: Literal["today", "7d", "30d", "all"] = Query("all", description="Time window (UTC days)"),
+    db: Session = Depends(get_db)
+):
     """
     Get dashboard statistics.
-    Requires: Admin privileges (checked via request.state.user_id and DB lookup)
+    Requires: Admin privileges (checked via the user snapshot in request.state.user)
+
+    Reads the rollups maintained by app.services.stats_service on every chat save,
+    so the cost no longer grows with the size of chat_history.
     """
     # 1. Verify Authentication & Admin Status
-    user_id = getattr(request.state, "user_id", None)
-    if not user_id:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Not authenticated"
-        )
-    
-    current_user = db.query(User).filter(User.id == user_id, User.is_active == True).first()
+    current_user = getattr(request.state, "user", None)
     if not current_user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found"
+            detail="Not authenticated"
         )
         
     if not current_user.is_admin:
@@ -37,27 +35,5 @@ def get_dashboard_stats(request: Request, db: Session = Depends(get_db)):
             detail="Access denied. Admin privileges required."
         )
 
-    # 2. Collect Statistics
-    # Total Users
-    total_users = db.query(User).count()
-    
-    # Total Questions (User messages)
-    total_questions = db.query(ChatHistory).filter(ChatHistory.role == "user").count()
-    
-    # Frequent Questions (Top 5 exact matches)
-    frequent_questions_query = (
-        db.query(ChatHistory.message, func.count(ChatHistory.message).label('count'))
-        .filter(ChatHistory.role == "user")
-        .group_by(ChatHistory.message)
-        .order_by(func.count(ChatHistory.message).desc())
-        .limit(5)
-        .all()
-    )
-    
-    frequent_questions_list = [q.message for q in frequent_questions_query]
-
-    return {
-        "total_users": total_users,
-        "total_questions": total_questions,
-        "frequent_questions": frequent_questions_list
-    }
+    # 2. Precomputed statistics (total users, questions and top questions in the window)
+    return read_dashboard_stats(db, window)
@@ -43,11 +43,16 @@ class ChatMessageOut(BaseModel):
 
 
 class ChatHistoryOut(BaseModel):
-    """Chat history response schema (paginated)."""
-    total: int
+    """Chat history response schema (paginated).
+
+    Pass next_cursor back as ?cursor= to fetch the following page; it is None on
+    the last page. total is None when the client asked for include_total=false.
+    """
+    total: Optional[int] = None
     limit: int
     offset: int
     items: list[ChatMessageOut]
+    next_cursor: Optional[str] = None
 
 
 # ===== Error Schemas =====
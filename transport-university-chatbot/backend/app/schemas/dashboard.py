@@ -1,7 +1,22 @@
+from datetime import date
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
+
+class QuestionFrequency(BaseModel):
+    question: str
+    count: int
+
+class QuestionClusterSummary(BaseModel):
+    cluster_id: int
+    question: str  # representative wording of the cluster
+    count: int
 
 class DashboardStats(BaseModel):
+    window: str = "all"
+    since: Optional[date] = None  # first UTC day of the window (None = all time)
     total_users: int
+    new_users: int = 0
     total_questions: int
     frequent_questions: List[str]
+    frequent_question_counts: List[QuestionFrequency] = []
+    top_clusters: List[QuestionClusterSummary] = []  # near-duplicate questions grouped (app.rag.question_clusters)
@@ -13,6 +13,7 @@ from app.database import init_db, drop_db, SessionLocal
 from app.services.auth_service import hash_password
 from app.models.user import User
 from app.models.chat_history import ChatHistory
+from app.services.stats_service import reconcile_stats
 
 
 def create_sample_users(db):
@@ -150,6 +151,9 @@ def init_database(reset: bool = False):
         # Create sample chat history
         create_sample_chat_history(db, users)
         
+        # Sample rows are inserted directly: bring the dashboard rollups up to date
+        reconcile_stats(db)
+        
         print("\n" + "=" * 60)
         print(" Database initialized and seeded successfully!")
         print("=" * 60)
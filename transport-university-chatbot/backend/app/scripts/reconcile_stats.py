@@ -0,0 +1,37 @@
+"""
+Dashboard statistics reconciliation
+Rebuilds the rollup tables (stat_counters, question_counts) from users and
+chat_history and reports how many rows had drifted. Meant to run periodically,
+e.g. nightly from cron:
+
+    0 3 * * * cd backend && python -m app.scripts.reconcile_stats
+"""
+import sys
+from pathlib import Path
+
+# Add parent directory to path to allow imports
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from app.database import SessionLocal
+from app.services.stats_service import reconcile_stats
+
+
+def main():
+    """Main entry point"""
+    db = SessionLocal()
+    try:
+        report = reconcile_stats(db)
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Reconciliation failed: {e}")
+        sys.exit(1)
+    finally:
+        db.close()
+
+    print(f"✅ Dashboard stats rebuilt: {report['users']} users, {report['questions']} questions "
+          f"({report['distinct_questions']} distinct)")
+    print(f"   Drifted rows: {report['drifted_counters']} counters, {report['drifted_questions']} question counts")
+
+
+if __name__ == "__main__":
+    main()
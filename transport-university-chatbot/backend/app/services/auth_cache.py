@@ -0,0 +1,124 @@
+"""
+Authentication cache module
+Caches verified JWT claims and lightweight user snapshots so authenticated
+requests do not decode the token and query the users table every time
+"""
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+from uuid import UUID
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.cache import LRUCache
+from app.models.user import User
+from app.services.auth_service import decode_access_token
+
+# Configuration from environment variables
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000"))
+AUTH_TOKEN_CACHE_TTL_SECONDS = float(os.getenv("AUTH_TOKEN_CACHE_TTL_SECONDS", "300"))
+AUTH_USER_CACHE_SIZE = int(os.getenv("AUTH_USER_CACHE_SIZE", "10000"))
+# Upper bound on how long a change made by another process (e.g. an admin script) can go unnoticed
+AUTH_USER_CACHE_TTL_SECONDS = float(os.getenv("AUTH_USER_CACHE_TTL_SECONDS", "60"))
+
+
+@dataclass(frozen=True)
+class UserSnapshot:
+    """Lightweight, session-independent view of a user attached to request.state.user"""
+    id: UUID
+    username: str
+    is_active: bool
+    is_admin: bool
+
+    @classmethod
+    def from_user(cls, user: User) -> "UserSnapshot":
+        return cls(id=user.id, username=user.username, is_active=user.is_active, is_admin=user.is_admin)
+
+
+token_cache = LRUCache(maxsize=AUTH_TOKEN_CACHE_SIZE, ttl=AUTH_TOKEN_CACHE_TTL_SECONDS)
+user_cache = LRUCache(maxsize=AUTH_USER_CACHE_SIZE, ttl=AUTH_USER_CACHE_TTL_SECONDS)
+
+
+# ============== Token Claims ==============
+
+def get_token_claims(token: str) -> Dict[str, Any]:
+    """
+    Decode and verify a JWT token, reusing a previous verification when possible
+    Args:
+        token: JWT token string
+    Returns:
+        Decoded token payload
+    Raises:
+        JWTError: If token is invalid or expired
+    """
+    claims = token_cache.get(token)
+    if claims is not None:
+        # Cached entries never outlive the token itself
+        if claims.get("exp") is None or claims["exp"] > time.time():
+            return claims
+        token_cache.pop(token)
+
+    claims = decode_access_token(token)
+    ttl = AUTH_TOKEN_CACHE_TTL_SECONDS
+    if claims.get("exp") is not None:
+        ttl = min(ttl, claims["exp"] - time.time())
+    if ttl > 0:
+        token_cache.set(token, claims, ttl=ttl)
+    return claims
+
+
+def invalidate_token(token: str) -> None:
+    """Forget a cached token verification (e.g. on logout)"""
+    token_cache.pop(token)
+
+
+# ============== User Snapshots ==============
+
+def get_user_snapshot(user_id: UUID, session_factory: Callable[[], Session]) -> Optional[UserSnapshot]:
+    """
+    Get a user snapshot from the cache, loading it from the database on a miss
+    Args:
+        user_id: User UUID
+        session_factory: Callable returning a new database session (used only on a miss)
+    Returns:
+        UserSnapshot if the user exists (active or not), None otherwise
+    """
+    snapshot = user_cache.get(user_id)
+    if snapshot is not None:
+        return snapshot
+
+    db = session_factory()
+    try:
+        user = db.query(User).filter(User.id == user_id).first()
+        if not user:
+            return None
+        snapshot = UserSnapshot.from_user(user)
+    finally:
+        db.close()
+
+    user_cache.set(user_id, snapshot)
+    return snapshot
+
+
+def invalidate_user(user_id: UUID) -> None:
+    """
+    Drop a cached user snapshot
+    Call after deactivating, promoting or deleting a user through a path that
+    bypasses the ORM events below (e.g. bulk query.update())
+    """
+    user_cache.pop(user_id)
+
+
+def clear_auth_cache() -> None:
+    """Drop every cached token verification and user snapshot"""
+    token_cache.clear()
+    user_cache.clear()
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_user_on_change(mapper, connection, target: User) -> None:
+    """Keep snapshots in sync with ORM updates (is_active / is_admin changes, deletes)"""
+    invalidate_user(target.id)
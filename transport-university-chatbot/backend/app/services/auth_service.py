@@ -2,29 +2,30 @@
 Authentication service module
 Handles password hashing, JWT token creation and verification
 """
-import os
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
 from uuid import UUID
 
-from passlib.context import CryptContext
 from jose import jwt, JWTError
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
+from app.config import settings
+from app.database import release_connection
 from app.models.user import User
+from app.services.password_hasher import password_hasher, pwd_context
+from app.services.stats_service import record_user, record_user_async
 
-# Configuration from environment variables
-SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
-ALGORITHM = os.getenv("ALGORITHM", "HS256")
-ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "60"))
-REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
-
-# Password hashing context
-# Use bcrypt for production, pbkdf2_sha256 for development
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
+# Configuration from settings
+SECRET_KEY = settings.secret_key
+ALGORITHM = settings.algorithm
+ACCESS_TOKEN_EXPIRE_MINUTES = settings.access_token_expire_minutes
+REFRESH_TOKEN_EXPIRE_DAYS = settings.refresh_token_expire_days
 
 # ============== Password Functions ==============
+# Synchronous helpers for scripts; request handlers use the async variants below,
+# which run bcrypt in the password hasher's process pool
 
 def hash_password(password: str) -> str:
     """
@@ -178,10 +179,12 @@ def create_user(
         username=username,
         email=email,
         password_hash=hashed_password,
-        is_active=True
+        is_active=True,
+        created_at=datetime.utcnow()
     )
     
     db.add(user)
+    record_user(db, user.created_at)
     db.commit()
     db.refresh(user)
     
@@ -222,3 +225,81 @@ def get_user_by_email(db: Session, email: str) -> Optional[User]:
         User object if found, None otherwise
     """
     return db.query(User).filter(User.email == email).first()
+
+
+# ============== Async User Functions ==============
+
+async def get_user_by_login_async(db: AsyncSession, login: str) -> Optional[User]:
+    """
+    Get user by username or email (async)
+    Args:
+        db: Async database session
+        login: Username or email
+    Returns:
+        User object if found, None otherwise
+    """
+    result = await db.execute(
+        select(User).where(or_(User.username == login, User.email == login)).limit(1)
+    )
+    return result.scalars().first()
+
+
+async def verify_user_credentials_async(db: AsyncSession, username: str, password: str) -> Optional[User]:
+    """
+    Check a username/email and password (async), upgrading the stored hash when
+    its cost factor no longer matches BCRYPT_ROUNDS
+    Args:
+        db: Async database session
+        username: Username or email
+        password: Plain text password
+    Returns:
+        User object if the credentials match (active or not), None otherwise
+    Raises:
+        PasswordHasherBusy: If the password hashing backlog is full
+    """
+    user = await get_user_by_login_async(db, username)
+    if not user:
+        return None
+
+    # Do not hold a pooled connection during the bcrypt check (~250 ms); only the
+    # rehash below checks one out again
+    await release_connection(db)
+    valid, new_hash = await password_hasher.verify_and_update(password, user.password_hash)
+    if not valid:
+        return None
+
+    if new_hash:
+        # Transparent rehash-on-login
+        user.password_hash = new_hash
+        await db.commit()
+
+    return user
+
+
+async def create_user_async(db: AsyncSession, username: str, email: str, password: str) -> User:
+    """
+    Create a new user (async)
+    Args:
+        db: Async database session
+        username: Unique username
+        email: Unique email
+        password: Plain text password (will be hashed)
+    Returns:
+        Created User object
+    Raises:
+        PasswordHasherBusy: If the password hashing backlog is full
+    """
+    user = User(
+        username=username,
+        email=email,
+        password_hash=await password_hasher.hash(password),
+        is_active=True,
+        created_at=datetime.utcnow()
+    )
+
+    db.add(user)
+    await record_user_async(db, user.created_at)
+    await db.commit()
+    await db.refresh(user)
+
+    return user
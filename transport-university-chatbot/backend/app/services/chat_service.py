@@ -2,14 +2,81 @@
 Chat service module
 Handles chat history operations including saving and retrieving chat messages
 """
-from typing import List, Optional
-from uuid import UUID
+import base64
+import os
+from typing import List, Optional, Tuple
+from uuid import UUID, uuid4
 from datetime import datetime
 
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from sqlalchemy import and_, desc, func, or_, select
 
+from app.cache import LRUCache
 from app.models.chat_history import ChatHistory
+from app.services.stats_service import forget_user_questions, record_question, record_question_async
+
+# Configuration from environment variables
+CHAT_COUNT_CACHE_SIZE = int(os.getenv("CHAT_COUNT_CACHE_SIZE", "10000"))
+# Bounds drift from writes made by other workers/processes
+CHAT_COUNT_CACHE_TTL_SECONDS = float(os.getenv("CHAT_COUNT_CACHE_TTL_SECONDS", "300"))
+
+# user_id -> number of chat_history rows, maintained on insert/delete
+chat_count_cache = LRUCache(maxsize=CHAT_COUNT_CACHE_SIZE, ttl=CHAT_COUNT_CACHE_TTL_SECONDS)
+
+
+# ============== Cursors & Cached Totals ==============
+
+def encode_cursor(chat: ChatHistory) -> str:
+    """
+    Build an opaque pagination cursor pointing just after a chat message
+    Args:
+        chat: Last ChatHistory object of the current page
+    Returns:
+        URL-safe cursor string
+    """
+    raw = f"{chat.timestamp.isoformat()}|{chat.id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    """
+    Decode a cursor produced by encode_cursor
+    Args:
+        cursor: Cursor string
+    Returns:
+        (timestamp, id) of the last message already returned
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        timestamp, chat_id = raw.split("|", 1)
+        return datetime.fromisoformat(timestamp), UUID(chat_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def _history_query(user_id: UUID, cursor: Optional[str] = None):
+    """Newest-first history query, continuing after cursor if given (keyset on timestamp, id)"""
+    query = select(ChatHistory).where(ChatHistory.user_id == user_id)
+    if cursor:
+        timestamp, chat_id = decode_cursor(cursor)
+        query = query.where(or_(
+            ChatHistory.timestamp < timestamp,
+            and_(ChatHistory.timestamp == timestamp, ChatHistory.id < chat_id),
+        ))
+    return query.order_by(desc(ChatHistory.timestamp), desc(ChatHistory.id))
+
+
+def _adjust_chat_count(user_id: UUID, delta: int) -> None:
+    """Keep a cached total in step with an insert/delete (no-op if not cached)"""
+    chat_count_cache.update(user_id, lambda count: max(0, count + delta))
+
+
+def invalidate_chat_count(user_id: UUID) -> None:
+    """Drop a cached total (e.g. after bulk changes made outside this module)"""
+    chat_count_cache.pop(user_id)
 
 
 def save_chat(
@@ -38,8 +105,11 @@ def save_chat(
         timestamp=datetime.utcnow()
     )
     db.add(chat_item)
+    if role == "user":
+        record_question(db, message, chat_item.timestamp)
     db.commit()
     db.refresh(chat_item)
+    _adjust_chat_count(user_id, 1)
     return chat_item
 
 
@@ -61,7 +131,7 @@ def get_chat_history(
     """
     query = db.query(ChatHistory).filter(
         ChatHistory.user_id == user_id
-    ).order_by(desc(ChatHistory.timestamp))
+    ).order_by(desc(ChatHistory.timestamp), desc(ChatHistory.id))
     
     return query.offset(offset).limit(limit).all()
 
@@ -120,8 +190,11 @@ def delete_chat(
     ).first()
     
     if chat:
+        if chat.role == "user":
+            record_question(db, chat.message, chat.timestamp, delta=-1)
         db.delete(chat)
         db.commit()
+        _adjust_chat_count(user_id, -1)
         return True
     return False
 
@@ -138,10 +211,14 @@ def delete_user_chat_history(
     Returns:
         Number of deleted messages
     """
+    # Take the user's questions out of the dashboard rollups
+    forget_user_questions(db, user_id)
+
     deleted_count = db.query(ChatHistory).filter(
         ChatHistory.user_id == user_id
     ).delete()
     db.commit()
+    chat_count_cache.set(user_id, 0)
     return deleted_count
 
 
@@ -157,9 +234,13 @@ def get_chat_count(
     Returns:
         Total count of chat messages
     """
-    return db.query(ChatHistory).filter(
-        ChatHistory.user_id == user_id
-    ).count()
+    count = chat_count_cache.get(user_id)
+    if count is None:
+        count = db.query(ChatHistory).filter(
+            ChatHistory.user_id == user_id
+        ).count()
+        chat_count_cache.set(user_id, count)
+    return count
 
 
 def format_chat_for_context(chat_history: List[ChatHistory]) -> str:
@@ -176,3 +257,163 @@ def format_chat_for_context(chat_history: List[ChatHistory]) -> str:
         if chat.response:
             formatted.append(f"Assistant: {chat.response}")
     return "\n".join(formatted)
+
+
+# ============== Async variants (chat request path) ==============
+
+async def save_chat_async(
+    db: AsyncSession,
+    user_id: UUID,
+    message: str,
+    response: str,
+    role: str = "user"
+) -> ChatHistory:
+    """
+    Save a chat message and its response using an async session
+    Args:
+        db: Async database session (expire_on_commit=False, so no refresh is needed)
+        user_id: User UUID
+        message: User's message
+        response: Bot's response
+        role: Message role (user/assistant)
+    Returns:
+        Created ChatHistory object
+    """
+    chat_item = ChatHistory(
+        id=uuid4(),
+        user_id=user_id,
+        message=message,
+        response=response,
+        role=role,
+        timestamp=datetime.utcnow()
+    )
+    db.add(chat_item)
+    if role == "user":
+        await record_question_async(db, message, chat_item.timestamp)
+    await db.commit()
+    _adjust_chat_count(user_id, 1)
+    return chat_item
+
+
+async def get_chat_history_async(
+    db: AsyncSession,
+    user_id: UUID,
+    limit: int = 50,
+    offset: int = 0,
+    cursor: Optional[str] = None
+) -> List[ChatHistory]:
+    """
+    Retrieve chat history for a specific user using an async session
+    Args:
+        db: Async database session
+        user_id: User UUID
+        limit: Maximum number of messages to return
+        offset: Number of messages to skip (legacy paging, ignored when cursor is set)
+        cursor: Continue after the message encoded in this cursor (see encode_cursor)
+    Returns:
+        List of ChatHistory objects ordered by timestamp (newest first)
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    query = _history_query(user_id, cursor)
+    if not cursor and offset:
+        query = query.offset(offset)
+    result = await db.scalars(query.limit(limit))
+    return list(result)
+
+
+async def get_recent_chat_history_async(
+    db: AsyncSession,
+    user_id: UUID,
+    limit: int = 10
+) -> List[ChatHistory]:
+    """
+    Get recent chat history for context using an async session
+    Args:
+        db: Async database session
+        user_id: User UUID
+        limit: Number of recent messages
+    Returns:
+        List of recent ChatHistory objects (newest first)
+    """
+    result = await db.scalars(_history_query(user_id).limit(limit))
+    return list(result)
+
+
+async def get_chat_history_after_async(
+    db: AsyncSession,
+    user_id: UUID,
+    after: Tuple[datetime, UUID],
+    limit: int = 10
+) -> List[ChatHistory]:
+    """
+    Get the messages that follow a (timestamp, id) position using an async session
+    Args:
+        db: Async database session
+        user_id: User UUID
+        after: (timestamp, id) of the last message already seen
+        limit: Number of messages
+    Returns:
+        List of ChatHistory objects (oldest first)
+    """
+    timestamp, chat_id = after
+    query = (
+        select(ChatHistory)
+        .where(ChatHistory.user_id == user_id)
+        .where(or_(
+            ChatHistory.timestamp > timestamp,
+            and_(ChatHistory.timestamp == timestamp, ChatHistory.id > chat_id),
+        ))
+        .order_by(ChatHistory.timestamp, ChatHistory.id)
+    )
+    result = await db.scalars(query.limit(limit))
+    return list(result)
+
+
+async def get_chat_count_async(
+    db: AsyncSession,
+    user_id: UUID
+) -> int:
+    """
+    Get total number of chat messages for a user using an async session
+    Args:
+        db: Async database session
+        user_id: User UUID
+    Returns:
+        Total count of chat messages (cached per user, maintained on insert/delete)
+    """
+    count = chat_count_cache.get(user_id)
+    if count is None:
+        count = await db.scalar(
+            select(func.count()).select_from(ChatHistory).where(ChatHistory.user_id == user_id)
+        )
+        chat_count_cache.set(user_id, count)
+    return count
+
+
+async def delete_chat_async(
+    db: AsyncSession,
+    chat_id: UUID,
+    user_id: UUID
+) -> bool:
+    """
+    Delete a specific chat message using an async session
+    Args:
+        db: Async database session
+        chat_id: Chat UUID
+        user_id: User UUID (for verification)
+    Returns:
+        True if deleted, False otherwise
+    """
+    chat = await db.scalar(
+        select(ChatHistory).where(ChatHistory.id == chat_id, ChatHistory.user_id == user_id)
+    )
+
+    if chat:
+        if chat.role == "user":
+            await record_question_async(db, chat.message, chat.timestamp, delta=-1)
+        await db.delete(chat)
+        await db.commit()
+        _adjust_chat_count(user_id, -1)
+        return True
+    return False
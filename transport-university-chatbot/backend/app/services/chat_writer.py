@@ -0,0 +1,345 @@
+"""
+Chat write-behind module
+Takes chat_history inserts off the request path: the route gets a ChatHistory
+with a client-generated UUID straight away, and a background task writes queued
+rows in batches (one multi-row INSERT plus merged rollup upserts per batch, in a
+single transaction). The queue is bounded; when it stays full the request waits
+up to CHAT_WRITE_ENQUEUE_TIMEOUT_SECONDS and then saves inline (backpressure).
+Pending rows are flushed on shutdown.
+
+A batch that hits a lost connection / OperationalError is kept and retried with
+exponential backoff; only constraint or data errors split it into single-row
+inserts, so one bad row doesn't drop the others.
+
+The queue is per process: wait_for_user() only sees rows queued by this worker.
+With several uvicorn workers, a history read served by another worker may miss
+the newest rows until they are flushed (up to CHAT_WRITE_FLUSH_INTERVAL_MS
+plus any retry backoff).
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+from uuid import UUID, uuid4
+
+from sqlalchemy import exc, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.metrics import CHAT_WRITE_BATCH, CHAT_WRITES, observe_stage, registry as metrics_registry
+from app.models.chat_history import ChatHistory
+from app.services.chat_service import _adjust_chat_count, save_chat_async
+from app.services.stats_service import record_questions_async
+
+logger = logging.getLogger(__name__)
+
+# Configuration from environment variables
+CHAT_WRITE_BEHIND = os.getenv("CHAT_WRITE_BEHIND", "true").lower() == "true"
+CHAT_WRITE_QUEUE_SIZE = int(os.getenv("CHAT_WRITE_QUEUE_SIZE", "10000"))
+CHAT_WRITE_BATCH_SIZE = int(os.getenv("CHAT_WRITE_BATCH_SIZE", "200"))
+# How long the writer lingers after the first queued row to collect a fuller batch
+CHAT_WRITE_FLUSH_INTERVAL_MS = float(os.getenv("CHAT_WRITE_FLUSH_INTERVAL_MS", "20"))
+CHAT_WRITE_ENQUEUE_TIMEOUT_SECONDS = float(os.getenv("CHAT_WRITE_ENQUEUE_TIMEOUT_SECONDS", "1.0"))
+# Upper bound on how long a history read waits for the user's queued rows
+CHAT_WRITE_READ_WAIT_SECONDS = float(os.getenv("CHAT_WRITE_READ_WAIT_SECONDS", "2.0"))
+# Retries of a batch after a connection / operational error (delay doubles each time)
+CHAT_WRITE_RETRY_ATTEMPTS = int(os.getenv("CHAT_WRITE_RETRY_ATTEMPTS", "5"))
+CHAT_WRITE_RETRY_BACKOFF_MS = float(os.getenv("CHAT_WRITE_RETRY_BACKOFF_MS", "200"))
+CHAT_WRITE_RETRY_MAX_BACKOFF_MS = float(os.getenv("CHAT_WRITE_RETRY_MAX_BACKOFF_MS", "5000"))
+
+_STOP = object()
+
+
+def _row(chat: ChatHistory) -> dict:
+    return {
+        "id": chat.id,
+        "user_id": chat.user_id,
+        "role": chat.role,
+        "message": chat.message,
+        "response": chat.response,
+        "timestamp": chat.timestamp,
+    }
+
+
+def _is_transient(error: Exception) -> bool:
+    """Lost connection, timeout or lock error: the same batch may succeed later"""
+    if isinstance(error, exc.DBAPIError) and error.connection_invalidated:
+        return True
+    return isinstance(error, (exc.OperationalError, exc.InterfaceError, exc.DisconnectionError, OSError, asyncio.TimeoutError))
+
+
+async def _insert_chats(db: AsyncSession, chats: List[ChatHistory]) -> None:
+    """Insert rows (ids already set, no RETURNING needed) and count the user questions"""
+    await db.execute(insert(ChatHistory), [_row(chat) for chat in chats])
+    questions = [(chat.message, chat.timestamp) for chat in chats if chat.role == "user"]
+    if questions:
+        await record_questions_async(db, questions)
+    await db.commit()
+
+
+class ChatWriter:
+    """
+    Bounded write-behind queue for chat_history rows.
+
+    Usage:
+        await chat_writer.start()               # app startup, inside the event loop
+        entry = await chat_writer.submit(user_id, message, response)
+        if entry is None:                       # not running / queue full
+            entry = await save_chat_async(db, user_id, message, response)
+        await chat_writer.wait_for_user(user_id)  # before reading the user's history
+        await chat_writer.stop()                # app shutdown, flushes the queue
+    """
+
+    def __init__(
+        self,
+        session_factory: Optional[Callable[[], AsyncSession]] = None,
+        queue_size: int = CHAT_WRITE_QUEUE_SIZE,
+        batch_size: int = CHAT_WRITE_BATCH_SIZE,
+        flush_interval: float = CHAT_WRITE_FLUSH_INTERVAL_MS / 1000,
+        enqueue_timeout: float = CHAT_WRITE_ENQUEUE_TIMEOUT_SECONDS,
+        retry_attempts: int = CHAT_WRITE_RETRY_ATTEMPTS,
+        retry_backoff: float = CHAT_WRITE_RETRY_BACKOFF_MS / 1000,
+        retry_max_backoff: float = CHAT_WRITE_RETRY_MAX_BACKOFF_MS / 1000,
+    ):
+        self._session_factory = session_factory
+        self.queue_size = queue_size
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.retry_attempts = max(0, retry_attempts)
+        self.retry_backoff = retry_backoff
+        self.retry_max_backoff = retry_max_backoff
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._flushed: Optional[asyncio.Condition] = None
+        self._stopping: Optional[asyncio.Event] = None
+        self._pending: Dict[UUID, int] = defaultdict(int)
+        self._accepting = False
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self.rejected = 0
+        self.retries = 0
+
+    @property
+    def running(self) -> bool:
+        return self._accepting and self._task is not None and not self._task.done()
+
+    async def start(self) -> None:
+        """Start the flush task on the running event loop"""
+        if self.running:
+            return
+        if self._session_factory is None:
+            from app.database import AsyncSessionLocal
+
+            self._session_factory = AsyncSessionLocal
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._flushed = asyncio.Condition()
+        self._stopping = asyncio.Event()
+        self._accepting = True
+        self._task = asyncio.create_task(self._run(), name="chat-writer")
+
+    async def stop(self) -> None:
+        """Stop accepting rows and flush everything already queued"""
+        if self._task is None:
+            return
+        self._accepting = False
+        self._stopping.set()
+        await self._queue.put(_STOP)
+        await self._task
+        self._task = None
+
+    # ============== Producer side ==============
+
+    async def submit(
+        self,
+        user_id: UUID,
+        message: str,
+        response: str,
+        role: str = "user"
+    ) -> Optional[ChatHistory]:
+        """
+        Queue a chat row for the next batch
+        Args:
+            user_id: User UUID
+            message: User's message
+            response: Bot's response
+            role: Message role (user/assistant)
+        Returns:
+            The (not yet persisted) ChatHistory with its final id and timestamp, or None
+            if the writer is not running or the queue stayed full; save inline then
+        """
+        if not self.running:
+            return None
+        chat = ChatHistory(
+            id=uuid4(),
+            user_id=user_id,
+            message=message,
+            response=response,
+            role=role,
+            timestamp=datetime.utcnow()
+        )
+        # Counted before the put: the flush task may write the row as soon as we yield
+        self._pending[user_id] += 1
+        try:
+            await asyncio.wait_for(self._queue.put(chat), timeout=self.enqueue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            await self._done([chat])
+            return None
+        _adjust_chat_count(user_id, 1)
+        return chat
+
+    async def wait_for_user(self, user_id: UUID, timeout: float = CHAT_WRITE_READ_WAIT_SECONDS) -> None:
+        """
+        Wait until the user's queued rows are written (read-your-writes for history reads)
+        Only covers rows queued in this process: with several workers, a read served by
+        another worker does not wait for them
+        """
+        if not self._pending.get(user_id) or self._flushed is None:
+            return
+        try:
+            async with self._flushed:
+                await asyncio.wait_for(self._flushed.wait_for(lambda: not self._pending.get(user_id)), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ Chat writer: rows of user {user_id} still queued after {timeout}s")
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    # ============== Flush task ==============
+
+    async def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            # Linger briefly so bursts share one transaction (skipped when a full batch is waiting)
+            if self.flush_interval > 0 and self._queue.qsize() < self.batch_size - 1:
+                try:
+                    # Cut short on shutdown
+                    await asyncio.wait_for(self._stopping.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[ChatHistory]) -> None:
+        started = time.perf_counter()
+        try:
+            await self._write_batch(batch)
+        finally:
+            observe_stage("db_save_batch", time.perf_counter() - started)
+            await self._done(batch)
+
+    async def _write_batch(self, batch: List[ChatHistory]) -> None:
+        delay = self.retry_backoff
+        for attempt in range(self.retry_attempts + 1):
+            try:
+                async with self._session_factory() as db:
+                    await _insert_chats(db, batch)
+                self._written(batch)
+                return
+            except (exc.IntegrityError, exc.DataError) as e:
+                # One bad row must not drop the whole batch: retry the rows one by one
+                logger.warning(f"⚠️ Chat writer: batch of {len(batch)} failed ({e}), retrying row by row")
+                await self._write_rows(batch)
+                return
+            except Exception as e:
+                if not _is_transient(e) or attempt == self.retry_attempts:
+                    self._failed(batch, e)
+                    return
+                # Database unreachable / busy: keep the batch together and try again later
+                self.retries += 1
+                logger.warning(f"⚠️ Chat writer: batch of {len(batch)} failed ({e}), retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.retry_max_backoff)
+
+    async def _write_rows(self, batch: List[ChatHistory]) -> None:
+        for chat in batch:
+            try:
+                async with self._session_factory() as db:
+                    await _insert_chats(db, [chat])
+                self._written([chat])
+            except Exception as e:
+                self._failed([chat], e)
+
+    def _failed(self, chats: List[ChatHistory], error: Exception) -> None:
+        self.failed += len(chats)
+        CHAT_WRITES.inc(len(chats), path="failed")
+        for chat in chats:
+            _adjust_chat_count(chat.user_id, -1)
+            logger.error(f"❌ Chat writer: could not save chat {chat.id}: {error}")
+
+    def _written(self, chats: List[ChatHistory]) -> None:
+        self.written += len(chats)
+        self.batches += 1
+        CHAT_WRITE_BATCH.observe(len(chats))
+        CHAT_WRITES.inc(len(chats), path="queued")
+
+    async def _done(self, chats: List[ChatHistory]) -> None:
+        for chat in chats:
+            self._pending[chat.user_id] -= 1
+            if self._pending[chat.user_id] <= 0:
+                del self._pending[chat.user_id]
+        async with self._flushed:
+            self._flushed.notify_all()
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "queued": self.queue_depth(),
+            "written": self.written,
+            "failed": self.failed,
+            "batches": self.batches,
+            "rejected": self.rejected,
+            "retries": self.retries,
+        }
+
+
+chat_writer = ChatWriter()
+
+
+async def save_chat_deferred(
+    db: AsyncSession,
+    user_id: UUID,
+    message: str,
+    response: str,
+    role: str = "user"
+) -> ChatHistory:
+    """
+    Save a chat message through the write-behind queue, inline if it is unavailable
+    Args:
+        db: Async database session (only used for the inline fallback)
+        user_id: User UUID
+        message: User's message
+        response: Bot's response
+        role: Message role (user/assistant)
+    Returns:
+        ChatHistory object (its id is final even if the row is not written yet)
+    """
+    chat = await chat_writer.submit(user_id, message, response, role)
+    if chat is None:
+        chat = await save_chat_async(db, user_id, message, response, role)
+        CHAT_WRITES.inc(path="inline")
+    return chat
+
+
+def _writer_collector():
+    """Write-behind queue depth, read at scrape time."""
+    yield "chat_write_queue_depth", "gauge", "Chat rows waiting for the write-behind flush", [({}, chat_writer.queue_depth())]
+
+
+metrics_registry.register_collector(_writer_collector)
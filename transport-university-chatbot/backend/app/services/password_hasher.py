@@ -0,0 +1,146 @@
+"""
+Password hashing service module
+Runs bcrypt in a dedicated, bounded process pool so login/register storms cannot
+block the event loop or Starlette's threadpool, and rejects work quickly once the
+pool's backlog is full
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from passlib.context import CryptContext
+
+# Configuration from environment variables
+# bcrypt cost factor for new hashes; existing hashes with another cost are upgraded on login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Worker processes dedicated to hashing (0 = a single in-process thread, e.g. for tests)
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Jobs allowed to be running or queued before new ones are rejected
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", str(max(1, PASSWORD_HASH_WORKERS) * 16)))
+
+# Password hashing context
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when the hashing backlog is full; callers should answer 503"""
+
+
+# ============== Worker Functions ==============
+# Module-level so they can be pickled into the worker processes
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _warm_up() -> None:
+    # Loads the bcrypt backend; 4 rounds keeps it to a few milliseconds
+    pwd_context.handler().using(rounds=4).hash("warm-up")
+
+
+def _verify_and_update(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    try:
+        return pwd_context.verify_and_update(password, hashed_password)
+    except ValueError:
+        # Malformed or unknown hash format
+        return False, None
+
+
+# ============== Hasher ==============
+
+class PasswordHasher:
+    """
+    Bounded executor for bcrypt work.
+
+    Usage:
+        from app.services.password_hasher import password_hasher
+        password_hash = await password_hasher.hash(password)
+        ok, new_hash = await password_hasher.verify_and_update(password, user.password_hash)
+    """
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_pending: int = PASSWORD_HASH_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor: Optional[Executor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.rejected = 0
+
+    def start(self) -> None:
+        """
+        Create the pool and warm up every worker in the background (called at startup)
+        A process pool only spawns its workers as jobs arrive: one warm-up job per worker
+        starts them all now, so the first logins don't pay for the interpreter start
+        and the bcrypt import
+        """
+        executor = self._get_executor()
+        for _ in range(self.workers):
+            executor.submit(_warm_up)
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    if self.workers > 0:
+                        # spawn: forking a process that already runs threads/event loops is unsafe
+                        self._executor = ProcessPoolExecutor(
+                            max_workers=self.workers,
+                            mp_context=multiprocessing.get_context("spawn"),
+                        )
+                    else:
+                        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="password-hasher")
+        return self._executor
+
+    async def _submit(self, func, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise PasswordHasherBusy("Password hashing backlog is full")
+            self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    async def hash(self, password: str) -> str:
+        """
+        Hash a plain password
+        Raises:
+            PasswordHasherBusy: If the backlog is full
+        """
+        return await self._submit(_hash, password)
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """
+        Verify a password and produce a replacement hash if the stored one is outdated
+        Args:
+            password: Plain text password to verify
+            hashed_password: Stored hash
+        Returns:
+            (matches, new_hash) where new_hash is None unless the hash needs an upgrade
+        Raises:
+            PasswordHasherBusy: If the backlog is full
+        """
+        return await self._submit(_verify_and_update, password, hashed_password)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "pending": self._pending,
+            "max_pending": self.max_pending,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,389 @@
+"""
+Dashboard statistics service
+Maintains question/user counters and per-question counts incrementally, in the
+same transaction as the chat_history / users writes, so the admin dashboard
+reads a handful of rollup rows instead of scanning chat_history.
+
+Rollups are bucketed per UTC day (timestamps are stored in UTC) plus an
+all-time row, which gives the today / 7d / 30d / all views. reconcile_stats()
+rebuilds everything from the source tables; run it periodically
+(python -m app.scripts.reconcile_stats) to absorb any drift, e.g. rows written
+by scripts that bypass this module.
+"""
+import hashlib
+import os
+import random
+import re
+import unicodedata
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, aliased
+
+from app.cache import LRUCache
+from app.models.chat_history import ChatHistory
+from app.models.stats import ALL_TIME, QuestionCluster, QuestionClusterMember, QuestionCount, StatCounter
+from app.models.user import User
+
+# Configuration from environment variables
+# Rows per counter and day; more shards = less row-lock contention between concurrent saves
+STATS_COUNTER_SHARDS = max(1, int(os.getenv("STATS_COUNTER_SHARDS", "8")))
+DASHBOARD_CACHE_TTL_SECONDS = float(os.getenv("DASHBOARD_CACHE_TTL_SECONDS", "30"))
+FREQUENT_QUESTIONS_LIMIT = 5
+TOP_CLUSTERS_LIMIT = 5
+
+# window name -> number of UTC days (None = all time)
+WINDOWS: Dict[str, Optional[int]] = {"today": 1, "7d": 7, "30d": 30, "all": None}
+
+QUESTIONS = "questions"
+USERS = "users"
+
+# window -> dashboard payload, shared by all admins
+dashboard_cache = LRUCache(maxsize=len(WINDOWS), ttl=DASHBOARD_CACHE_TTL_SECONDS)
+
+
+# ============== Keys & Windows ==============
+
+def question_key(message: str) -> str:
+    """
+    Grouping key of a question: NFC, lower-case, collapsed whitespace
+    Long questions keep a readable prefix plus a hash so the key fits the column
+    """
+    normalized = re.sub(r"\s+", " ", unicodedata.normalize("NFC", message)).strip().lower()
+    if len(normalized) <= 255:
+        return normalized
+    digest = hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:16]
+    return f"{normalized[:238]}#{digest}"
+
+
+def window_start(window: str, today: Optional[date] = None) -> Optional[date]:
+    """
+    First UTC day included in a window
+    Raises:
+        ValueError: If the window is unknown
+    """
+    if window not in WINDOWS:
+        raise ValueError(f"Unknown window '{window}'. Expected one of: {', '.join(WINDOWS)}")
+    days = WINDOWS[window]
+    if days is None:
+        return None
+    return (today or datetime.utcnow().date()) - timedelta(days=days - 1)
+
+
+# ============== Incremental Updates ==============
+
+def _insert(db) -> Any:
+    """INSERT ... ON CONFLICT construct for the session's database"""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"Dashboard rollups need INSERT ... ON CONFLICT (postgresql, sqlite), got '{dialect}'")
+    return insert
+
+
+def _counter_statement(insert, name: str, day: date, delta: int):
+    shard = random.randrange(STATS_COUNTER_SHARDS)
+    stmt = insert(StatCounter).values([
+        {"name": name, "day": day, "shard": shard, "value": delta},
+        {"name": name, "day": ALL_TIME, "shard": shard, "value": delta},
+    ])
+    return stmt.on_conflict_do_update(
+        index_elements=["name", "day", "shard"],
+        set_={"value": StatCounter.value + stmt.excluded.value},
+    )
+
+
+def _question_statement(insert, message: str, day: date, delta: int):
+    key = question_key(message)
+    if delta < 0:
+        # Never create rows on a decrement (history older than the rollups): take it
+        # off one existing shard, readers only look at the sum
+        other = aliased(QuestionCount)
+        first_shard = (
+            select(func.min(other.shard))
+            .where(other.day == QuestionCount.day, other.question_key == key)
+            .scalar_subquery()
+        )
+        return (
+            update(QuestionCount)
+            .where(
+                QuestionCount.question_key == key,
+                QuestionCount.day.in_([day, ALL_TIME]),
+                QuestionCount.shard == first_shard,
+            )
+            .values(count=QuestionCount.count + delta)
+        )
+    shard = random.randrange(STATS_COUNTER_SHARDS)
+    stmt = insert(QuestionCount).values([
+        {"day": day, "question_key": key, "shard": shard, "question": message, "count": delta},
+        {"day": ALL_TIME, "question_key": key, "shard": shard, "question": message, "count": delta},
+    ])
+    return stmt.on_conflict_do_update(
+        index_elements=["day", "question_key", "shard"],
+        set_={"count": QuestionCount.count + stmt.excluded.count},
+    )
+
+
+def _question_statements(db, message: str, when: datetime, delta: int) -> list:
+    insert = _insert(db)
+    day = when.date()
+    return [_counter_statement(insert, QUESTIONS, day, delta), _question_statement(insert, message, day, delta)]
+
+
+def _grouped_statements(db, questions: Iterable[Tuple[str, date, int]]) -> list:
+    """
+    Statements applying many (message, day, delta) at once
+    Repeated questions and days are merged: one statement per distinct day and
+    per distinct (day, question) instead of two per message
+    """
+    per_day: Dict[date, int] = defaultdict(int)
+    per_question: Dict[Tuple[date, str], List] = {}
+    for message, day, delta in questions:
+        per_day[day] += delta
+        entry = per_question.setdefault((day, question_key(message)), [message, 0])
+        entry[1] += delta
+    insert = _insert(db)
+    # Fixed order: concurrent batches lock the same rows in the same order
+    statements = [_counter_statement(insert, QUESTIONS, day, per_day[day]) for day in sorted(per_day)]
+    for key in sorted(per_question):
+        message, delta = per_question[key]
+        statements.append(_question_statement(insert, message, key[0], delta))
+    return statements
+
+
+def record_question(db: Session, message: str, when: datetime, delta: int = 1) -> None:
+    """
+    Count a user question (delta=-1 when its chat row is deleted)
+    Runs in the caller's transaction: call before the commit that writes the chat row
+    Args:
+        db: Database session
+        message: The user's message
+        when: Timestamp of the chat row (UTC)
+        delta: +1 on insert, -1 on delete
+    """
+    for stmt in _question_statements(db, message, when, delta):
+        db.execute(stmt)
+
+
+async def record_question_async(db: AsyncSession, message: str, when: datetime, delta: int = 1) -> None:
+    """Async variant of record_question (same transaction as the chat row)"""
+    for stmt in _question_statements(db, message, when, delta):
+        await db.execute(stmt)
+
+
+async def record_questions_async(db: AsyncSession, questions: List[Tuple[str, datetime]]) -> None:
+    """
+    Count several user questions at once (write-behind batches)
+    Args:
+        db: Async database session (same transaction as the chat rows)
+        questions: (message, timestamp) of each new user question
+    """
+    for stmt in _grouped_statements(db, ((message, when.date(), 1) for message, when in questions)):
+        await db.execute(stmt)
+
+
+def forget_user_questions(db: Session, user_id) -> None:
+    """
+    Take all of a user's questions out of the rollups (before deleting their history)
+    One grouped read of chat_history, then one decrement per distinct day and per
+    distinct (day, question) instead of two UPDATEs per deleted row
+    Args:
+        db: Database session (same transaction as the DELETE)
+        user_id: User UUID
+    """
+    chat_day = func.date(ChatHistory.timestamp)
+    rows = db.execute(
+        select(chat_day, ChatHistory.message, func.count())
+        .where(ChatHistory.user_id == user_id, ChatHistory.role == "user")
+        .group_by(chat_day, ChatHistory.message)
+    )
+    for stmt in _grouped_statements(db, [(message, _as_date(day), -count) for day, message, count in rows]):
+        db.execute(stmt)
+
+
+def record_user(db: Session, when: datetime, delta: int = 1) -> None:
+    """Count a new user account (call before the commit that inserts it)"""
+    db.execute(_counter_statement(_insert(db), USERS, when.date(), delta))
+
+
+async def record_user_async(db: AsyncSession, when: datetime, delta: int = 1) -> None:
+    """Async variant of record_user"""
+    await db.execute(_counter_statement(_insert(db), USERS, when.date(), delta))
+
+
+# ============== Dashboard Reads ==============
+
+def _counter_total(db: Session, name: str, start: Optional[date]) -> int:
+    query = select(func.coalesce(func.sum(StatCounter.value), 0)).where(StatCounter.name == name)
+    query = query.where(StatCounter.day == ALL_TIME) if start is None else query.where(StatCounter.day >= start)
+    return max(0, int(db.scalar(query)))
+
+
+def _frequent_questions(db: Session, start: Optional[date], limit: int) -> List[Dict[str, Any]]:
+    total = func.sum(QuestionCount.count)
+    query = select(func.min(QuestionCount.question), total)
+    # All time: one PK range scan of the ALL_TIME rows, shards summed per key
+    query = query.where(QuestionCount.day == ALL_TIME) if start is None else query.where(QuestionCount.day >= start)
+    query = query.group_by(QuestionCount.question_key).having(total > 0).order_by(total.desc())
+    return [{"question": question, "count": int(count)} for question, count in db.execute(query.limit(limit))]
+
+
+def top_clusters(db: Session, start: Optional[date] = None, limit: int = TOP_CLUSTERS_LIMIT) -> List[Dict[str, Any]]:
+    """
+    Largest clusters of near-duplicate questions (built by app.rag.question_clusters)
+    Args:
+        db: Database session
+        start: First UTC day to count (None = all time, served from ix_question_clusters_size)
+        limit: Maximum number of clusters
+    Returns:
+        [{"cluster_id", "question" (representative wording), "count"}], largest first
+    """
+    if start is None:
+        query = (
+            select(QuestionCluster.id, QuestionCluster.representative, QuestionCluster.size)
+            .where(QuestionCluster.size > 0)
+            .order_by(QuestionCluster.size.desc(), QuestionCluster.id)
+        )
+    else:
+        total = func.count()
+        query = (
+            select(QuestionCluster.id, QuestionCluster.representative, total)
+            .join(QuestionClusterMember, QuestionClusterMember.cluster_id == QuestionCluster.id)
+            .where(QuestionClusterMember.day >= start)
+            .group_by(QuestionCluster.id, QuestionCluster.representative)
+            .order_by(total.desc(), QuestionCluster.id)
+        )
+    return [
+        {"cluster_id": cluster_id, "question": question, "count": int(count)}
+        for cluster_id, question, count in db.execute(query.limit(limit))
+    ]
+
+
+def hot_intents(db: Session, limit: int = 50, window: str = "all") -> List[str]:
+    """
+    Representative questions of the largest clusters, e.g. to precompute FAQ answers
+    Falls back to the most frequent exact questions until the clustering job has run.
+    """
+    start = window_start(window)
+    clusters = top_clusters(db, start, limit)
+    if clusters:
+        return [item["question"] for item in clusters]
+    return [item["question"] for item in _frequent_questions(db, start, limit)]
+
+
+def get_dashboard_stats(db: Session, window: str = "all", use_cache: bool = True) -> Dict[str, Any]:
+    """
+    Dashboard statistics from the rollup tables
+    Args:
+        db: Database session
+        window: "today", "7d", "30d" or "all"
+        use_cache: Serve a payload computed less than DASHBOARD_CACHE_TTL_SECONDS ago
+    Returns:
+        Dict matching schemas.DashboardStats
+    Raises:
+        ValueError: If the window is unknown
+    """
+    start = window_start(window)
+    if use_cache:
+        cached = dashboard_cache.get(window)
+        if cached is not None:
+            return cached
+
+    frequent = _frequent_questions(db, start, FREQUENT_QUESTIONS_LIMIT)
+    stats = {
+        "window": window,
+        "since": start,
+        "total_users": _counter_total(db, USERS, None),
+        "new_users": _counter_total(db, USERS, start),
+        "total_questions": _counter_total(db, QUESTIONS, start),
+        "frequent_questions": [item["question"] for item in frequent],
+        "frequent_question_counts": frequent,
+        "top_clusters": top_clusters(db, start, TOP_CLUSTERS_LIMIT),
+    }
+    dashboard_cache.set(window, stats)
+    return stats
+
+
+# ============== Reconciliation ==============
+
+def _as_date(value) -> date:
+    # SQLite returns date() as 'YYYY-MM-DD' text
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+def _snapshot(db: Session) -> Tuple[Dict[Tuple[str, date], int], Dict[Tuple[date, str], int]]:
+    counters = defaultdict(int)
+    for name, day, value in db.execute(select(StatCounter.name, StatCounter.day, StatCounter.value)):
+        counters[(name, day)] += value
+    questions = defaultdict(int)
+    for day, key, count in db.execute(select(QuestionCount.day, QuestionCount.question_key, QuestionCount.count)):
+        questions[(day, key)] += count
+    return dict(counters), {key: count for key, count in questions.items() if count}
+
+
+def reconcile_stats(db: Session) -> Dict[str, Any]:
+    """
+    Rebuild the rollup tables from users and chat_history
+    Writes made while it runs may be missed; the next run picks them up.
+    Args:
+        db: Database session
+    Returns:
+        Totals after the rebuild and how many rollup rows had drifted
+    """
+    old_counters, old_questions = _snapshot(db)
+
+    counters: Dict[Tuple[str, date], int] = defaultdict(int)
+    user_day = func.date(User.created_at)
+    for day, count in db.execute(select(user_day, func.count()).group_by(user_day)):
+        counters[(USERS, _as_date(day))] += count
+        counters[(USERS, ALL_TIME)] += count
+
+    questions: Dict[Tuple[date, str], int] = defaultdict(int)
+    display: Dict[str, str] = {}
+    chat_day = func.date(ChatHistory.timestamp)
+    rows = db.execute(
+        select(chat_day, ChatHistory.message, func.count())
+        .where(ChatHistory.role == "user")
+        .group_by(chat_day, ChatHistory.message)
+    )
+    for day, message, count in rows:
+        day, key = _as_date(day), question_key(message)
+        display.setdefault(key, message)
+        questions[(day, key)] += count
+        questions[(ALL_TIME, key)] += count
+        counters[(QUESTIONS, day)] += count
+        counters[(QUESTIONS, ALL_TIME)] += count
+
+    db.execute(delete(StatCounter))
+    db.execute(delete(QuestionCount))
+    if counters:
+        db.execute(StatCounter.__table__.insert(), [
+            {"name": name, "day": day, "shard": 0, "value": value} for (name, day), value in counters.items()
+        ])
+    if questions:
+        db.execute(QuestionCount.__table__.insert(), [
+            {"day": day, "question_key": key, "shard": 0, "question": display[key], "count": count}
+            for (day, key), count in questions.items()
+        ])
+    db.commit()
+    dashboard_cache.clear()
+
+    counters, questions = dict(counters), dict(questions)
+    return {
+        "users": counters.get((USERS, ALL_TIME), 0),
+        "questions": counters.get((QUESTIONS, ALL_TIME), 0),
+        "distinct_questions": sum(1 for day, _ in questions if day == ALL_TIME),
+        "drifted_counters": sum(1 for k in old_counters.keys() | counters.keys() if old_counters.get(k, 0) != counters.get(k, 0)),
+        "drifted_questions": sum(1 for k in old_questions.keys() | questions.keys() if old_questions.get(k, 0) != questions.get(k, 0)),
+    }
+
+
+def stats_initialized(db: Session) -> bool:
+    """True once the rollups have been built (any counter row exists)"""
+    return db.scalar(select(StatCounter.name).limit(1)) is not None
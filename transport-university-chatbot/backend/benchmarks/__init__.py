@@ -0,0 +1 @@
+"""Microbenchmarks and load tests (run from backend/ with `python -m benchmarks.<name>`)."""
@@ -0,0 +1,174 @@
+"""
+Auth middleware microbenchmark: BaseHTTPMiddleware vs pure ASGI
+
+Builds otherwise identical apps (GET /api and the real chat router on a
+temporary SQLite database) and measures requests/second on /api and
+/api/chat/history with an authenticated client:
+
+    legacy  the previous BaseHTTPMiddleware implementation (sync users query
+            on the event loop, no auth cache)
+    asgi    app.middleware.auth_middleware.AuthMiddleware with the auth cache
+            disabled, so the gain is the middleware change alone
+    cached  AuthMiddleware with the claims / user snapshot cache on
+
+Run:
+    python -m benchmarks.auth_middleware --requests 2000 --concurrency 32
+"""
+import argparse
+import asyncio
+import contextlib
+import os
+import tempfile
+import time
+from unittest.mock import patch
+from uuid import UUID
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.cache import LRUCache
+from app.database import Base, get_async_db
+from app.middleware import auth_middleware
+from app.middleware.auth_middleware import AuthMiddleware
+from app.models import ChatHistory, User
+from app.routes import chat
+from app.services import auth_cache
+from app.services.auth_cache import clear_auth_cache
+from app.services.auth_service import create_access_token, decode_access_token
+
+ROUTES = ["/api", "/api/chat/history"]
+VARIANTS = ("legacy", "asgi", "cached")
+
+
+class LegacyAuthMiddleware(BaseHTTPMiddleware):
+    """The pre-ASGI middleware: decodes the token and queries the user on every request"""
+
+    def __init__(self, app, session_factory):
+        super().__init__(app)
+        self.session_factory = session_factory
+
+    async def dispatch(self, request, call_next):
+        request.state.user = None
+        request.state.user_id = None
+        auth_header = request.headers.get("Authorization")
+        if auth_header and auth_header.startswith("Bearer "):
+            payload = decode_access_token(auth_header[7:])
+            db = self.session_factory()
+            try:
+                user = db.query(User).filter(User.id == UUID(payload["sub"])).first()
+                if user and user.is_active:
+                    request.state.user = user
+                    request.state.user_id = user.id
+            finally:
+                db.close()
+        return await call_next(request)
+
+
+def auth_cache_disabled():
+    """Swap the claims / user caches for ones that keep nothing"""
+    stack = contextlib.ExitStack()
+    token_cache, user_cache = LRUCache(maxsize=0), LRUCache(maxsize=0)
+    stack.enter_context(patch.object(auth_cache, "token_cache", token_cache))
+    stack.enter_context(patch.object(auth_cache, "user_cache", user_cache))
+    stack.enter_context(patch.object(auth_middleware, "user_cache", user_cache))
+    return stack
+
+
+def build_app(variant: str, session_factory, async_session_factory) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/api")
+    def api_root():
+        return {"message": "✅ API is running successfully."}
+
+    async def override_get_async_db():
+        async with async_session_factory() as db:
+            yield db
+
+    app.include_router(chat.router, prefix="/api")
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    if variant == "legacy":
+        app.add_middleware(LegacyAuthMiddleware, session_factory=session_factory)
+    else:
+        app.add_middleware(AuthMiddleware)
+    return app
+
+
+async def measure(app: FastAPI, path: str, token: str, n_requests: int, concurrency: int) -> float:
+    """Return requests/second for n_requests GETs issued by `concurrency` workers"""
+    transport = httpx.ASGITransport(app=app)
+    headers = {"Authorization": f"Bearer {token}"}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers) as client:
+        # Warm-up (fills the auth cache for the ASGI variant)
+        response = await client.get(path)
+        response.raise_for_status()
+
+        remaining = n_requests
+
+        async def worker():
+            nonlocal remaining
+            while remaining > 0:
+                remaining -= 1
+                (await client.get(path)).raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return n_requests / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Auth middleware microbenchmark")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--history-rows", type=int, default=50)
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), "bench_auth.db")
+    engine = create_engine(f"sqlite:///{db_path}", connect_args={"check_same_thread": False})
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    async_session_factory = async_sessionmaker(bind=async_engine, class_=AsyncSession, expire_on_commit=False)
+    Base.metadata.create_all(bind=engine)
+
+    db = session_factory()
+    user = User(username="bench", email="bench@example.com", password_hash="x", is_active=True)
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    db.add_all([
+        ChatHistory(user_id=user.id, message=f"Câu hỏi {i}", response=f"Trả lời {i}", role="user")
+        for i in range(args.history_rows)
+    ])
+    db.commit()
+    token = create_access_token({"sub": str(user.id)})
+    db.close()
+
+    async def run_all():
+        rows = []
+        for path in ROUTES:
+            results = {}
+            for variant in VARIANTS:
+                clear_auth_cache()
+                app = build_app(variant, session_factory, async_session_factory)
+                caching = contextlib.nullcontext() if variant == "cached" else auth_cache_disabled()
+                with caching:
+                    results[variant] = await measure(app, path, token, args.requests, args.concurrency)
+            rows.append((path, results))
+        await async_engine.dispose()
+        return rows
+
+    with patch("app.middleware.auth_middleware.SessionLocal", session_factory):
+        rows = asyncio.run(run_all())
+
+    # speedup compares legacy with asgi only: both run without the auth cache
+    print(f"{'route':<22}{'legacy rps':>12}{'asgi rps':>12}{'speedup':>10}{'cached rps':>12}")
+    for path, results in rows:
+        speedup = results["asgi"] / results["legacy"]
+        print(f"{path:<22}{results['legacy']:>12.0f}{results['asgi']:>12.0f}{speedup:>9.2f}x{results['cached']:>12.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Query embedding benchmark: one encode per request vs the micro-batching scheduler
+
+`--concurrency` clients each encode distinct questions in a loop on one event
+loop (as concurrent /api/chat/send requests do). Two variants are measured at
+each concurrency level:
+
+    single   run_cpu_bound(model.embed_query, question) per request (previous path)
+    batched  app.rag.embedding_batcher.EmbeddingBatcher over model.embed_documents
+
+Reports questions/second, p50/p99 latency and the average batch size.
+
+By default the model is a synthetic CPU encoder (a small NumPy transformer with a
+fixed per-forward cost, see SyntheticEncoder) so the benchmark runs without
+downloading weights; pass `--model` to use a real HuggingFace model (requires
+langchain-huggingface) for numbers that mean something for production.
+
+Run:
+    python -m benchmarks.embedding_batcher --concurrency 1 4 16 64 --requests 512
+    python -m benchmarks.embedding_batcher --model AITeamVN/Vietnamese_Embedding --requests 128
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import List
+
+import numpy as np
+
+from app.concurrency import run_cpu_bound
+from app.rag.embedding_batcher import EmbeddingBatcher
+
+QUESTIONS = [
+    "Học phí ngành Kỹ thuật xây dựng là bao nhiêu?",
+    "Điểm chuẩn ngành Công nghệ thông tin năm 2024?",
+    "Ký túc xá cơ sở Hà Nội ở đâu?",
+    "Hạn nộp hồ sơ xét tuyển khi nào?",
+    "Trường có những học bổng nào cho sinh viên năm nhất?",
+    "Mã ngành Logistics và quản lý chuỗi cung ứng là gì?",
+]
+
+
+class SyntheticEncoder:
+    """
+    Small transformer-shaped encoder in NumPy (token lookup, attention + GELU
+    feed-forward layers, mean pooling), plus a fixed per-forward CPU cost that
+    stands in for tokenization and eager-framework dispatch (several ms per call
+    for a 12-layer PyTorch encoder on CPU). Batching amortizes that fixed cost.
+    """
+
+    def __init__(self, hidden: int = 128, layers: int = 4, heads: int = 4, dim: int = 1024,
+                 call_overhead_ms: float = 5.0, vocab: int = 30000, seed: int = 0):
+        rng = np.random.default_rng(seed)
+
+        def weight(*shape):
+            return rng.standard_normal(shape, dtype=np.float32) / np.sqrt(shape[0])
+
+        self.vocab = vocab
+        self.heads = heads
+        self.call_overhead = call_overhead_ms / 1000
+        self.tokens = rng.standard_normal((vocab, hidden), dtype=np.float32)
+        self.layers = [
+            (weight(hidden, 3 * hidden), weight(hidden, hidden), weight(hidden, 4 * hidden), weight(4 * hidden, hidden))
+            for _ in range(layers)
+        ]
+        self.out = weight(hidden, dim)
+
+    def _token_ids(self, text: str) -> List[int]:
+        # ~ sub-word tokens: 3-character pieces
+        return [hash(text[i:i + 3]) % self.vocab for i in range(0, max(len(text), 1), 3)]
+
+    @staticmethod
+    def _layer_norm(x):
+        return (x - x.mean(-1, keepdims=True)) / np.sqrt(x.var(-1, keepdims=True) + 1e-5)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        deadline = time.perf_counter() + self.call_overhead
+        while time.perf_counter() < deadline:  # busy: holds the CPU like real dispatch work
+            pass
+
+        ids = [self._token_ids(t) for t in texts]
+        batch, length = len(texts), max(len(i) for i in ids)
+        padded = np.zeros((batch, length), dtype=np.int64)
+        mask = np.zeros((batch, length), dtype=np.float32)
+        for row, token_ids in enumerate(ids):
+            padded[row, :len(token_ids)] = token_ids
+            mask[row, :len(token_ids)] = 1.0
+
+        x = self.tokens[padded]
+        hidden = x.shape[-1]
+        head_dim = hidden // self.heads
+        attention_bias = (1 - mask)[:, None, None, :] * -1e9
+        for w_qkv, w_o, w_up, w_down in self.layers:
+            q, k, v = (
+                a.reshape(batch, length, self.heads, head_dim).transpose(0, 2, 1, 3)
+                for a in np.split(self._layer_norm(x) @ w_qkv, 3, axis=-1)
+            )
+            scores = q @ k.transpose(0, 1, 3, 2) / np.sqrt(head_dim) + attention_bias
+            scores = np.exp(scores - scores.max(-1, keepdims=True))
+            scores /= scores.sum(-1, keepdims=True)
+            x = x + (scores @ v).transpose(0, 2, 1, 3).reshape(batch, length, hidden) @ w_o
+            y = self._layer_norm(x) @ w_up
+            x = x + (y * 0.5 * (1 + np.tanh(0.79788456 * (y + 0.044715 * y ** 3)))) @ w_down
+
+        pooled = (x * mask[..., None]).sum(axis=1) / mask.sum(axis=1, keepdims=True)
+        vectors = pooled @ self.out
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def measure(encode, concurrency: int, requests: int) -> dict:
+    latencies = []
+    remaining = requests
+    counter = 0
+
+    async def client():
+        nonlocal remaining, counter
+        while remaining > 0:
+            remaining -= 1
+            counter += 1
+            question = f"{QUESTIONS[counter % len(QUESTIONS)]} ({counter})"
+            start = time.perf_counter()
+            await encode(question)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "qps": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query embedding micro-batching benchmark")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--requests", type=int, default=512)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--wait-ms", type=float, default=3.0)
+    parser.add_argument("--model", default=None, help="HuggingFace model name (default: synthetic encoder)")
+    parser.add_argument("--call-overhead-ms", type=float, default=5.0, help="synthetic encoder fixed cost per forward")
+    args = parser.parse_args()
+
+    if args.model:
+        from app.rag.vector_store import create_embeddings
+
+        model = create_embeddings(args.model)
+    else:
+        model = SyntheticEncoder(call_overhead_ms=args.call_overhead_ms)
+    model.embed_documents(QUESTIONS)  # warm-up
+
+    async def run_all():
+        rows = []
+        for concurrency in args.concurrency:
+            single = await measure(lambda q: run_cpu_bound(model.embed_query, q), concurrency, args.requests)
+            batcher = EmbeddingBatcher(model.embed_documents, max_batch_size=args.batch_size, max_wait_ms=args.wait_ms)
+            batched = await measure(batcher.embed, concurrency, args.requests)
+            rows.append((concurrency, "single", single, 1.0))
+            rows.append((concurrency, "batched", batched, batcher.stats()["avg_batch_size"]))
+        return rows
+
+    rows = asyncio.run(run_all())
+    print(f"model={args.model or 'synthetic'} requests={args.requests} "
+          f"batch_size={args.batch_size} wait_ms={args.wait_ms}")
+    print(f"{'conc':>5} {'variant':<8}{'q/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'avg batch':>11}")
+    for concurrency, variant, r, avg_batch in rows:
+        print(f"{concurrency:>5} {variant:<8}{r['qps']:>9.1f}{r['p50_ms']:>9.1f}{r['p99_ms']:>9.1f}{avg_batch:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
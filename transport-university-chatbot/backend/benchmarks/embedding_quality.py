@@ -0,0 +1,137 @@
+"""
+Embedding backend quality/speed check: ONNX (fp32 / int8) vs the PyTorch fp32 reference
+
+Embeds the chunks of the PDFs in data/ (Data_UTC.pdf) and a set of student
+questions with every backend and reports, for each ONNX variant:
+
+    cosine      mean / min cosine between its chunk vectors and the fp32 reference
+    recall@k    overlap of the top-k chunks retrieved for each question vs fp32
+    speed       load time, chunk encode throughput, single-query latency
+    memory      resident set size added by loading the model
+
+Exits with status 1 if a variant's recall@k is below --min-recall, so it can gate
+switching EMBEDDING_BACKEND=onnx (or ONNX_QUANTIZED=true) after a re-export.
+
+Run (after `python -m app.rag.onnx_embeddings --quantize`):
+    python -m benchmarks.embedding_quality --k 5 --min-recall 0.9
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+QUESTIONS = [
+    "Học phí ngành Kỹ thuật xây dựng là bao nhiêu?",
+    "Điểm chuẩn ngành Công nghệ thông tin năm trước?",
+    "Trường có ký túc xá cho sinh viên không?",
+    "Hồ sơ xét tuyển gồm những gì?",
+    "Trường có những phương thức tuyển sinh nào?",
+    "Mã ngành Logistics và quản lý chuỗi cung ứng là gì?",
+    "Trường Đại học Giao thông Vận tải có những cơ sở nào?",
+    "Chỉ tiêu tuyển sinh năm nay là bao nhiêu?",
+    "Sinh viên được nhận học bổng như thế nào?",
+    "Chương trình chất lượng cao học bằng tiếng Anh không?",
+    "Điều kiện xét tuyển thẳng là gì?",
+    "Thời gian đào tạo ngành kiến trúc là mấy năm?",
+]
+
+
+def rss_mb() -> float:
+    """Current resident set size (Linux), 0 if unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError):
+        return 0.0
+
+
+def measure(name, factory, chunks):
+    rss_before = rss_mb()
+    started = time.perf_counter()
+    model = factory()
+    load_seconds = time.perf_counter() - started
+    rss_after = rss_mb()
+
+    started = time.perf_counter()
+    chunk_vectors = np.asarray(model.embed_documents(chunks), dtype=np.float32)
+    encode_seconds = time.perf_counter() - started
+
+    query_vectors, latencies = [], []
+    for question in QUESTIONS:
+        started = time.perf_counter()
+        query_vectors.append(model.embed_query(question))
+        latencies.append(time.perf_counter() - started)
+    return {
+        "name": name,
+        "load_s": load_seconds,
+        "rss_mb": rss_after - rss_before,
+        "chunks_per_s": len(chunks) / encode_seconds,
+        "query_ms": statistics.median(latencies) * 1000,
+        "chunks": _normalize(chunk_vectors),
+        "queries": _normalize(np.asarray(query_vectors, dtype=np.float32)),
+    }
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def top_k(queries, chunks, k):
+    return [set(row) for row in np.argsort(-(queries @ chunks.T), axis=1)[:, :k]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare ONNX embedding backends against the fp32 reference")
+    parser.add_argument("--data-dir", default=None, help="directory with the PDFs (default: INGEST_DATA_DIR)")
+    parser.add_argument("--model", default=None, help="reference model (default: EMBEDDING_MODEL)")
+    parser.add_argument("--onnx-dir", default=None, help="exported model directory (default: ONNX_MODEL_DIR)")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--min-recall", type=float, default=0.9)
+    parser.add_argument("--max-chunks", type=int, default=None)
+    args = parser.parse_args()
+
+    from app.rag.ingest import INGEST_DATA_DIR
+    from app.rag.onnx_embeddings import FP32_FILE, INT8_FILE, ONNX_MODEL_DIR, OnnxEmbeddings
+    from app.rag.preprocessor import load_and_split_pdf
+    from app.rag.registry import EMBEDDING_MODEL
+    from app.rag.vector_store import create_embeddings
+
+    onnx_dir = args.onnx_dir or ONNX_MODEL_DIR
+    chunks = [d.page_content for d in load_and_split_pdf(args.data_dir or INGEST_DATA_DIR)]
+    chunks = chunks[:args.max_chunks] if args.max_chunks else chunks
+    print(f"📄 {len(chunks)} chunks, {len(QUESTIONS)} questions, k={args.k}")
+
+    reference = measure("torch-fp32", lambda: create_embeddings(args.model or EMBEDDING_MODEL, backend="huggingface"), chunks)
+    variants = [
+        (name, quantized)
+        for name, quantized, filename in (("onnx-fp32", False, FP32_FILE), ("onnx-int8", True, INT8_FILE))
+        if os.path.exists(os.path.join(onnx_dir, filename))
+    ]
+    if not variants:
+        sys.exit(f"❌ Không có model ONNX trong {onnx_dir}; chạy `python -m app.rag.onnx_embeddings --quantize` trước.")
+    results = [
+        measure(name, lambda quantized=quantized: OnnxEmbeddings(onnx_dir, quantized=quantized), chunks)
+        for name, quantized in variants
+    ]
+
+    expected = top_k(reference["queries"], reference["chunks"], args.k)
+    failed = False
+    print(f"{'backend':<12}{'cos mean':>9}{'cos min':>9}{f'recall@{args.k}':>10}{'load s':>8}"
+          f"{'chunks/s':>10}{'query ms':>10}{'+RSS MB':>9}")
+    for r in [reference] + results:
+        cosines = np.sum(r["chunks"] * reference["chunks"], axis=1)
+        found = top_k(r["queries"], r["chunks"], args.k)
+        recall = float(np.mean([len(a & b) / args.k for a, b in zip(found, expected)]))
+        failed |= recall < args.min_recall
+        print(f"{r['name']:<12}{cosines.mean():>9.4f}{cosines.min():>9.4f}{recall:>10.3f}{r['load_s']:>8.1f}"
+              f"{r['chunks_per_s']:>10.1f}{r['query_ms']:>10.1f}{r['rss_mb']:>9.0f}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
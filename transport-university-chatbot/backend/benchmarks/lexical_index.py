@@ -0,0 +1,55 @@
+"""
+BM25 lexical index benchmark: search latency on a synthetic corpus
+
+Builds an in-memory LexicalIndex from `--docs` short Vietnamese chunks (repeated
+admission / fee / dormitory sentences with a numeric suffix, so terms like
+"học phí" and the major code 7580201 match a large posting list) and reports
+p50/p95/mean search latency over `--queries` searches.
+
+Run:
+    python -m benchmarks.lexical_index --docs 20000 --queries 200
+"""
+import argparse
+import statistics
+import tempfile
+import time
+
+from app.rag.lexical_index import LexicalIndex
+
+SENTENCES = [
+    "Ngành Kỹ thuật xây dựng có mã ngành 7580201, học phí 15 triệu đồng/năm.",
+    "Ký túc xá cơ sở Hà Nội nằm tại phòng A2-301, khu A.",
+    "Hạn nộp hồ sơ xét tuyển là ngày 15/08/2024.",
+    "Sinh viên được hỗ trợ học bổng khuyến khích học tập mỗi học kỳ.",
+]
+QUERIES = ["học phí ngành 7580201", "ký túc xá A2-301", "hạn nộp hồ sơ", "học bổng khuyến khích"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="BM25 lexical index search benchmark")
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=20)
+    args = parser.parse_args()
+
+    index = LexicalIndex(tempfile.mkdtemp(prefix="bench-bm25-"))
+    started = time.perf_counter()
+    index.build((f"d{i}", f"{SENTENCES[i % len(SENTENCES)]} số {i}", {}) for i in range(args.docs))
+    build_seconds = time.perf_counter() - started
+
+    index.search(QUERIES[0], k=args.k)  # warm-up
+    latencies = []
+    for i in range(args.queries):
+        started = time.perf_counter()
+        index.search(QUERIES[i % len(QUERIES)], k=args.k)
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+
+    print(f"docs={args.docs} queries={args.queries} k={args.k} build={build_seconds:.2f}s")
+    print(f"search p50 {latencies[len(latencies) // 2] * 1000:.2f} ms, "
+          f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:.2f} ms, "
+          f"mean {statistics.mean(latencies) * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
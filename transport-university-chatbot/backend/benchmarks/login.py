@@ -0,0 +1,164 @@
+"""
+Login load benchmark: inline bcrypt vs the password hasher process pool
+
+Fires `--requests` logins at /api/auth/login/json with `--concurrency` clients,
+while a probe keeps calling GET /api to show how responsive the rest of the app
+stays during the storm. Two variants of the app are measured:
+
+    inline  the previous handler: sync route, bcrypt in Starlette's threadpool
+    pool    the current async route, bcrypt in app.services.password_hasher
+
+Reports logins/second, login p50/p99, probe p99 and the number of 503 rejections.
+
+Run:
+    python -m benchmarks.login --requests 200 --concurrency 50 --rounds 10
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Login load benchmark")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=10, help="bcrypt cost factor")
+    parser.add_argument("--workers", type=int, default=None, help="PASSWORD_HASH_WORKERS")
+    parser.add_argument("--max-pending", type=int, default=None, help="PASSWORD_HASH_MAX_PENDING")
+    args = parser.parse_args()
+
+    # Must be set before the app modules read their configuration
+    os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+    if args.workers is not None:
+        os.environ["PASSWORD_HASH_WORKERS"] = str(args.workers)
+    if args.max_pending is not None:
+        os.environ["PASSWORD_HASH_MAX_PENDING"] = str(args.max_pending)
+
+    import httpx
+    from fastapi import Depends, FastAPI, HTTPException
+    from sqlalchemy import create_engine
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+    from sqlalchemy.orm import Session, sessionmaker
+
+    from app.database import Base, get_async_db, get_db
+    from app.models import User
+    from app.routes import auth
+    from app.schemas import Token, UserLogin
+    from app.services.auth_service import create_access_token, hash_password, verify_password
+    from app.services.password_hasher import password_hasher
+
+    db_path = os.path.join(tempfile.mkdtemp(), "bench_login.db")
+    engine = create_engine(f"sqlite:///{db_path}", connect_args={"check_same_thread": False})
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    async_session_factory = async_sessionmaker(bind=async_engine, class_=AsyncSession, expire_on_commit=False)
+    Base.metadata.create_all(bind=engine)
+
+    db = session_factory()
+    db.add(User(username="bench", email="bench@example.com", password_hash=hash_password("benchpass123"), is_active=True))
+    db.commit()
+    db.close()
+
+    def override_get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    async def override_get_async_db():
+        async with async_session_factory() as db:
+            yield db
+
+    def build_app(variant: str) -> FastAPI:
+        app = FastAPI()
+
+        @app.get("/api")
+        def api_root():
+            return {"message": "ok"}
+
+        if variant == "inline":
+            @app.post("/api/auth/login/json", response_model=Token)
+            def login_json(user_in: UserLogin, db: Session = Depends(get_db)):
+                user = db.query(User).filter(
+                    (User.username == user_in.username) | (User.email == user_in.username)
+                ).first()
+                if not user or not verify_password(user_in.password, user.password_hash):
+                    raise HTTPException(status_code=401, detail="Invalid username or password")
+                return {"access_token": create_access_token({"sub": str(user.id)}), "token_type": "bearer"}
+        else:
+            app.include_router(auth.router, prefix="/api")
+
+        app.dependency_overrides[get_db] = override_get_db
+        app.dependency_overrides[get_async_db] = override_get_async_db
+        return app
+
+    async def measure(app: FastAPI) -> dict:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            latencies, probe_latencies, statuses = [], [], []
+            remaining = args.requests
+            done = False
+
+            async def worker():
+                nonlocal remaining
+                while remaining > 0:
+                    remaining -= 1
+                    start = time.perf_counter()
+                    response = await client.post(
+                        "/api/auth/login/json", json={"username": "bench", "password": "benchpass123"}
+                    )
+                    latencies.append(time.perf_counter() - start)
+                    statuses.append(response.status_code)
+
+            async def probe():
+                while not done:
+                    start = time.perf_counter()
+                    await client.get("/api")
+                    probe_latencies.append(time.perf_counter() - start)
+                    await asyncio.sleep(0.01)
+
+            probe_task = asyncio.create_task(probe())
+            start = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+            elapsed = time.perf_counter() - start
+            done = True
+            await probe_task
+
+        ok = [lat for lat, code in zip(latencies, statuses) if code == 200]
+        return {
+            "logins_per_s": len(ok) / elapsed,
+            "p50_ms": statistics.median(ok) * 1000 if ok else 0.0,
+            "p99_ms": percentile(ok, 0.99) * 1000,
+            "probe_p99_ms": percentile(probe_latencies, 0.99) * 1000,
+            "rejected": statuses.count(503),
+        }
+
+    async def run_all():
+        password_hasher.start()
+        results = {variant: await measure(build_app(variant)) for variant in ("inline", "pool")}
+        password_hasher.shutdown()
+        await async_engine.dispose()
+        return results
+
+    results = asyncio.run(run_all())
+    print(f"bcrypt rounds={args.rounds} workers={password_hasher.workers} max_pending={password_hasher.max_pending} "
+          f"requests={args.requests} concurrency={args.concurrency}")
+    print(f"{'variant':<8}{'logins/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'probe p99 ms':>14}{'503s':>7}")
+    for variant, r in results.items():
+        print(f"{variant:<8}{r['logins_per_s']:>10.1f}{r['p50_ms']:>10.1f}{r['p99_ms']:>10.1f}"
+              f"{r['probe_p99_ms']:>14.1f}{r['rejected']:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Stub OpenAI Responses API server (POST /v1/responses) for the load test and the
+LLM client tests
+
+Never calls a real model: every request gets one fixed answer, with configurable
+latency and token rate, optionally failing the first requests with 429/503.
+
+Run from the backend directory:
+    python -m benchmarks.stub_llm --port 9000 --latency-ms 200 --tokens-per-second 50
+    LLM_BASE_URL=http://127.0.0.1:9000/v1 uvicorn app.main:app
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from typing import Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+DEFAULT_ANSWER = "Xin chào! Đây là câu trả lời mẫu từ stub LLM dùng để kiểm thử hệ thống."
+
+
+def create_stub_app(
+    answer: str = DEFAULT_ANSWER,
+    latency_ms: float = 0.0,
+    tokens_per_second: Optional[float] = None,
+    fail_first: int = 0,
+    fail_status: int = 429,
+) -> FastAPI:
+    """
+    Build the stub FastAPI app
+    Args:
+        answer: Text returned for every request
+        latency_ms: Delay before the first token / full response
+        tokens_per_second: Streaming rate (None = as fast as possible)
+        fail_first: Number of initial requests answered with fail_status
+        fail_status: HTTP status used for injected failures
+    Returns:
+        FastAPI app exposing POST /v1/responses
+    """
+    app = FastAPI(title="Stub OpenAI Responses API")
+    app.state.requests = 0
+    tokens = [word + " " for word in answer.split(" ")]
+    tokens[-1] = tokens[-1].rstrip()
+
+    def response_body(response_id: str, model: str, text: str, status: str = "completed", input_tokens: int = 0):
+        return {
+            "id": response_id,
+            "object": "response",
+            "created_at": int(time.time()),
+            "model": model,
+            "status": status,
+            "output": [{
+                "type": "message",
+                "id": f"msg_{response_id}",
+                "role": "assistant",
+                "status": status,
+                "content": [{"type": "output_text", "text": text, "annotations": []}],
+            }],
+            "parallel_tool_calls": False,
+            "tool_choice": "auto",
+            "tools": [],
+            "usage": {
+                "input_tokens": input_tokens,
+                "output_tokens": len(tokens),
+                "total_tokens": input_tokens + len(tokens),
+                "input_tokens_details": {"cached_tokens": 0},
+                "output_tokens_details": {"reasoning_tokens": 0},
+            },
+        }
+
+    @app.post("/v1/responses")
+    async def create_response(request: Request):
+        app.state.requests += 1
+        if app.state.requests <= fail_first:
+            return JSONResponse(
+                status_code=fail_status,
+                content={"error": {"message": "injected failure", "type": "stub_error"}},
+            )
+
+        body = await request.json()
+        model = body.get("model", "stub-model")
+        # Rough prompt token estimate (~4 characters per token)
+        input_tokens = len(str(body.get("input", ""))) // 4
+        response_id = f"resp_{uuid.uuid4().hex}"
+        if latency_ms:
+            await asyncio.sleep(latency_ms / 1000)
+
+        if not body.get("stream"):
+            if tokens_per_second:
+                # Non-streaming: respond once every token has been "generated"
+                await asyncio.sleep(len(tokens) / tokens_per_second)
+            return response_body(response_id, model, answer, input_tokens=input_tokens)
+
+        async def events():
+            sequence = 0
+
+            def sse(event_type, data):
+                nonlocal sequence
+                data = {"type": event_type, "sequence_number": sequence, **data}
+                sequence += 1
+                return f"event: {event_type}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+            yield sse("response.created", {"response": response_body(response_id, model, "", "in_progress")})
+            for token in tokens:
+                if tokens_per_second:
+                    await asyncio.sleep(1 / tokens_per_second)
+                yield sse("response.output_text.delta", {
+                    "item_id": f"msg_{response_id}",
+                    "output_index": 0,
+                    "content_index": 0,
+                    "delta": token,
+                    "logprobs": [],
+                })
+            yield sse("response.completed", {"response": response_body(response_id, model, answer, input_tokens=input_tokens)})
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Stub OpenAI Responses API server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--tokens-per-second", type=float, default=None)
+    args = parser.parse_args()
+
+    app = create_stub_app(latency_ms=args.latency_ms, tokens_per_second=args.tokens_per_second)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+"""Shared SQLite database for the tests that work on the ORM tables directly."""
+
+import os
+import tempfile
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+
+DB_PATH = os.path.join(tempfile.mkdtemp(), "test.db")
+engine = create_engine(f"sqlite:///{DB_PATH}", connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture
+def tables():
+    """Create all tables for one test and drop them afterwards."""
+    Base.metadata.create_all(bind=engine)
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+
+@pytest.fixture
+def db(tables):
+    """Session on the shared test database."""
+    session = TestingSessionLocal()
+    yield session
+    session.close()
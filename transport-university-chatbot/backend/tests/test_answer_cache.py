@@ -0,0 +1,87 @@
+"""Tests for the RAG answer cache."""
+
+import numpy as np
+
+from app.rag.answer_cache import AnswerCache, normalize_question, question_codes
+
+
+def fake_embed(text):
+    """Embed by the set of normalized words, so word order does not matter."""
+    vector = np.zeros(32, dtype=np.float32)
+    for word in normalize_question(text).split():
+        vector[sum(map(ord, word)) % 32] += 1.0
+    return vector
+
+
+def test_normalize_question():
+    """Test case, punctuation and whitespace are normalized but diacritics are kept."""
+    assert normalize_question("  Học phí   ĐẠI HỌC bao nhiêu? ") == "học phí đại học bao nhiêu"
+    # NFD input (e.g. macOS keyboards) maps to the same key
+    assert normalize_question("Ho\u0323c phi\u0301") == "học phí"
+    assert normalize_question("ba") != normalize_question("bà") != normalize_question("bá")
+
+
+def test_exact_tier_keeps_diacritics():
+    """Test words that differ only by a diacritic do not share an exact entry."""
+    cache = AnswerCache(semantic_threshold=None)
+    cache.store("Điểm chuẩn ngành ba?", "24")
+    assert cache.lookup("điểm chuẩn ngành ba").answer == "24"
+    assert cache.lookup("Điểm chuẩn ngành bà?").answer is None
+
+
+def test_exact_hit_and_stats():
+    """Test exact-tier hits and hit/miss counters."""
+    cache = AnswerCache(semantic_threshold=None)
+    assert cache.lookup("Học phí?").answer is None
+    cache.store("Học phí?", "10 triệu")
+    lookup = cache.lookup("học phí")
+    assert lookup.answer == "10 triệu"
+    assert lookup.tier == "exact"
+    stats = cache.stats()
+    assert stats["exact_hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["llm_calls_saved"] == 1
+
+
+def test_semantic_hit_within_threshold():
+    """Test a reworded question is served from the semantic tier."""
+    cache = AnswerCache(semantic_threshold=0.9, embed_fn=fake_embed)
+    cache.store("học phí bao nhiêu", "10 triệu")
+    lookup = cache.lookup("bao nhiêu học phí")
+    assert lookup.answer == "10 triệu"
+    assert lookup.tier == "semantic"
+    assert cache.lookup("ký túc xá ở đâu").answer is None
+
+
+def test_semantic_tier_requires_same_numbers_and_codes():
+    """Test a near-identical question with a different year or code is not served from cache."""
+    assert question_codes("Học phí K65 năm 2024 ngành CNTT?") == {"k65", "2024", "cntt"}
+    cache = AnswerCache(semantic_threshold=0.5, embed_fn=fake_embed)
+    cache.store("học phí năm 2023 bao nhiêu", "10 triệu")
+    assert cache.lookup("học phí năm 2024 bao nhiêu").answer is None
+    assert cache.lookup("năm 2023 học phí bao nhiêu").tier == "semantic"
+    # The nearest entry has other codes: fall through to the next match above the threshold
+    cache.store("học phí năm 2024 là bao nhiêu", "12 triệu")
+    assert cache.lookup("học phí năm 2024 bao nhiêu").answer == "12 triệu"
+
+
+def test_ttl_and_lru_eviction():
+    """Test entries expire after the TTL and the LRU bound is enforced."""
+    cache = AnswerCache(maxsize=2, ttl=60, semantic_threshold=None)
+    now = [0.0]
+    cache._entries._clock = lambda: now[0]
+    cache.store("a", "1")
+    cache.store("b", "2")
+    cache.store("c", "3")
+    assert cache.lookup("a").answer is None
+    now[0] = 61.0
+    assert cache.lookup("c").answer is None
+
+
+def test_invalidate_clears_everything():
+    """Test invalidation (vector index rebuild) empties the cache."""
+    cache = AnswerCache(semantic_threshold=0.9, embed_fn=fake_embed)
+    cache.store("học phí", "10 triệu")
+    cache.invalidate()
+    assert cache.lookup("học phí").answer is None
+    assert cache.stats()["invalidations"] == 1
@@ -1,27 +1,35 @@
 """Tests for authentication endpoints."""
 
+import os
+import tempfile
+
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 
 from app.main import app
-from app.database import Base, get_db
+from app.database import Base, get_db, get_async_db
 from app.models import User
 from app.services.auth_service import hash_password
 
-from sqlalchemy.pool import StaticPool
-
-# Use in-memory SQLite for testing
-SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+# File-based SQLite so the sync engine (fixtures, /me) and the async engine
+# (register/login) see the same data
+DB_PATH = os.path.join(tempfile.mkdtemp(), "test_auth.db")
+SQLALCHEMY_DATABASE_URL = f"sqlite:///{DB_PATH}"
 
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL, 
     connect_args={"check_same_thread": False},
-    poolclass=StaticPool
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# NullPool: TestClient may run each request on a new event loop
+async_engine = create_async_engine(f"sqlite+aiosqlite:///{DB_PATH}", poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(bind=async_engine, class_=AsyncSession, expire_on_commit=False)
+
 Base.metadata.create_all(bind=engine)
 
 
@@ -33,6 +41,11 @@ def override_get_db():
         db.close()
 
 
+async def override_get_async_db():
+    async with TestingAsyncSessionLocal() as db:
+        yield db
+
+
 client = TestClient(app)
 
 
@@ -44,6 +57,7 @@ def setup_teardown():
     """Setup and teardown for each test."""
     # Setup: override dependency and create tables
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
     Base.metadata.create_all(bind=engine)
     yield
     # Teardown: remove override and drop tables
@@ -183,3 +197,82 @@ def test_health_check():
     response = client.get("/api")
     assert response.status_code == 200
     assert response.json() == {"message": "✅ API is running successfully."}
+
+
+def test_login_rehashes_outdated_hash():
+    """Test a hash with an old cost factor is upgraded on successful login."""
+    from passlib.context import CryptContext
+    from app.services.password_hasher import BCRYPT_ROUNDS
+
+    old_hash = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash("testpass123")
+    db = TestingSessionLocal()
+    db.add(User(username="olduser", email="old@example.com", password_hash=old_hash, is_active=True))
+    db.commit()
+    db.close()
+
+    response = client.post("/api/auth/login", data={"username": "olduser", "password": "testpass123"})
+    assert response.status_code == 200
+
+    db = TestingSessionLocal()
+    user = db.query(User).filter(User.username == "olduser").first()
+    db.close()
+    assert user.password_hash != old_hash
+    assert user.password_hash.split("$")[2] == f"{BCRYPT_ROUNDS:02d}"
+
+
+def test_login_rejected_when_hasher_busy():
+    """Test logins fail fast with 503 when the hashing backlog is full."""
+    from unittest.mock import patch
+    from app.services.password_hasher import password_hasher
+
+    db = TestingSessionLocal()
+    db.add(User(username="busyuser", email="busy@example.com", password_hash=hash_password("testpass123"), is_active=True))
+    db.commit()
+    db.close()
+
+    with patch.object(password_hasher, "max_pending", 0):
+        response = client.post("/api/auth/login", data={"username": "busyuser", "password": "testpass123"})
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+
+
+def test_login_releases_the_connection_while_hashing():
+    """Test no transaction (pooled connection) is held during the bcrypt check."""
+    import asyncio
+    from unittest.mock import patch
+    from app.services.auth_service import verify_user_credentials_async
+    from app.services.password_hasher import password_hasher
+
+    db = TestingSessionLocal()
+    db.add(User(username="pooluser", email="pool@example.com", password_hash=hash_password("testpass123"), is_active=True))
+    db.commit()
+    db.close()
+
+    async def run():
+        async with TestingAsyncSessionLocal() as session:
+            seen = []
+            verify = password_hasher.verify_and_update
+
+            async def checking_verify(password, hashed_password):
+                seen.append(session.in_transaction())
+                return await verify(password, hashed_password)
+
+            with patch.object(password_hasher, "verify_and_update", checking_verify):
+                user = await verify_user_credentials_async(session, "pooluser", "testpass123")
+            return user, seen
+
+    user, seen = asyncio.run(run())
+    assert user is not None and user.username == "pooluser"
+    assert seen == [False]
+
+
+def test_start_warms_up_every_worker():
+    """Test start() spawns all hashing processes instead of waiting for the first logins."""
+    from app.services.password_hasher import PasswordHasher
+
+    hasher = PasswordHasher(workers=2)
+    hasher.start()
+    try:
+        assert len(hasher._executor._processes) == 2
+    finally:
+        hasher.shutdown()
@@ -0,0 +1,98 @@
+"""Tests for the JWT claims cache and user snapshot cache."""
+
+from datetime import timedelta
+from unittest.mock import patch
+
+import pytest
+from jose import JWTError
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.database import Base
+from app.models import User
+from app.services import auth_cache
+from app.services.auth_service import create_access_token, decode_access_token
+
+engine = create_engine(
+    "sqlite:///:memory:",
+    connect_args={"check_same_thread": False},
+    poolclass=StaticPool
+)
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture(autouse=True)
+def setup_teardown():
+    Base.metadata.create_all(bind=engine)
+    auth_cache.clear_auth_cache()
+    yield
+    auth_cache.clear_auth_cache()
+    Base.metadata.drop_all(bind=engine)
+
+
+@pytest.fixture
+def user():
+    db = TestingSessionLocal()
+    user = User(username="cacheuser", email="cache@example.com", password_hash="x", is_active=True)
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    db.close()
+    return user
+
+
+def test_token_claims_are_cached():
+    """Test a token is only decoded once while cached."""
+    token = create_access_token({"sub": "abc"})
+    with patch("app.services.auth_cache.decode_access_token", wraps=decode_access_token) as decode:
+        assert auth_cache.get_token_claims(token)["sub"] == "abc"
+        assert auth_cache.get_token_claims(token)["sub"] == "abc"
+    assert decode.call_count == 1
+
+
+def test_invalid_token_is_not_cached():
+    """Test invalid or expired tokens still raise."""
+    expired = create_access_token({"sub": "abc"}, expires_delta=timedelta(seconds=-1))
+    with pytest.raises(JWTError):
+        auth_cache.get_token_claims(expired)
+    with pytest.raises(JWTError):
+        auth_cache.get_token_claims("not-a-token")
+
+
+def test_user_snapshot_is_cached(user):
+    """Test the users table is queried only on a cache miss."""
+    calls = []
+
+    def session_factory():
+        calls.append(1)
+        return TestingSessionLocal()
+
+    snapshot = auth_cache.get_user_snapshot(user.id, session_factory)
+    assert snapshot.username == "cacheuser"
+    assert snapshot.is_admin is False
+    assert auth_cache.get_user_snapshot(user.id, session_factory) is snapshot
+    assert len(calls) == 1
+
+
+def test_orm_update_invalidates_snapshot(user):
+    """Test promoting or deactivating a user through the ORM drops the snapshot."""
+    auth_cache.get_user_snapshot(user.id, TestingSessionLocal)
+
+    db = TestingSessionLocal()
+    db_user = db.query(User).filter(User.id == user.id).first()
+    db_user.is_admin = True
+    db_user.is_active = False
+    db.commit()
+    db.close()
+
+    snapshot = auth_cache.get_user_snapshot(user.id, TestingSessionLocal)
+    assert snapshot.is_admin is True
+    assert snapshot.is_active is False
+
+
+def test_explicit_invalidation(user):
+    """Test invalidate_user forces a reload."""
+    first = auth_cache.get_user_snapshot(user.id, TestingSessionLocal)
+    auth_cache.invalidate_user(user.id)
+    assert auth_cache.get_user_snapshot(user.id, TestingSessionLocal) is not first
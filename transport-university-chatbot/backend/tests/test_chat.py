@@ -1,38 +1,39 @@
 """Tests for chat endpoints."""
 
-import sys
-from unittest.mock import MagicMock, patch
+import json
+import os
+import tempfile
+from unittest.mock import AsyncMock, patch
 import pytest
 from fastapi.testclient import TestClient
+from langchain_core.documents import Document
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
-
-# Mock RAG modules BEFORE importing app/routes
-mock_retriever = MagicMock()
-mock_retriever.retrieve_context.return_value = "Mock Context"
-mock_generator = MagicMock()
-mock_generator.generate_answer.return_value = "Mock Answer"
-
-sys.modules["rag"] = MagicMock()
-sys.modules["rag.retriever"] = mock_retriever
-sys.modules["rag.generator"] = mock_generator
+from sqlalchemy.pool import NullPool
 
 from app.main import app
-from app.database import Base, get_db
+from app.database import Base, get_db, get_async_db
 from app.models import User
+from app.rag.answer_cache import AnswerCache
 from app.services.auth_service import create_access_token
+from app.services.chat_service import chat_count_cache
 
-# Use in-memory SQLite with StaticPool to share data across sessions
-SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
+# File-based SQLite so the sync engine (middleware, fixtures) and the async
+# engine (chat routes) see the same data
+DB_PATH = os.path.join(tempfile.mkdtemp(), "test_chat.db")
+SQLALCHEMY_DATABASE_URL = f"sqlite:///{DB_PATH}"
 
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
     connect_args={"check_same_thread": False},
-    poolclass=StaticPool
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# NullPool: TestClient may run each request on a new event loop
+async_engine = create_async_engine(f"sqlite+aiosqlite:///{DB_PATH}", poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(bind=async_engine, class_=AsyncSession, expire_on_commit=False)
+
 def override_get_db():
     try:
         db = TestingSessionLocal()
@@ -40,6 +41,10 @@ def override_get_db():
     finally:
         db.close()
 
+async def override_get_async_db():
+    async with TestingAsyncSessionLocal() as db:
+        yield db
+
 
 
 
@@ -50,7 +55,9 @@ def setup_teardown():
     """Setup and teardown for each test."""
     # Setup overrides
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
     Base.metadata.create_all(bind=engine)
+    chat_count_cache.clear()
     yield
     # Cleanup overrides
     app.dependency_overrides = {}
@@ -63,6 +70,23 @@ def patch_middleware_db():
     with patch("app.middleware.auth_middleware.SessionLocal", side_effect=TestingSessionLocal):
         yield
 
+# Mock the RAG pipeline (retrieval + LLM) and start each test with an empty answer cache
+@pytest.fixture(autouse=True)
+def mock_rag():
+    mock_doc = Document(page_content="Mock Context", metadata={"source": "Data_UTC.pdf", "page": 1})
+
+    async def mock_stream(question, context, history=""):
+        for delta in ["Mock ", "Answer"]:
+            yield delta
+
+    with patch("app.rag.pipeline.aretrieve_documents", AsyncMock(return_value=[mock_doc])), \
+         patch("app.rag.pipeline.agenerate_answer", AsyncMock(return_value="Mock Answer")) as generate, \
+         patch("app.rag.pipeline.astream_answer", mock_stream), \
+         patch("app.rag.pipeline.answer_cache", AnswerCache(semantic_threshold=None)), \
+         patch("app.rag.pipeline.acondense_question", AsyncMock(side_effect=lambda question, conversation: question)), \
+         patch("app.rag.memory.asummarize", AsyncMock(return_value="Tóm tắt")):
+        yield generate
+
 @pytest.fixture
 def test_user():
     """Create a test user."""
@@ -173,7 +197,113 @@ def test_get_history_pagination(auth_token):
     data = response.json()
     assert len(data["items"]) == 5
 
+def test_get_history_cursor_pagination(auth_token):
+    """Test keyset pagination walks every message exactly once."""
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    for i in range(7):
+        client.post("/api/chat/send", json={"message": f"Message {i}"}, headers=headers)
+
+    seen, cursor = [], None
+    while True:
+        url = "/api/chat/history?limit=3&include_total=false"
+        if cursor:
+            url += f"&cursor={cursor}"
+        data = client.get(url, headers=headers).json()
+        assert data["total"] is None
+        seen.extend(item["message"] for item in data["items"])
+        cursor = data["next_cursor"]
+        if not cursor:
+            break
+
+    assert seen == [f"Message {i}" for i in reversed(range(7))]
+
+
+def test_get_history_invalid_cursor(auth_token):
+    """Test a malformed cursor is rejected."""
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    response = client.get("/api/chat/history?cursor=not-a-cursor", headers=headers)
+    assert response.status_code == 400
+    response = client.get("/api/chat/history?cursor=abc&offset=5", headers=headers)
+    assert response.status_code == 400
+
+
+def test_history_total_tracks_inserts_and_deletes(auth_token):
+    """Test the cached total is maintained on insert and delete."""
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    assert client.get("/api/chat/history", headers=headers).json()["total"] == 0
+
+    ids = [
+        client.post("/api/chat/send", json={"message": f"Message {i}"}, headers=headers).json()["id"]
+        for i in range(3)
+    ]
+    assert client.get("/api/chat/history", headers=headers).json()["total"] == 3
+
+    client.delete(f"/api/chat/history/{ids[0]}", headers=headers)
+    assert client.get("/api/chat/history", headers=headers).json()["total"] == 2
+
+
+def test_follow_up_question_sees_previous_turns(auth_token, mock_rag):
+    """Test the previous turn reaches both query condensation and the prompt."""
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    client.post("/api/chat/send", json={"message": "Học phí ngành xây dựng?"}, headers=headers)
+    client.post("/api/chat/send", json={"message": "Còn ký túc xá thì sao?"}, headers=headers)
+
+    question, context, history = mock_rag.call_args.args
+    assert question == "Còn ký túc xá thì sao?"
+    assert "Học phí ngành xây dựng?" in history
+    assert "Mock Answer" in history
+
+
 def test_get_history_unauthenticated():
     """Test get history without authentication."""
     response = client.get("/api/chat/history")
     assert response.status_code == 401
+
+def test_send_message_uses_answer_cache(auth_token, mock_rag):
+    """Test a repeated (normalized) question is answered from the cache."""
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    client.post("/api/chat/send", json={"message": "Học phí bao nhiêu?"}, headers=headers)
+    response = client.post("/api/chat/send", json={"message": "học phí  BAO NHIÊU"}, headers=headers)
+    assert response.status_code == 201
+    assert response.json()["response"] == "Mock Answer"
+    assert mock_rag.call_count == 1
+
+def parse_sse(body):
+    """Split an SSE body into (event, data) pairs."""
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+def test_send_message_stream(auth_token):
+    """Test the SSE endpoint streams context, tokens, then the saved entry."""
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    with client.stream("POST", "/api/chat/send/stream", json={"message": "Hello bot"}, headers=headers) as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = parse_sse(response.read().decode("utf-8"))
+
+    assert [e for e, _ in events] == ["context", "token", "token", "done"]
+    assert events[0][1]["sources"] == [{"source": "Data_UTC.pdf", "page": 1}]
+    assert "".join(d["text"] for e, d in events if e == "token") == "Mock Answer"
+    assert events[-1][1]["response"] == "Mock Answer"
+
+    history = client.get("/api/chat/history", headers=headers).json()
+    assert history["total"] == 1
+    assert history["items"][0]["response"] == "Mock Answer"
+
+def test_send_message_stream_unauthenticated():
+    """Test the SSE endpoint requires authentication."""
+    response = client.post("/api/chat/send/stream", json={"message": "Hello bot"})
+    assert response.status_code == 401
+
+def test_delete_message(auth_token):
+    """Test deleting an owned chat message."""
+    headers = {"Authorization": f"Bearer {auth_token}"}
+    chat_id = client.post("/api/chat/send", json={"message": "Hello bot"}, headers=headers).json()["id"]
+
+    response = client.delete(f"/api/chat/history/{chat_id}", headers=headers)
+    assert response.status_code == 204
+    response = client.delete(f"/api/chat/history/{chat_id}", headers=headers)
+    assert response.status_code == 404
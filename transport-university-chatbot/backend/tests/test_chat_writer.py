@@ -0,0 +1,187 @@
+"""Tests for the write-behind chat persister."""
+
+import asyncio
+
+import pytest
+from sqlalchemy import exc
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app.models import ChatHistory, User
+from app.services.chat_service import chat_count_cache, get_chat_history_async
+from app.services.chat_writer import ChatWriter
+from app.services.stats_service import dashboard_cache, get_dashboard_stats
+
+from .conftest import DB_PATH, TestingSessionLocal
+
+
+@pytest.fixture(autouse=True)
+def setup_teardown(tables):
+    """Fresh tables and empty count / dashboard caches for each test."""
+    chat_count_cache.clear()
+    dashboard_cache.clear()
+
+
+@pytest.fixture
+def user():
+    """A committed user to attach chat rows to."""
+    db = TestingSessionLocal()
+    user = User(username="writer_user", email="writer@example.com", password_hash="x", is_active=True)
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    db.close()
+    return user
+
+
+def run_with_writer(scenario, **kwargs):
+    """Run scenario(writer, session_factory) against a started writer on a fresh event loop."""
+    async def main():
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{DB_PATH}", poolclass=NullPool)
+        session_factory = async_sessionmaker(bind=async_engine, class_=AsyncSession, expire_on_commit=False)
+        writer = ChatWriter(session_factory=session_factory, **kwargs)
+        await writer.start()
+        try:
+            return await scenario(writer, session_factory)
+        finally:
+            await writer.stop()
+            await async_engine.dispose()
+
+    return asyncio.run(main())
+
+
+def test_rows_are_written_in_batches(user):
+    """Test queued rows share one batch and update the rollups."""
+    async def scenario(writer, session_factory):
+        entries = [await writer.submit(user.id, f"Câu hỏi {i}?", "answer") for i in range(5)]
+        await writer.submit(user.id, "reply", "x", role="assistant")
+        return entries, writer
+
+    entries, writer = run_with_writer(scenario, flush_interval=0.05)
+    assert all(entry.id is not None for entry in entries)
+    assert writer.written == 6
+    assert writer.batches == 1
+
+    db = TestingSessionLocal()
+    ids = {row.id for row in db.query(ChatHistory)}
+    assert {entry.id for entry in entries} <= ids
+    # Rollups are maintained in the same transaction
+    assert get_dashboard_stats(db, "all", use_cache=False)["total_questions"] == 5
+    db.close()
+
+
+def test_history_reads_wait_for_queued_rows(user):
+    """Test a history read waits for the user's queued rows."""
+    async def scenario(writer, session_factory):
+        entry = await writer.submit(user.id, "Học phí?", "answer")
+        await writer.wait_for_user(user.id)
+        async with session_factory() as db:
+            history = await get_chat_history_async(db, user.id)
+        return entry, history
+
+    entry, history = run_with_writer(scenario, flush_interval=0.2)
+    assert [chat.id for chat in history] == [entry.id]
+
+
+def test_stop_flushes_pending_rows(user):
+    """Test stopping the writer flushes rows still in the queue."""
+    async def scenario(writer, session_factory):
+        for i in range(3):
+            await writer.submit(user.id, f"q{i}", "a")
+        return writer
+
+    writer = run_with_writer(scenario, flush_interval=10)
+    assert writer.written == 3
+    db = TestingSessionLocal()
+    assert db.query(ChatHistory).count() == 3
+    db.close()
+
+
+def test_full_queue_applies_backpressure(user):
+    """Test a full queue makes submit give up so the caller saves inline."""
+    async def scenario(writer, session_factory):
+        gate = asyncio.Event()
+
+        class BlockedSession:
+            """Session factory whose first write waits until the gate opens."""
+
+            async def __aenter__(self):
+                await gate.wait()
+                self.session = session_factory()
+                return await self.session.__aenter__()
+
+            async def __aexit__(self, *exc):
+                return await self.session.__aexit__(*exc)
+
+        writer._session_factory = BlockedSession
+        first = await writer.submit(user.id, "q1", "a")
+        await asyncio.sleep(0)  # the flush task takes q1 and blocks on the gate
+        second = await writer.submit(user.id, "q2", "a")  # fills the queue (size 1)
+        third = await writer.submit(user.id, "q3", "a")  # times out: caller saves inline
+        gate.set()
+        return first, second, third, writer
+
+    first, second, third, writer = run_with_writer(scenario, queue_size=1, flush_interval=0, enqueue_timeout=0.05)
+    assert first is not None and second is not None
+    assert third is None
+    assert writer.rejected == 1
+    assert writer.written == 2
+
+
+def test_bad_row_does_not_drop_the_batch(user):
+    """Test a constraint error only fails the offending row."""
+    async def scenario(writer, session_factory):
+        await writer.submit(user.id, "good 1", "a")
+        await writer.submit(user.id, None, "a")  # violates NOT NULL on message
+        await writer.submit(user.id, "good 2", "a")
+        return writer
+
+    writer = run_with_writer(scenario, flush_interval=0.05)
+    assert writer.written == 2
+    assert writer.failed == 1
+    db = TestingSessionLocal()
+    assert sorted(row.message for row in db.query(ChatHistory)) == ["good 1", "good 2"]
+    db.close()
+
+
+def test_submit_returns_none_when_not_running(user):
+    """Test submit falls back to the caller when the writer is stopped."""
+    assert asyncio.run(ChatWriter().submit(user.id, "q", "a")) is None
+
+
+def test_connection_error_keeps_the_batch(user):
+    """Test a lost connection retries the whole batch after a backoff instead of splitting it."""
+    async def scenario(writer, session_factory):
+        attempts = []
+
+        def flaky_session():
+            attempts.append(None)
+            if len(attempts) == 1:
+                raise exc.OperationalError("INSERT INTO chat_history", {}, ConnectionResetError("connection reset"))
+            return session_factory()
+
+        writer._session_factory = flaky_session
+        for i in range(3):
+            await writer.submit(user.id, f"q{i}", "a")
+        return writer, attempts
+
+    writer, attempts = run_with_writer(scenario, flush_interval=0.05, retry_backoff=0.01)
+    assert len(attempts) == 2
+    assert writer.retries == 1
+    assert writer.batches == 1 and writer.written == 3
+    assert writer.failed == 0
+
+
+def test_retries_are_bounded(user):
+    """Test a batch is given up after the configured number of retries."""
+    async def scenario(writer, session_factory):
+        def down():
+            raise exc.OperationalError("INSERT INTO chat_history", {}, ConnectionRefusedError("database is down"))
+
+        writer._session_factory = down
+        await writer.submit(user.id, "q", "a")
+        return writer
+
+    writer = run_with_writer(scenario, flush_interval=0, retry_attempts=2, retry_backoff=0.01)
+    assert writer.retries == 2
+    assert writer.failed == 1 and writer.written == 0
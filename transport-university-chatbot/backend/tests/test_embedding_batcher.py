@@ -0,0 +1,94 @@
+"""Tests for the micro-batching embedding scheduler."""
+
+import asyncio
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from app.rag import embedding_batcher
+from app.rag.embedding_batcher import EmbeddingBatcher, aembed_query
+from app.rag.embedding_cache import CachedEmbeddings, EmbeddingCache
+
+
+class BatchRecorder:
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, texts):
+        self.batches.append(list(texts))
+        return [[float(len(t)), 1.0] for t in texts]
+
+
+async def run_inline(func, *args):
+    return func(*args)
+
+
+def test_concurrent_requests_share_one_batch():
+    """Test requests arriving within the window are encoded together, duplicates once."""
+    recorder = BatchRecorder()
+
+    async def scenario():
+        batcher = EmbeddingBatcher(recorder, max_batch_size=32, max_wait_ms=5, run=run_inline)
+        results = await asyncio.gather(*(batcher.embed(t) for t in ["a", "bb", "a", "ccc"]))
+        return batcher, results
+
+    batcher, results = asyncio.run(scenario())
+    assert recorder.batches == [["a", "bb", "ccc"]]
+    assert results == [[1.0, 1.0], [2.0, 1.0], [1.0, 1.0], [3.0, 1.0]]
+    assert batcher.stats()["avg_batch_size"] == 4
+
+
+def test_full_batch_flushes_without_waiting():
+    """Test max_batch_size splits the work and flushes immediately."""
+    recorder = BatchRecorder()
+
+    async def scenario():
+        # A one-minute window would time out the test if size-based flushing did not work
+        batcher = EmbeddingBatcher(recorder, max_batch_size=2, max_wait_ms=60000, run=run_inline)
+        return await asyncio.wait_for(
+            asyncio.gather(*(batcher.embed(t) for t in ["a", "b", "c", "d"])), timeout=5
+        )
+
+    asyncio.run(scenario())
+    assert recorder.batches == [["a", "b"], ["c", "d"]]
+
+
+def test_encode_error_reaches_every_caller():
+    """Test a failed batch raises in each waiting request."""
+    def failing(texts):
+        raise RuntimeError("model crashed")
+
+    async def scenario():
+        batcher = EmbeddingBatcher(failing, max_wait_ms=1, run=run_inline)
+        return await asyncio.gather(batcher.embed("a"), batcher.embed("b"), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+def test_aembed_query_uses_cache_before_batching():
+    """Test cached questions skip the batcher and misses encode the original text under the normalized key."""
+    recorder = BatchRecorder()
+
+    class Model:
+        def embed_documents(self, texts):
+            return recorder(texts)
+
+        def embed_query(self, text):
+            raise AssertionError("single-query encode should not be used")
+
+    embeddings = CachedEmbeddings(Model(), EmbeddingCache(maxsize=10))
+
+    async def scenario():
+        first = await aembed_query("  Học phí ")
+        second = await aembed_query("học phí")
+        return first, second
+
+    with patch("app.rag.registry.registry.get_embeddings", return_value=embeddings), \
+         patch.object(embedding_batcher, "run_cpu_bound", run_inline):
+        first, second = asyncio.run(scenario())
+
+    assert recorder.batches == [["  Học phí "]]
+    assert first == second == pytest.approx([10.0, 1.0])  # len("  Học phí ")
+    assert embeddings.cache.get("HỌC PHÍ").dtype == np.float16
@@ -0,0 +1,76 @@
+"""Tests for the query embedding cache."""
+
+import numpy as np
+
+from app.rag.embedding_cache import CachedEmbeddings, EmbeddingCache, normalize_query
+
+
+class CountingEmbeddings:
+    def __init__(self, dim=8):
+        self.dim = dim
+        self.queries = []
+
+    def embed_query(self, text):
+        self.queries.append(text)
+        rng = np.random.default_rng(sum(map(ord, text)))
+        return rng.standard_normal(self.dim).tolist()
+
+    def embed_documents(self, texts):
+        return [self.embed_query(t) for t in texts]
+
+
+def test_normalize_query_keeps_diacritics():
+    """Test case and whitespace are folded but Vietnamese diacritics are kept."""
+    assert normalize_query("  Học   PHÍ bao nhiêu? ") == "học phí bao nhiêu?"
+    assert normalize_query("hoc phi") != normalize_query("học phí")
+
+
+def test_repeated_queries_hit_memory_tier():
+    """Test near-identical repeats are served without re-encoding, as float16."""
+    model = CountingEmbeddings()
+    embeddings = CachedEmbeddings(model, EmbeddingCache(maxsize=10))
+    first = embeddings.embed_query("Học phí bao nhiêu")
+    second = embeddings.embed_query("  học phí   bao nhiêu ")
+    # The model sees the question as typed; the normalized form is only the key
+    assert model.queries == ["Học phí bao nhiêu"]
+    assert first == second
+    assert first == np.float16(CountingEmbeddings().embed_query("Học phí bao nhiêu")).astype(np.float32).tolist()
+    assert embeddings.cache.get("học phí bao nhiêu").dtype == np.float16
+    stats = embeddings.cache.stats()
+    assert stats["memory_hits"] == 2 and stats["misses"] == 1
+    # Ingestion is never cached
+    embeddings.embed_documents(["a", "b"])
+    assert len(model.queries) == 3
+
+
+def test_spill_serves_evicted_entries_and_survives_restart(tmp_path):
+    """Test entries evicted from the LRU come back from the memory-mapped spill, also after reopening."""
+    model = CountingEmbeddings()
+    cache = EmbeddingCache(maxsize=1, spill_dir=str(tmp_path), spill_capacity=4, namespace="m")
+    a = cache.get_or_compute("a", model.embed_query)
+    cache.get_or_compute("b", model.embed_query)
+    assert np.array_equal(cache.get("a"), a)
+    assert cache.stats()["disk_hits"] == 1
+
+    reopened = EmbeddingCache(maxsize=1, spill_dir=str(tmp_path), spill_capacity=4, namespace="m")
+    assert np.array_equal(reopened.get("a"), a)
+    assert len(model.queries) == 2
+
+    # Another model must not reuse the vectors
+    other = EmbeddingCache(maxsize=1, spill_dir=str(tmp_path), spill_capacity=4, namespace="other")
+    assert other.get("a") is None
+
+
+def test_spill_ring_overwrites_oldest(tmp_path):
+    """Test the spill has a fixed capacity and compacts its key log."""
+    model = CountingEmbeddings()
+    cache = EmbeddingCache(maxsize=1, spill_dir=str(tmp_path), spill_capacity=2, namespace="m")
+    for text in ["a", "b", "c", "d", "e", "f"]:
+        cache.get_or_compute(text, model.embed_query)
+    assert cache.stats()["spill_size"] == 2
+
+    reopened = EmbeddingCache(maxsize=1, spill_dir=str(tmp_path), spill_capacity=2, namespace="m")
+    assert reopened.get("a") is None
+    assert reopened.get("f") is not None and reopened.get("e") is not None
+    with open(tmp_path / "keys.log", encoding="utf-8") as f:
+        assert len(f.readlines()) <= 4
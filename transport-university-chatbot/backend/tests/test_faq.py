@@ -0,0 +1,176 @@
+"""Tests for the precomputed FAQ answer store and its warmer."""
+
+import asyncio
+from datetime import timedelta
+from unittest.mock import AsyncMock, patch
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+from app.models import FaqEntry, User
+from app.rag import pipeline
+from app.rag.faq_store import FaqAnswer, FaqStore, index_state, is_stale
+from app.rag.ingest import save_manifest
+from app.rag.faq_warmer import in_quiet_hours, vet_answer, warm_faq
+from app.services.chat_service import save_chat
+
+from .conftest import TestingSessionLocal
+
+ANSWER = "Học phí năm nay dao động từ 10 đến 15 triệu đồng mỗi năm tuỳ ngành."
+AXES = {"học phí": 0, "ký túc xá": 1, "điểm chuẩn": 2}
+
+
+def embed(question):
+    """Unit vector on the axis of the question's topic."""
+    vector = np.zeros(4, dtype=np.float32)
+    vector[next((i for word, i in AXES.items() if word in question.lower()), 3)] = 1.0
+    return vector
+
+
+class FakeRAG:
+    """answer_fn for the warmer: answers from chunk 'c1' unless told otherwise."""
+
+    def __init__(self, answer=ANSWER, chunk_id="c1"):
+        self.answer, self.chunk_id, self.calls = answer, chunk_id, []
+
+    def __call__(self, question):
+        self.calls.append(question)
+        return self.answer, [Document(page_content="ctx", metadata={"id": self.chunk_id, "source": "Data_UTC.pdf", "page": 1})]
+
+
+@pytest.fixture
+def db(tables):
+    """Session with a user who asked two hot questions (one of them twice)."""
+    session = TestingSessionLocal()
+    user = User(username="faq_user", email="faq@example.com", password_hash="x", is_active=True)
+    session.add(user)
+    session.commit()
+    for message in ["Học phí bao nhiêu?", "Học phí bao nhiêu?", "Ký túc xá ở đâu?"]:
+        save_chat(session, user.id, message, "answer")
+    yield session
+    session.close()
+
+
+def warm(rag, **kwargs):
+    """Run the warmer against the test database with fake RAG and embeddings."""
+    kwargs.setdefault("chunk_ids", {"c1", "c2"})
+    return warm_faq(session_factory=TestingSessionLocal, answer_fn=rag, embed_fn=embed, namespace="test-model", window="all", **kwargs)
+
+
+def test_vet_answer_and_quiet_hours():
+    """Test answers are vetted and quiet hours may wrap around midnight."""
+    sources = [{"id": "c1"}]
+    assert vet_answer(ANSWER, sources) is None
+    assert vet_answer("ok", sources) == "too_short"
+    assert vet_answer("Xin lỗi, hiện tại mình chưa có thông tin cụ thể về vấn đề này trong cơ sở dữ liệu.", sources) == "no_information"
+    assert vet_answer(ANSWER, [{"source": "Data_UTC.pdf"}]) == "no_sources"
+    assert in_quiet_hours(3, "1-5") and not in_quiet_hours(12, "1-5")
+    assert in_quiet_hours(23, "22-4") and in_quiet_hours(2, "22-4") and not in_quiet_hours(10, "22-4")
+    assert in_quiet_hours(12, "")
+
+
+def test_warmer_stores_hot_questions_once(db):
+    """Test hot questions are answered once and reused while fresh."""
+    rag = FakeRAG()
+    report = warm(rag)
+    assert report["targets"] == 2
+    assert report["generated"] == 2
+    assert rag.calls == ["Học phí bao nhiêu?", "Ký túc xá ở đâu?"]
+
+    entry = db.query(FaqEntry).filter(FaqEntry.question == "Học phí bao nhiêu?").one()
+    assert entry.answer == ANSWER
+    assert entry.source_ids == ["c1"]
+    assert not entry.stale
+
+    # Nothing changed: no LLM call on the next run
+    report = warm(rag)
+    assert report["fresh"] == 2 and report["generated"] == 0
+    assert len(rag.calls) == 2
+
+
+def test_rejected_answers_are_not_stored(db):
+    """Test answers without information are not stored."""
+    report = warm(FakeRAG(answer="Xin lỗi, hiện tại mình chưa có thông tin cụ thể về vấn đề này."))
+    assert report["rejected"] == 2
+    assert db.query(FaqEntry).count() == 0
+
+
+def test_changed_source_chunks_are_regenerated(db):
+    """Test FAQs whose source chunk changed stop being served and are regenerated."""
+    warm(FakeRAG(chunk_id="c1"))
+    store = FaqStore(reload_seconds=None)
+    assert store.load(TestingSessionLocal, namespace="test-model", chunk_ids={"c1"}) == 2
+    # c1 re-ingested under a new id: workers stop serving the entries right away
+    assert store.load(TestingSessionLocal, namespace="test-model", chunk_ids={"c2"}) == 0
+
+    rag = FakeRAG(chunk_id="c2")
+    report = warm(rag, chunk_ids={"c2"})
+    assert report["marked_stale"] == 2
+    assert report["generated"] == 2
+    assert {e.source_ids[0] for e in db.query(FaqEntry)} == {"c2"}
+    assert store.load(TestingSessionLocal, namespace="test-model", chunk_ids={"c2"}) == 2
+
+
+def test_store_lookup_and_invalidation():
+    """Test exact and semantic lookups and dropping entries by source chunk."""
+    store = FaqStore(semantic_threshold=0.9, reload_seconds=None, embed_fn=embed)
+    assert store.lookup("Học phí bao nhiêu?").answer is None  # empty store: no embedding either
+    store.set_entries({
+        "học phí bao nhiêu": FaqAnswer("Học phí bao nhiêu?", ANSWER, [{"id": "c1"}], embed("học phí")),
+    })
+    assert store.lookup("học phí bao nhiêu").tier == "exact"
+    match = store.lookup("Cho mình hỏi học phí của trường?")
+    assert match.tier == "semantic" and match.sources == [{"id": "c1"}]
+    assert store.lookup("Ký túc xá ở đâu?").answer is None
+    assert store.stats()["semantic_hits"] == 1
+
+    store.invalidate_sources(["c1"])
+    assert len(store) == 0
+
+
+def test_pipeline_serves_faq_without_llm():
+    """Test the pipeline answers a FAQ hit without retrieval or generation."""
+    store = FaqStore(reload_seconds=None, embed_fn=embed)
+    store.set_entries({"học phí": FaqAnswer("Học phí?", ANSWER, [{"id": "c1"}], embed("học phí"))})
+    retrieve, generate = AsyncMock(), AsyncMock()
+
+    async def run():
+        answer = await pipeline.aanswer_question("Học phí?")
+        events = [event async for event in pipeline.astream_answer_events("học phí")]
+        return answer, events
+
+    with patch.object(pipeline, "faq_store", store), \
+         patch.object(pipeline, "aretrieve_documents", retrieve), \
+         patch.object(pipeline, "agenerate_answer", generate):
+        answer, events = asyncio.run(run())
+
+    assert answer == ANSWER
+    assert events[0] == ("context", {"cached": True, "cache_tier": "faq", "sources": [{"id": "c1"}], "rerank_ms": None})
+    assert events[1] == ("token", ANSWER)
+    retrieve.assert_not_called()
+    generate.assert_not_called()
+
+
+def test_added_chunks_make_older_faqs_stale(db, tmp_path):
+    """Test FAQs generated before the index gained chunks are re-generated."""
+    manifest_path = str(tmp_path / "manifest.json")
+    save_manifest(manifest_path, {"files": {"a.pdf": {"chunks": ["c1"]}}, "chunks_added_at": None})
+    assert index_state(manifest_path) == ({"c1"}, None)
+
+    warm(FakeRAG())
+    generated_at = db.query(FaqEntry).first().generated_at
+    added_at = generated_at + timedelta(minutes=1)
+    assert not is_stale(["c1"], {"c1"}, generated_at, None)
+    assert is_stale(["c1"], {"c1"}, generated_at, added_at)
+
+    # A later ingest added chunks: workers stop serving the old answers, the warmer redoes them
+    save_manifest(manifest_path, {"files": {"a.pdf": {"chunks": ["c1", "c3"]}}, "chunks_added_at": added_at.isoformat()})
+    chunk_ids, added = index_state(manifest_path)
+    store = FaqStore(reload_seconds=None)
+    assert store.load(TestingSessionLocal, namespace="test-model", chunk_ids=chunk_ids, added_at=added) == 0
+
+    with patch("app.rag.faq_warmer.datetime") as clock:
+        clock.utcnow.return_value = added_at + timedelta(minutes=1)
+        report = warm(FakeRAG(), chunk_ids=chunk_ids, added_at=added)
+    assert report["marked_stale"] == 2 and report["generated"] == 2
+    assert store.load(TestingSessionLocal, namespace="test-model", chunk_ids=chunk_ids, added_at=added) == 2
@@ -0,0 +1,210 @@
+"""Tests for the incremental ingestion pipeline."""
+
+import hashlib
+import json
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from app.rag.ingest import LocalIndexWriter, chunk_ids, ingest
+from app.rag.lexical_index import LexicalIndex
+from app.rag.local_store import LocalVectorStore
+
+
+class CountingEmbeddings:
+    """Deterministic embedder that records how many texts it encoded."""
+
+    dim = 16
+
+    def __init__(self):
+        self.calls = []
+
+    def _embed(self, text):
+        seed = int(hashlib.md5(text.encode("utf-8")).hexdigest()[:8], 16)
+        return np.random.default_rng(seed).normal(size=self.dim).tolist()
+
+    def embed_documents(self, texts):
+        self.calls.append(len(texts))
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+def fake_parse_file(path):
+    """One chunk per non-empty line, the line number standing in for the page."""
+    with open(path, encoding="utf-8") as f:
+        return [(line.strip(), {"source": path, "page": i}) for i, line in enumerate(f) if line.strip()]
+
+
+@pytest.fixture
+def env(tmp_path):
+    """Data dir with two text files and a run() helper that ingests into a local index."""
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    (data_dir / "a.txt").write_text("học phí\nký túc xá\nđiểm chuẩn\n", encoding="utf-8")
+    (data_dir / "b.txt").write_text("tuyển sinh\nhọc bổng\n", encoding="utf-8")
+    index_dir = str(tmp_path / "index")
+    embeddings = CountingEmbeddings()
+
+    def run(**kwargs):
+        store = LocalVectorStore(embeddings, index_dir)
+        report = ingest(
+            data_dir=str(data_dir),
+            pattern="*.txt",
+            manifest_path=str(tmp_path / "manifest.json"),
+            backend="local",
+            parse_workers=0,
+            embed_batch_size=2,
+            embeddings=embeddings,
+            writer=LocalIndexWriter(store),
+            lexical_dir=str(tmp_path / "lexical"),
+            **kwargs,
+        )
+        return report, LocalVectorStore(embeddings, index_dir)
+
+    with patch("app.rag.ingest.parse_file", side_effect=fake_parse_file):
+        yield data_dir, tmp_path, embeddings, run
+
+
+def test_initial_ingest_embeds_everything_in_batches(env):
+    """Test the first run embeds every chunk in bounded batches and writes the manifest."""
+    data_dir, tmp_path, embeddings, run = env
+    report, store = run()
+
+    assert report.files_scanned == 2
+    assert report.chunks_embedded == 5
+    assert len(store) == 5
+    assert max(embeddings.calls) <= 2
+    manifest = json.loads((tmp_path / "manifest.json").read_text(encoding="utf-8"))
+    assert set(manifest["files"]) == {"a.txt", "b.txt"}
+    assert len(manifest["files"]["a.txt"]["chunks"]) == 3
+
+
+def test_unchanged_files_are_skipped(env):
+    """Test a second run over unchanged files embeds nothing."""
+    data_dir, tmp_path, embeddings, run = env
+    run()
+    embeddings.calls.clear()
+
+    report, store = run()
+    assert report.files_changed == 0
+    assert report.chunks_embedded == 0
+    assert report.chunks_unchanged == 5
+    assert embeddings.calls == []
+    assert len(store) == 5
+
+
+def test_edited_chunk_is_reembedded_and_old_one_deleted(env):
+    """Test only the edited chunk is re-embedded and its old version removed."""
+    data_dir, tmp_path, embeddings, run = env
+    run()
+    embeddings.calls.clear()
+
+    (data_dir / "a.txt").write_text("học phí\nký túc xá mới\nđiểm chuẩn\n", encoding="utf-8")
+    report, store = run()
+
+    assert report.files_changed == 1
+    assert report.chunks_embedded == 1
+    assert report.chunks_deleted == 1
+    assert sum(embeddings.calls) == 1
+    texts = {doc.page_content for doc in store.similarity_search("ký túc xá mới", k=5)}
+    assert "ký túc xá mới" in texts
+    assert "ký túc xá" not in texts
+
+
+def test_manifest_records_when_chunks_were_added(env):
+    """Test the manifest stamps runs that add chunks so older FAQs can expire."""
+    data_dir, tmp_path, embeddings, run = env
+    manifest_path = tmp_path / "manifest.json"
+    run()
+    first = json.loads(manifest_path.read_text(encoding="utf-8"))["chunks_added_at"]
+    assert first is not None
+
+    (data_dir / "b.txt").unlink()
+    run()
+    assert json.loads(manifest_path.read_text(encoding="utf-8"))["chunks_added_at"] == first
+
+    (data_dir / "c.txt").write_text("lịch thi\n", encoding="utf-8")
+    run()
+    assert json.loads(manifest_path.read_text(encoding="utf-8"))["chunks_added_at"] > first
+
+
+def test_removed_file_deletes_its_chunks(env):
+    """Test chunks of a deleted file are removed from the index."""
+    data_dir, tmp_path, embeddings, run = env
+    run()
+    (data_dir / "b.txt").unlink()
+
+    report, store = run()
+    assert report.files_removed == 1
+    assert report.chunks_deleted == 2
+    assert len(store) == 3
+
+
+def test_lexical_index_follows_ingest(env):
+    """Test the BM25 index is rebuilt with the same chunks as the vector index."""
+    data_dir, tmp_path, embeddings, run = env
+    run()
+    lexical = LexicalIndex(str(tmp_path / "lexical"))
+    assert len(lexical) == 5
+    assert lexical.search("ky tuc xa", k=1)[0].page_content == "ký túc xá"
+
+    (data_dir / "a.txt").write_text("học phí\nký túc xá A2-301\nđiểm chuẩn\n", encoding="utf-8")
+    run()
+    lexical = LexicalIndex(str(tmp_path / "lexical"))
+    assert len(lexical) == 5
+    assert lexical.search("A2-301", k=1)[0].page_content == "ký túc xá A2-301"
+
+
+def test_missing_lexical_index_is_rebuilt_without_reembedding(env):
+    """Test a lost BM25 index is rebuilt from the vector store, not by re-embedding."""
+    data_dir, tmp_path, embeddings, run = env
+    run()
+    for path in (tmp_path / "lexical").iterdir():
+        path.unlink()
+    embeddings.calls.clear()
+
+    report, store = run()
+    assert embeddings.calls == []
+    assert len(LexicalIndex(str(tmp_path / "lexical"))) == 5
+
+
+def test_dry_run_writes_nothing(env):
+    """Test a dry run reports the work but touches neither the index nor the manifest."""
+    data_dir, tmp_path, embeddings, run = env
+    report, store = run(dry_run=True)
+
+    assert report.chunks_embedded == 5
+    assert embeddings.calls == []
+    assert len(store) == 0
+    assert not (tmp_path / "manifest.json").exists()
+
+
+def test_writer_commit_rebuilds_ivf_once(tmp_path):
+    """Test deletes plus overwriting upserts run k-means once per commit, not per call."""
+    from app.rag import local_store
+
+    rng = np.random.default_rng(0)
+    store = LocalVectorStore(CountingEmbeddings(), str(tmp_path / "index"), ivf_min_rows=50)
+    store.add_embeddings([f"d{i}" for i in range(100)], rng.normal(size=(100, 16)), ids=[f"d{i}" for i in range(100)])
+
+    writer = LocalIndexWriter(store)
+    writer.delete(["d0", "d1"])
+    writer.upsert(["d2 mới", "d100"], rng.normal(size=(2, 16)), [{}, {}], ["d2", "d100"])
+    with patch.object(local_store, "build_ivf", wraps=local_store.build_ivf) as build_ivf:
+        writer.commit()
+
+    assert build_ivf.call_count == 1
+    assert len(store) == 99
+    assert store._ivf["order"].size == 99
+
+
+def test_chunk_ids_are_stable_and_unique():
+    """Test chunk ids are deterministic, unique per position and scoped by file."""
+    chunks = [("giống nhau", {"page": 1}), ("giống nhau", {"page": 1}), ("khác", {"page": 2})]
+    ids = chunk_ids("a.pdf", chunks)
+    assert len(set(ids)) == 3
+    assert ids == chunk_ids("a.pdf", chunks)
+    assert chunk_ids("b.pdf", chunks)[0] != ids[0]
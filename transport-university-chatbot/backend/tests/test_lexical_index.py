@@ -0,0 +1,57 @@
+"""Tests for the BM25 lexical index and reciprocal rank fusion."""
+
+from langchain_core.documents import Document
+
+from app.rag.lexical_index import LexicalIndex, fold_accents, reciprocal_rank_fusion, tokenize
+
+RECORDS = [
+    ("c1", "Ngành Kỹ thuật xây dựng có mã ngành 7580201, học phí 15 triệu đồng/năm.", {"page": 1}),
+    ("c2", "Ký túc xá cơ sở Hà Nội nằm tại phòng A2-301, khu A.", {"page": 2}),
+    ("c3", "Hạn nộp hồ sơ xét tuyển là ngày 15/08/2024.", {"page": 3}),
+    ("c4", "Sinh viên được hỗ trợ học bổng khuyến khích học tập mỗi học kỳ.", {"page": 4}),
+]
+
+
+def test_tokenize_keeps_codes_and_folds_accents():
+    """Test codes, dates and room numbers survive tokenizing, with accent-folded variants."""
+    terms = tokenize("Mã ngành 7.580.201, phòng A2-301, ngày 15/08/2024")
+    assert "7.580.201" in terms and "7580201" in terms
+    assert "a2-301" in terms and "301" in terms
+    assert "15/08/2024" in terms
+    assert "nganh" in terms and "ngành" in terms
+    assert "ma_nganh" in terms
+    assert fold_accents("Đại học Giao thông") == "Dai hoc Giao thong"
+
+
+def test_search_finds_exact_codes(tmp_path):
+    """Test exact codes and accent-free queries rank the right chunk first."""
+    index = LexicalIndex(str(tmp_path))
+    index.build(RECORDS)
+
+    assert index.search("mã ngành 7580201", k=1)[0].metadata["id"] == "c1"
+    assert index.search("phòng A2-301 ở đâu", k=1)[0].metadata["id"] == "c2"
+    assert index.search("15/08/2024", k=1)[0].metadata["id"] == "c3"
+    assert index.search("hoc bong", k=1)[0].metadata["id"] == "c4"
+    assert index.search("không liên quan gì xyz", k=3) == []
+
+
+def test_save_load_and_update(tmp_path):
+    """Test the index round-trips through disk and applies incremental updates."""
+    index = LexicalIndex(str(tmp_path))
+    index.build(RECORDS)
+    index.save()
+
+    reloaded = LexicalIndex(str(tmp_path))
+    assert len(reloaded) == 4
+    assert reloaded.search("ký túc xá", k=1)[0].metadata == {"page": 2, "id": "c2"}
+
+    reloaded.update(added=[("c5", "Phòng đào tạo ở tầng 2 nhà A1.", {"page": 5})], removed=["c2"])
+    assert len(reloaded) == 4
+    assert all(doc.metadata["id"] != "c2" for doc in reloaded.search("ký túc xá phòng", k=4))
+
+
+def test_reciprocal_rank_fusion():
+    """Test documents ranked by several retrievers rise to the top."""
+    a, b, c = (Document(page_content=t, metadata={"id": t}) for t in "abc")
+    fused = reciprocal_rank_fusion([[a, b], [c, b]], k=60, top_k=2)
+    assert [d.metadata["id"] for d in fused] == ["b", "a"]
@@ -0,0 +1,64 @@
+"""Tests for the pooled LLM client against the local stub Responses API."""
+
+import asyncio
+
+import httpx
+import pytest
+from openai import APIStatusError
+
+from app.rag.llm_client import LLMClient
+from benchmarks.stub_llm import create_stub_app, DEFAULT_ANSWER
+
+
+def make_client(stub_app, **kwargs):
+    kwargs.setdefault("retry_base_delay", 0.0)
+    return LLMClient(
+        api_key="test",
+        base_url="http://stub/v1",
+        model="stub-model",
+        http2=False,
+        transport=httpx.ASGITransport(app=stub_app),
+        **kwargs,
+    )
+
+
+def test_generate_returns_output_text():
+    """Test a non-streaming call returns the full answer text."""
+    client = make_client(create_stub_app())
+    assert asyncio.run(client.agenerate("xin chào")) == DEFAULT_ANSWER
+
+
+def test_stream_yields_deltas():
+    """Test streaming yields the answer token by token."""
+    client = make_client(create_stub_app())
+
+    async def collect():
+        return [delta async for delta in client.astream("xin chào")]
+
+    deltas = asyncio.run(collect())
+    assert len(deltas) > 1
+    assert "".join(deltas) == DEFAULT_ANSWER
+
+
+def test_retries_on_rate_limit():
+    """Test 429 responses are retried up to max_retries."""
+    stub = create_stub_app(fail_first=2, fail_status=429)
+    client = make_client(stub, max_retries=3)
+    assert asyncio.run(client.agenerate("xin chào")) == DEFAULT_ANSWER
+    assert stub.state.requests == 3
+
+
+def test_gives_up_after_max_retries():
+    """Test the last error is raised once retries are exhausted."""
+    stub = create_stub_app(fail_first=10, fail_status=503)
+    client = make_client(stub, max_retries=1)
+    with pytest.raises(APIStatusError):
+        asyncio.run(client.agenerate("xin chào"))
+    assert stub.state.requests == 2
+
+
+def test_per_model_concurrency_config():
+    """Test per-model concurrency limits are parsed from configuration."""
+    client = make_client(create_stub_app(), max_concurrency="64,stub-model=2")
+    assert client._concurrency_for("stub-model") == 2
+    assert client._concurrency_for("other") == 64
@@ -0,0 +1,92 @@
+"""Tests for the local in-process vector store."""
+
+import hashlib
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+from app.rag.local_store import LocalVectorStore
+
+
+class FakeEmbeddings:
+    """Deterministic bag-of-words embedder (no model download)."""
+
+    dim = 64
+
+    def _embed(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in text.lower().split():
+            bucket = int(hashlib.md5(token.encode("utf-8")).hexdigest(), 16) % self.dim
+            vector[bucket] += 1.0
+        return vector.tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+DOCS = [
+    Document(page_content="học phí ngành kỹ thuật xây dựng", metadata={"page": 1}),
+    Document(page_content="ký túc xá sinh viên cơ sở Hà Nội", metadata={"page": 2}),
+    Document(page_content="điểm chuẩn tuyển sinh năm 2024", metadata={"page": 3}),
+]
+
+
+@pytest.fixture
+def index_dir(tmp_path):
+    return str(tmp_path / "index")
+
+
+def test_exact_search_returns_best_match(index_dir):
+    """Test top-1 cosine search returns the chunk sharing the query tokens."""
+    store = LocalVectorStore.from_documents(DOCS, FakeEmbeddings(), index_dir)
+    results = store.similarity_search("ký túc xá", k=1)
+    assert len(results) == 1
+    assert results[0].page_content == DOCS[1].page_content
+    assert results[0].metadata["page"] == 2
+
+
+def test_index_is_reloaded_memory_mapped(index_dir):
+    """Test a saved index is reopened from disk as a memory map."""
+    LocalVectorStore.from_documents(DOCS, FakeEmbeddings(), index_dir, dtype="float16")
+    store = LocalVectorStore(FakeEmbeddings(), index_dir, dtype="float16")
+    assert len(store) == 3
+    assert isinstance(store._vectors, np.memmap)
+    assert store._vectors.dtype == np.float16
+    assert store.similarity_search("điểm chuẩn", k=1)[0].metadata["page"] == 3
+
+
+def test_upsert_and_delete_by_id(index_dir):
+    """Test re-adding an id replaces it and delete removes it."""
+    store = LocalVectorStore(FakeEmbeddings(), index_dir)
+    store.add_texts(["thư viện điện tử"], ids=["a"])
+    store.add_texts(["lịch công tác"], ids=["a"])
+    assert len(store) == 1
+    assert store.similarity_search("lịch", k=1)[0].page_content == "lịch công tác"
+
+    assert store.delete(["a"]) is True
+    assert len(store) == 0
+    assert store.similarity_search("lịch", k=1) == []
+
+
+def test_ivf_search_matches_exact_search(index_dir):
+    """Test the IVF index finds the same nearest neighbour when probing all lists."""
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(500, 32)).astype(np.float32)
+    texts = [f"doc {i}" for i in range(500)]
+
+    exact = LocalVectorStore(FakeEmbeddings(), index_dir, ivf_min_rows=10_000)
+    exact.add_embeddings(texts, vectors)
+    approx = LocalVectorStore(FakeEmbeddings(), index_dir, ivf_min_rows=100, ivf_nprobe=1_000)
+    approx.add_embeddings(texts, vectors)
+    assert approx._ivf is not None
+
+    query = vectors[42]
+    assert (
+        exact.similarity_search_by_vector(query, k=5)[0].page_content
+        == approx.similarity_search_by_vector(query, k=5)[0].page_content
+        == "doc 42"
+    )
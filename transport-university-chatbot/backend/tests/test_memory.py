@@ -0,0 +1,195 @@
+"""Tests for conversation memory and the prompt token budget."""
+
+import asyncio
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, patch
+from uuid import uuid4
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app.models import ChatHistory, User
+from app.rag import memory, pipeline
+from app.rag.answer_cache import AnswerCache
+from app.rag.faq_store import FaqStore
+from app.rag.memory import (
+    MEMORY_RECENT_TURNS,
+    MEMORY_SUMMARY_BATCH,
+    Conversation,
+    Turn,
+    _Summary,
+    aload_conversation,
+    count_tokens,
+    fit_history,
+    fit_prompt,
+    looks_like_follow_up,
+    needs_condense,
+    summary_cache,
+)
+
+from .conftest import DB_PATH
+
+
+def make_turns(n, answer="Trả lời " * 20):
+    """n turns one minute apart, oldest first."""
+    start = datetime(2024, 1, 1)
+    return [
+        Turn(id=uuid4(), timestamp=start + timedelta(minutes=i), question=f"Câu hỏi {i}", answer=answer)
+        for i in range(n)
+    ]
+
+
+def test_fit_history_keeps_newest_turns_within_budget():
+    """Test the newest turns are kept and older ones dropped to fit the budget."""
+    conversation = Conversation(turns=make_turns(20))
+    history = fit_history(conversation, 200)
+
+    assert count_tokens(history) <= 200
+    assert "Câu hỏi 19" in history
+    assert "Câu hỏi 0" not in history
+
+
+def test_fit_history_includes_summary_when_room():
+    """Test the cached summary is prepended when the budget allows."""
+    conversation = Conversation(summary="Người dùng hỏi về học phí.", turns=make_turns(1))
+    history = fit_history(conversation, 500)
+    assert history.startswith("(Tóm tắt trước đó) Người dùng hỏi về học phí.")
+
+
+def test_fit_prompt_is_bounded_regardless_of_length():
+    """Test the whole prompt stays within budget however long the conversation is."""
+    chunks = ["Nội dung tài liệu rất dài. " * 200 for _ in range(5)]
+    for n_turns in (0, 5, 50):
+        conversation = Conversation(summary="Tóm tắt " * 100, turns=make_turns(n_turns))
+        context, history = fit_prompt(100, chunks, conversation, budget=1000, history_budget=300)
+        assert count_tokens(history) <= 300
+        assert 100 + count_tokens(context) + count_tokens(history) <= 1000 + 5
+
+
+def test_fit_prompt_keeps_chunk_order():
+    """Test retrieved chunks keep their ranking order in the context."""
+    context, history = fit_prompt(0, ["một", "hai", "ba"], None, budget=100)
+    assert history == ""
+    assert context.split("\n") == ["một", "hai", "ba"]
+
+
+def test_follow_up_detection():
+    """Test short questions and pronoun/reference questions count as follow-ups."""
+    assert looks_like_follow_up("Còn cơ sở 2?")
+    assert looks_like_follow_up("Còn ký túc xá thì sao?")
+    assert looks_like_follow_up("Ngành đó lấy bao nhiêu điểm?")
+    assert not looks_like_follow_up("Học phí ngành Kỹ thuật xây dựng năm 2024 là bao nhiêu?")
+
+
+def test_condense_only_within_recent_window():
+    """Test a returning user's follow-up is not condensed once the conversation went quiet."""
+    now = datetime(2024, 1, 1, 12, 0)
+    conversation = Conversation(turns=make_turns(1), last_turn_at=now - timedelta(minutes=5))
+    assert needs_condense("Còn ký túc xá thì sao?", conversation, now=now)
+    assert not needs_condense("Điểm chuẩn ngành Kinh tế vận tải năm 2024?", conversation, now=now)
+    conversation.last_turn_at = now - timedelta(days=2)
+    assert not needs_condense("Còn ký túc xá thì sao?", conversation, now=now)
+    assert not needs_condense("Còn ký túc xá thì sao?", Conversation(), now=now)
+
+
+def run_pipeline(question, conversation, cache):
+    """Answer through the async pipeline with stubbed retrieval, LLM and condensing."""
+    condense = AsyncMock(return_value="Ký túc xá của trường ở đâu?")
+    retrieve, generate = AsyncMock(return_value=[]), AsyncMock(return_value="answer")
+    with patch.object(pipeline, "faq_store", FaqStore(reload_seconds=None)), \
+         patch.object(pipeline, "answer_cache", cache), \
+         patch.object(pipeline, "acondense_question", condense), \
+         patch.object(pipeline, "aretrieve_documents", retrieve), \
+         patch.object(pipeline, "agenerate_answer", generate):
+        answer = asyncio.run(pipeline.aanswer_question(question, conversation))
+    return answer, condense, retrieve
+
+
+def test_cache_is_checked_before_condensing():
+    """Test a cached question is answered without the condense LLM call."""
+    conversation = Conversation(turns=make_turns(1), last_turn_at=datetime.utcnow())
+    cache = AnswerCache(semantic_threshold=None)
+    cache.store("Còn ký túc xá thì sao?", "cached")
+    answer, condense, retrieve = run_pipeline("Còn ký túc xá thì sao?", conversation, cache)
+    assert answer == "cached"
+    condense.assert_not_called()
+    retrieve.assert_not_called()
+
+
+def test_condensed_follow_up_is_not_cached_under_raw_question():
+    """Test a follow-up retrieves with the condensed question and its answer is not cached."""
+    conversation = Conversation(turns=make_turns(1), last_turn_at=datetime.utcnow())
+    cache = AnswerCache(semantic_threshold=None)
+    _, condense, retrieve = run_pipeline("Còn ký túc xá thì sao?", conversation, cache)
+    condense.assert_called_once()
+    assert retrieve.call_args.args[0] == "Ký túc xá của trường ở đâu?"
+    assert len(cache._entries) == 0
+
+    # A standalone question skips condensing and is cached under its own text
+    _, condense, retrieve = run_pipeline("Điểm chuẩn ngành Kinh tế vận tải năm 2024?", conversation, cache)
+    condense.assert_not_called()
+    assert cache.lookup("Điểm chuẩn ngành Kinh tế vận tải năm 2024?").answer == "answer"
+
+
+def add_history(db, n):
+    """A user with n chat turns one minute apart; returns the user and the rows, oldest first."""
+    user = User(username="memory_user", email="memory@example.com", password_hash="x", is_active=True)
+    db.add(user)
+    db.commit()
+    start = datetime(2024, 1, 1)
+    rows = [
+        ChatHistory(user_id=user.id, message=f"Câu hỏi {i}", response="a", role="user", timestamp=start + timedelta(minutes=i))
+        for i in range(n)
+    ]
+    db.add_all(rows)
+    db.commit()
+    return user, [(row.id, row.timestamp, row.message) for row in rows]
+
+
+def load_and_summarize(user_id):
+    """aload_conversation with a stubbed summarizer; waits for the background refresh."""
+    summarize = AsyncMock(return_value="tóm tắt")
+
+    async def run():
+        async_engine = create_async_engine(f"sqlite+aiosqlite:///{DB_PATH}", poolclass=NullPool)
+        session_factory = async_sessionmaker(bind=async_engine, class_=AsyncSession, expire_on_commit=False)
+        try:
+            async with session_factory() as session:
+                with patch.object(memory, "asummarize", summarize):
+                    conversation = await aload_conversation(session, user_id)
+                    await asyncio.gather(*memory._background_tasks)
+            return conversation
+        finally:
+            await async_engine.dispose()
+
+    return asyncio.run(run()), summarize
+
+
+def test_summary_behind_the_window_catches_up_from_its_watermark(db):
+    """Test turns between the summary watermark and the loaded window are summarized, not dropped."""
+    user, rows = add_history(db, 20)
+    summary_cache.set(user.id, _Summary(text="cũ", until=(rows[2][1], rows[2][0])))
+    try:
+        conversation, summarize = load_and_summarize(user.id)
+        window = MEMORY_RECENT_TURNS + MEMORY_SUMMARY_BATCH
+        assert [turn.question for turn in conversation.turns] == [row[2] for row in rows[-window:]]
+        previous, turns, earlier_missing = summarize.call_args.args
+        assert previous == "cũ" and not earlier_missing
+        # The next batch right after the watermark, not the older half of the window
+        assert [turn.question for turn in turns] == [row[2] for row in rows[3:3 + MEMORY_SUMMARY_BATCH]]
+        assert summary_cache.get(user.id).until == (rows[2 + MEMORY_SUMMARY_BATCH][1], rows[2 + MEMORY_SUMMARY_BATCH][0])
+    finally:
+        summary_cache.pop(user.id)
+
+
+def test_summary_without_cache_notes_earlier_turns(db):
+    """Test a worker with no cached summary says the summary may miss older turns."""
+    user, rows = add_history(db, 20)
+    conversation, summarize = load_and_summarize(user.id)
+    try:
+        previous, turns, earlier_missing = summarize.call_args.args
+        assert previous == "" and earlier_missing
+        window = MEMORY_RECENT_TURNS + MEMORY_SUMMARY_BATCH
+        assert [turn.question for turn in turns] == [row[2] for row in rows[-window:-MEMORY_RECENT_TURNS]]
+    finally:
+        summary_cache.pop(user.id)
@@ -0,0 +1,121 @@
+"""Tests for the Prometheus metrics registry, request middleware and /metrics endpoint."""
+
+import asyncio
+from types import SimpleNamespace
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.metrics import (
+    CONTENT_TYPE,
+    CHAT_STAGE_DURATION,
+    HTTP_REQUEST_DURATION,
+    LLM_TOKENS,
+    MetricsRegistry,
+    record_llm_usage,
+    stage_timer,
+)
+
+client = TestClient(app)
+
+
+def test_histogram_renders_cumulative_buckets():
+    """Test histogram buckets are cumulative and end with +Inf, _sum and _count."""
+    registry = MetricsRegistry()
+    latency = registry.histogram("demo_seconds", "Demo latency", ["route"], buckets=(0.1, 1.0))
+    latency.observe(0.05, route="/a")
+    latency.observe(0.5, route="/a")
+    latency.observe(5, route="/a")
+
+    body = registry.render()
+    assert "# TYPE demo_seconds histogram" in body
+    assert 'demo_seconds_bucket{route="/a",le="0.1"} 1' in body
+    assert 'demo_seconds_bucket{route="/a",le="1"} 2' in body
+    assert 'demo_seconds_bucket{route="/a",le="+Inf"} 3' in body
+    assert 'demo_seconds_sum{route="/a"} 5.55' in body
+    assert 'demo_seconds_count{route="/a"} 3' in body
+
+
+def test_counter_gauge_and_label_escaping():
+    """Test counters and gauges render with escaped label values."""
+    registry = MetricsRegistry()
+    counter = registry.counter("demo_total", "Demo counter", ["name"])
+    counter.inc(name='say "hi"')
+    counter.inc(2, name='say "hi"')
+    gauge = registry.gauge("demo_gauge", "Demo gauge")
+    gauge.inc()
+    gauge.dec()
+    gauge.set(7)
+
+    body = registry.render()
+    assert 'demo_total{name="say \\"hi\\""} 3' in body
+    assert "demo_gauge 7" in body
+    # Registering the same name again returns the existing family
+    assert registry.counter("demo_total", "Demo counter", ["name"]) is counter
+
+
+def test_failing_collector_does_not_break_scrape():
+    """Test a collector that raises is skipped while the others still render."""
+    registry = MetricsRegistry()
+
+    def broken():
+        raise RuntimeError("boom")
+        yield  # pragma: no cover
+
+    def pool():
+        yield "demo_pool", "gauge", "Demo pool", [({"engine": "sync"}, 3)]
+
+    registry.register_collector(broken)
+    registry.register_collector(pool)
+    assert 'demo_pool{engine="sync"} 3' in registry.render()
+
+
+def test_stage_timer_records_even_on_error():
+    """Test stage_timer observes the duration when the timed block raises."""
+    before = CHAT_STAGE_DURATION.count(stage="test_stage")
+
+    async def fail():
+        with stage_timer("test_stage"):
+            await asyncio.sleep(0)
+            raise ValueError("boom")
+
+    try:
+        asyncio.run(fail())
+    except ValueError:
+        pass
+    assert CHAT_STAGE_DURATION.count(stage="test_stage") == before + 1
+
+
+def test_record_llm_usage_counts_tokens():
+    """Test provider usage is added to the input/output token counters."""
+    before_in = LLM_TOKENS.value(model="test-model", direction="input")
+    before_out = LLM_TOKENS.value(model="test-model", direction="output")
+    record_llm_usage("test-model", SimpleNamespace(input_tokens=120, output_tokens=30))
+    record_llm_usage("test-model", None)
+    assert LLM_TOKENS.value(model="test-model", direction="input") == before_in + 120
+    assert LLM_TOKENS.value(model="test-model", direction="output") == before_out + 30
+
+
+def test_request_latency_uses_route_template():
+    """Test request latency is labelled by route template, not the raw path."""
+    before = HTTP_REQUEST_DURATION.count(method="GET", route="/api", status="200")
+    assert client.get("/api").status_code == 200
+    assert HTTP_REQUEST_DURATION.count(method="GET", route="/api", status="200") == before + 1
+
+    # Path parameters are not label values: one series per template
+    client.delete("/api/chat/history/00000000-0000-0000-0000-000000000001")
+    body = client.get("/metrics").text
+    assert 'route="/api/chat/history/{chat_id}"' in body
+    assert "00000000-0000-0000-0000-000000000001" not in body
+
+
+def test_metrics_endpoint_is_public_and_prometheus_formatted():
+    """Test /metrics needs no auth and serves the Prometheus text format."""
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == CONTENT_TYPE
+    body = response.text
+    assert "# TYPE http_request_duration_seconds histogram" in body
+    assert "# TYPE cache_lookups_total counter" in body
+    assert 'db_pool_size{engine="sync"}' in body
+    assert 'db_pool_checked_in{engine="sync"}' in body
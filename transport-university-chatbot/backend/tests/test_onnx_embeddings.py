@@ -0,0 +1,46 @@
+"""Tests for the ONNX embedding backend helpers (no onnxruntime needed)."""
+
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from app.rag import onnx_embeddings, vector_store
+from app.rag.onnx_embeddings import FP32_FILE, INT8_FILE, model_file, pool
+from app.rag.vector_store import create_embeddings, embedding_namespace
+
+
+def test_pool_cls_and_mean():
+    """Test CLS / masked-mean pooling and L2 normalization match sentence-transformers."""
+    hidden = np.array([[[3.0, 4.0], [1.0, 1.0], [100.0, 100.0]]], dtype=np.float32)
+    mask = np.array([[1, 1, 0]])
+    assert np.allclose(pool(hidden, mask, "cls"), [[0.6, 0.8]])
+    assert np.allclose(pool(hidden, mask, "mean", normalize=False), [[2.0, 2.5]])
+    with pytest.raises(ValueError):
+        pool(hidden, mask, "max")
+
+
+def test_model_file_prefers_exported_int8(tmp_path):
+    """Test the int8 graph is used only when requested and present."""
+    (tmp_path / FP32_FILE).write_bytes(b"")
+    assert model_file(str(tmp_path), quantized=True).endswith(FP32_FILE)
+    (tmp_path / INT8_FILE).write_bytes(b"")
+    assert model_file(str(tmp_path), quantized=True).endswith(INT8_FILE)
+    assert model_file(str(tmp_path), quantized=False).endswith(FP32_FILE)
+
+
+def test_namespace_follows_the_loaded_model_file(tmp_path):
+    """Test the cache namespace says int8 only when the int8 graph is what gets loaded."""
+    (tmp_path / FP32_FILE).write_bytes(b"")
+    with patch.object(vector_store, "EMBEDDING_BACKEND", "onnx"), \
+         patch.object(onnx_embeddings, "ONNX_MODEL_DIR", str(tmp_path)), \
+         patch.object(onnx_embeddings, "ONNX_QUANTIZED", True):
+        assert embedding_namespace("m") == "m|onnx"
+        (tmp_path / INT8_FILE).write_bytes(b"")
+        assert embedding_namespace("m") == "m|onnx-int8"
+
+
+def test_unknown_embedding_backend():
+    """Test an unsupported EMBEDDING_BACKEND is rejected."""
+    with pytest.raises(ValueError):
+        create_embeddings("any-model", backend="tensorflow")
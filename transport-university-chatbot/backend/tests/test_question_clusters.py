@@ -0,0 +1,131 @@
+"""Tests for the incremental near-duplicate question clustering job."""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+from app.models import ChatHistory, QuestionCluster, QuestionClusterMember, User
+from app.rag.question_clusters import ClusterIndex, cluster_questions
+from app.services.stats_service import dashboard_cache, get_dashboard_stats, hot_intents, top_clusters
+
+from .conftest import TestingSessionLocal
+
+# Intent of each test question: questions sharing an intent get near-identical vectors
+INTENTS = {"học phí": 0, "ký túc xá": 1, "điểm chuẩn": 2}
+
+
+class IntentEmbeddings:
+    """Maps each question to the axis of its intent plus a small wording-dependent offset."""
+
+    def __init__(self):
+        self.calls = []
+
+    def embed_documents(self, texts):
+        self.calls.append(list(texts))
+        vectors = []
+        for text in texts:
+            vector = np.zeros(4, dtype=np.float32)
+            axis = next((i for intent, i in INTENTS.items() if intent in text.lower()), 3)
+            vector[axis] = 1.0
+            vector[3] += (len(text) % 5) * 0.05
+            vectors.append(vector.tolist())
+        return vectors
+
+
+@pytest.fixture(autouse=True)
+def setup_teardown(tables):
+    """Fresh tables and an empty dashboard cache for each test."""
+    dashboard_cache.clear()
+
+
+def add_questions(db, messages, when=None):
+    """Insert user questions (for a shared test user) at the given time."""
+    user = db.query(User).first()
+    if user is None:
+        user = User(username="cluster_user", email="cluster@example.com", password_hash="x", is_active=True)
+        db.add(user)
+        db.commit()
+    for message in messages:
+        db.add(ChatHistory(user_id=user.id, message=message, response="a", role="user", timestamp=when or datetime.utcnow()))
+    db.commit()
+
+
+def run(embeddings, **kwargs):
+    """Run the clustering job against the test database."""
+    return cluster_questions(TestingSessionLocal, embeddings, namespace="test-model", **kwargs)
+
+
+def test_cluster_index_assigns_by_threshold():
+    """Test vectors join a cluster only above the similarity threshold."""
+    index = ClusterIndex(threshold=0.9)
+    first = index.assign(np.array([1.0, 0.0]))
+    assert index.assign(np.array([0.99, 0.05])) == first
+    assert index.assign(np.array([0.0, 1.0])) != first
+    assert len(index) == 2
+    assert np.isclose(np.linalg.norm(index.centroid(first)), 1.0)
+
+
+def test_groups_near_duplicates_and_reports_top_clusters(db):
+    """Test near-duplicate questions share a cluster and show up in the dashboard."""
+    add_questions(db, ["Học phí bao nhiêu?", "học phí của trường là bao nhiêu", "Học phí bao nhiêu?", "Ký túc xá ở đâu?"])
+    embeddings = IntentEmbeddings()
+
+    report = run(embeddings, threshold=0.8, batch_size=2)
+    assert report["questions"] == 4
+    assert report["clusters"] == 2
+    assert report["batches"] == 2
+    # Exact repeats ("học phí bao nhiêu?") are embedded once
+    assert report["embedded"] == 3
+
+    clusters = top_clusters(db)
+    assert [c["count"] for c in clusters] == [3, 1]
+    assert clusters[0]["question"] == "Học phí bao nhiêu?"
+    assert hot_intents(db) == ["Học phí bao nhiêu?", "Ký túc xá ở đâu?"]
+    assert get_dashboard_stats(db, "all", use_cache=False)["top_clusters"] == clusters
+
+
+def test_incremental_runs_reuse_known_questions(db):
+    """Test later runs only embed wordings that were not seen before."""
+    add_questions(db, ["Điểm chuẩn năm nay?"])
+    embeddings = IntentEmbeddings()
+    run(embeddings, threshold=0.8)
+
+    add_questions(db, ["điểm chuẩn năm nay?", "Điểm chuẩn ngành CNTT là bao nhiêu?"])
+    report = run(embeddings, threshold=0.8)
+    assert report["questions"] == 2
+    assert report["new_clusters"] == 0
+    # Only the new wording reaches the model
+    assert embeddings.calls[-1] == ["Điểm chuẩn ngành CNTT là bao nhiêu?"]
+    assert run(embeddings, threshold=0.8)["questions"] == 0
+    assert top_clusters(db)[0]["count"] == 3
+
+
+def test_windows_and_deleted_questions(db):
+    """Test windowed cluster counts and clusters whose questions were deleted."""
+    add_questions(db, ["Ký túc xá?"], when=datetime.utcnow() - timedelta(days=20))
+    add_questions(db, ["Học phí?"])
+    embeddings = IntentEmbeddings()
+    run(embeddings, threshold=0.8)
+
+    assert [c["question"] for c in get_dashboard_stats(db, "7d", use_cache=False)["top_clusters"]] == ["Học phí?"]
+    assert len(get_dashboard_stats(db, "30d", use_cache=False)["top_clusters"]) == 2
+
+    # Removing the source rows drops the cluster on the next run
+    db.query(QuestionClusterMember).filter(QuestionClusterMember.question_key == "học phí?").delete()
+    db.query(ChatHistory).filter(ChatHistory.message == "Học phí?").delete()
+    db.commit()
+    assert run(embeddings, threshold=0.8)["questions"] == 0
+    assert [c["question"] for c in top_clusters(db)] == ["Ký túc xá?"]
+
+
+def test_model_change_requires_rebuild(db):
+    """Test a new embedding model is refused unless the clusters are rebuilt."""
+    add_questions(db, ["Học phí?"])
+    embeddings = IntentEmbeddings()
+    run(embeddings)
+    with pytest.raises(RuntimeError):
+        cluster_questions(TestingSessionLocal, embeddings, namespace="other-model")
+
+    report = cluster_questions(TestingSessionLocal, embeddings, namespace="other-model", rebuild=True)
+    assert report["questions"] == 1
+    assert {c.embedding_model for c in db.query(QuestionCluster)} == {"other-model"}
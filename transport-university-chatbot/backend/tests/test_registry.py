@@ -0,0 +1,81 @@
+"""Tests for the per-worker RAG registry and the health endpoints."""
+
+from unittest.mock import MagicMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.rag import registry as registry_module
+from app.rag.registry import RAGRegistry
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def fake_backends():
+    """Patch the model / store factories so load() runs without real models."""
+    embeddings = MagicMock()
+    with patch.object(registry_module, "create_embeddings", return_value=embeddings) as create_embeddings, \
+         patch.object(registry_module, "create_vector_store", return_value=MagicMock()) as create_vector_store, \
+         patch.object(registry_module, "create_lexical_index", return_value=[]), \
+         patch.object(registry_module, "EMBEDDING_CACHE_ENABLED", False):
+        yield embeddings, create_embeddings, create_vector_store
+
+
+def test_status_before_and_after_load(fake_backends):
+    """Test status() reports not ready until load() and then the load details."""
+    embeddings, _, _ = fake_backends
+    registry = RAGRegistry()
+    status = registry.status()
+    assert status["ready"] is False
+    assert status["load_seconds"] is None
+
+    registry.load(warmup=True)
+    status = registry.status()
+    assert status["ready"] is True
+    assert status["error"] is None
+    assert status["lexical_docs"] == 0
+    assert status["load_seconds"] is not None and status["warmup_seconds"] is not None
+    embeddings.embed_query.assert_called_once()
+
+
+def test_model_is_loaded_once(fake_backends):
+    """Test repeated lookups reuse the same model and vector store instances."""
+    _, create_embeddings, create_vector_store = fake_backends
+    registry = RAGRegistry()
+    registry.load()
+    assert registry.get_vector_store() is registry.get_vector_store()
+    registry.get_embeddings()
+    assert create_embeddings.call_count == 1
+    assert create_vector_store.call_count == 1
+
+
+def test_status_records_load_error(fake_backends):
+    """Test a failed load stays not ready and exposes the error."""
+    _, _, create_vector_store = fake_backends
+    create_vector_store.side_effect = RuntimeError("index missing")
+    registry = RAGRegistry()
+    with pytest.raises(RuntimeError):
+        registry.load()
+    status = registry.status()
+    assert status["ready"] is False
+    assert status["error"] == "index missing"
+
+
+def test_health_ready_vs_degraded(fake_backends):
+    """Test /health and /health/ready follow the registry readiness."""
+    registry = RAGRegistry()
+    with patch.object(registry_module, "registry", registry):
+        response = client.get("/health")
+        assert response.status_code == 200
+        assert response.json()["status"] == "degraded"
+        assert client.get("/health/ready").status_code == 503
+
+        registry.load()
+        response = client.get("/health")
+        assert response.json()["status"] == "ok"
+        assert response.json()["rag"]["ready"] is True
+        ready = client.get("/health/ready")
+        assert ready.status_code == 200
+        assert ready.json()["status"] == "ready"
@@ -0,0 +1,78 @@
+"""Tests for the adaptive-depth cross-encoder reranker."""
+
+import asyncio
+from unittest.mock import patch
+
+from langchain_core.documents import Document
+
+from app.rag import pipeline
+from app.rag.reranker import Reranker
+
+
+def make_docs(*texts):
+    return [Document(page_content=t, metadata={"id": t}) for t in texts]
+
+
+class KeywordScorer:
+    """Scores a pair by how often the question's words appear in the chunk; records batch sizes."""
+
+    def __init__(self, scores=None):
+        self.scores = scores or {}
+        self.batches = []
+
+    def __call__(self, pairs):
+        self.batches.append(len(pairs))
+        return [self.scores.get(text, 0.0) for _, text in pairs]
+
+
+def test_rerank_orders_by_cross_encoder_score():
+    """Test the reranker keeps the top_k best-scored candidates, best first."""
+    docs = make_docs("a", "b", "c", "d")
+    scorer = KeywordScorer({"a": 0.1, "b": 0.9, "c": 0.5, "d": 0.7})
+    reranker = Reranker(scorer, top_k=2, min_candidates=4, max_candidates=4, margin=100)
+    result = reranker.rerank("q", docs)
+    assert [d.page_content for d in result.docs] == ["b", "d"]
+    assert result.scored == 4
+
+
+def test_confident_margin_stops_early():
+    """Test an easy query (clear score gap) only scores the first batch."""
+    docs = make_docs(*"abcdefghijkl")
+    scorer = KeywordScorer({"a": 9.0, "b": 8.0, "c": 7.0})
+    reranker = Reranker(scorer, top_k=3, min_candidates=4, max_candidates=12, batch_size=4, margin=2.0)
+    result = reranker.rerank("q", docs)
+    assert scorer.batches == [4]
+    assert result.scored == 4
+    assert [d.page_content for d in result.docs] == ["a", "b", "c"]
+    assert reranker.stats()["early_stop_rate"] == 1.0
+
+
+def test_ambiguous_query_scores_deeper():
+    """Test a small margin keeps scoring until a late relevant chunk is found."""
+    docs = make_docs(*"abcdefghijkl")
+    scorer = KeywordScorer({"a": 1.0, "b": 1.0, "c": 1.0, "d": 1.0, "k": 9.0})
+    reranker = Reranker(scorer, top_k=3, min_candidates=4, max_candidates=12, batch_size=4, margin=2.0)
+    result = reranker.rerank("q", docs)
+    assert scorer.batches == [4, 4, 4]
+    assert result.docs[0].page_content == "k"
+    stats = reranker.stats()
+    assert stats["calls"] == 1
+    assert stats["avg_candidates_scored"] == 12
+
+
+def test_pipeline_reranks_wide_candidate_set():
+    """Test the async pipeline fetches the wide candidate set and reports rerank latency."""
+    docs = make_docs(*"abcdef")
+    reranker = Reranker(KeywordScorer({"f": 5.0}), top_k=1, min_candidates=6, max_candidates=6)
+
+    async def fake_retrieve(question, top_k=3, embedding=None):
+        assert top_k == pipeline.RERANK_MAX_CANDIDATES
+        return docs
+
+    with patch.object(pipeline, "RERANK_ENABLED", True), \
+         patch.object(pipeline, "aretrieve_documents", fake_retrieve), \
+         patch.object(pipeline.registry, "get_reranker", return_value=reranker):
+        ranked, rerank_ms = asyncio.run(pipeline._aretrieve("q", None))
+
+    assert [d.page_content for d in ranked] == ["f"]
+    assert rerank_ms is not None and rerank_ms >= 0
@@ -0,0 +1,62 @@
+"""Cold-start regression checks for app.main (python -X importtime in a fresh interpreter)."""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Must only be imported lazily (lifespan / first RAG request), never by `import app.main`
+HEAVY_MODULES = (
+    "openai", "langchain", "langchain_core", "langchain_community", "langchain_huggingface",
+    "langchain_pinecone", "pinecone", "sentence_transformers", "torch", "transformers",
+    "onnxruntime", "tiktoken", "numpy", "uvicorn",
+)
+# Cumulative import time budget for app.main; raise deliberately, never silently
+IMPORT_BUDGET_MS = float(os.getenv("STARTUP_IMPORT_BUDGET_MS", "2500"))
+
+
+def importtime(module):
+    """{module: cumulative microseconds} and stdout for a cold `import module`."""
+    env = dict(os.environ, DATABASE_URL="sqlite:///./startup_check.db", PYTHONDONTWRITEBYTECODE="1")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, timeout=120,
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+    timings = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line[len("import time:"):].split("|")
+            if cumulative.strip().isdigit():
+                timings[name.strip()] = int(cumulative)
+    return timings, result.stdout
+
+
+@pytest.fixture(scope="module")
+def main_import():
+    return importtime("app.main")
+
+
+def test_app_main_does_not_import_heavy_dependencies(main_import):
+    timings, _ = main_import
+    leaked = sorted(m for m in timings if m.split(".")[0] in HEAVY_MODULES)
+    assert not leaked, f"heavy modules imported at startup: {leaked[:20]}"
+
+
+def test_app_main_import_time_budget(main_import):
+    timings, _ = main_import
+    total_ms = timings["app.main"] / 1000
+    slowest = sorted(timings.items(), key=lambda item: item[1], reverse=True)[:10]
+    assert total_ms <= IMPORT_BUDGET_MS, (
+        f"import app.main took {total_ms:.0f} ms (budget {IMPORT_BUDGET_MS:.0f} ms); slowest: "
+        + ", ".join(f"{name}={us / 1000:.0f}ms" for name, us in slowest)
+    )
+
+
+def test_database_import_is_silent():
+    """Test importing the database module prints nothing (no connection URLs in logs)."""
+    _, stdout = importtime("app.database")
+    assert stdout == ""
@@ -0,0 +1,243 @@
+"""Tests for the incrementally maintained dashboard statistics."""
+
+import asyncio
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event, func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app.main import app
+from app.database import get_db
+from app.models import ChatHistory, QuestionCount, User
+from app.services.auth_cache import clear_auth_cache
+from app.services.auth_service import create_access_token
+from app.services.chat_service import delete_chat, delete_chat_async, delete_user_chat_history, save_chat, save_chat_async
+from app.services.stats_service import (
+    dashboard_cache,
+    get_dashboard_stats,
+    question_key,
+    reconcile_stats,
+    window_start,
+)
+from .conftest import DB_PATH, TestingSessionLocal, engine
+
+client = TestClient(app)
+
+
+def override_get_db():
+    """Serve the API from the shared test database."""
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@pytest.fixture(autouse=True)
+def setup_teardown(tables):
+    """Fresh tables, empty caches and the API bound to the test database."""
+    dashboard_cache.clear()
+    clear_auth_cache()
+    app.dependency_overrides[get_db] = override_get_db
+    with patch("app.middleware.auth_middleware.SessionLocal", side_effect=TestingSessionLocal):
+        yield
+    app.dependency_overrides = {}
+
+
+def make_user(db, name, is_admin=False):
+    """Insert and return an active user."""
+    user = User(username=name, email=f"{name}@example.com", password_hash="x", is_active=True, is_admin=is_admin)
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    return user
+
+
+def test_question_key_normalizes_and_bounds_length():
+    """Test question keys ignore case and whitespace and fit the column."""
+    assert question_key("  Học   phí\tBAO NHIÊU? ") == "học phí bao nhiêu?"
+    long_key = question_key("a" * 1000)
+    assert len(long_key) <= 255
+    assert long_key != question_key("a" * 999)
+
+
+def test_window_start():
+    """Test the first day of each dashboard window."""
+    today = datetime(2024, 5, 10).date()
+    assert window_start("all", today) is None
+    assert window_start("today", today) == today
+    assert window_start("7d", today) == today - timedelta(days=6)
+    with pytest.raises(ValueError):
+        window_start("1y", today)
+
+
+def test_save_chat_maintains_counts_and_top_questions(db):
+    """Test saving chats updates totals and the most frequent questions."""
+    user = make_user(db, "stats_user")
+    for message in ["Học phí?", "học  phí?", "Học phí?", "Ký túc xá?"]:
+        save_chat(db, user.id, message, "answer")
+    save_chat(db, user.id, "not a question", "x", role="assistant")
+
+    stats = get_dashboard_stats(db, "all", use_cache=False)
+    assert stats["total_questions"] == 4
+    assert stats["frequent_question_counts"][0] == {"question": "Học phí?", "count": 3}
+    assert stats["frequent_questions"] == ["Học phí?", "Ký túc xá?"]
+
+    today = get_dashboard_stats(db, "today", use_cache=False)
+    assert today["total_questions"] == 4
+    assert today["frequent_question_counts"][0]["count"] == 3
+
+
+def test_windows_only_count_recent_days(db):
+    """Test windowed views only count the days inside the window."""
+    user = make_user(db, "window_user")
+    save_chat(db, user.id, "Old question", "answer")
+    # Move that question 10 days back by rebuilding the rollups from chat_history
+    old = db.query(ChatHistory).one()
+    old.timestamp = datetime.utcnow() - timedelta(days=10)
+    db.commit()
+    reconcile_stats(db)
+    save_chat(db, user.id, "New question", "answer")
+
+    assert get_dashboard_stats(db, "7d", use_cache=False)["total_questions"] == 1
+    assert get_dashboard_stats(db, "30d", use_cache=False)["total_questions"] == 2
+    assert get_dashboard_stats(db, "7d", use_cache=False)["frequent_questions"] == ["New question"]
+    assert get_dashboard_stats(db, "all", use_cache=False)["total_questions"] == 2
+
+
+def test_async_save_and_delete_keep_rollups_in_sync(db):
+    """Test async saves and deletes keep the rollups in step with chat_history."""
+    user = make_user(db, "async_user")
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{DB_PATH}", poolclass=NullPool)
+    session_factory = async_sessionmaker(bind=async_engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def run():
+        async with session_factory() as session:
+            first = await save_chat_async(session, user.id, "Điểm chuẩn?", "answer")
+            await save_chat_async(session, user.id, "Điểm chuẩn?", "answer")
+            await delete_chat_async(session, first.id, user.id)
+        await async_engine.dispose()
+
+    asyncio.run(run())
+    stats = get_dashboard_stats(db, "all", use_cache=False)
+    assert stats["total_questions"] == 1
+    assert stats["frequent_question_counts"] == [{"question": "Điểm chuẩn?", "count": 1}]
+
+    delete_user_chat_history(db, user.id)
+    stats = get_dashboard_stats(db, "all", use_cache=False)
+    assert stats["total_questions"] == 0
+    assert stats["frequent_questions"] == []
+
+
+def test_reconcile_repairs_drift(db):
+    """Test reconciliation counts rows written behind the service's back."""
+    user = make_user(db, "drift_user")
+    save_chat(db, user.id, "Học bổng?", "answer")
+    # Rows written behind the service's back are invisible until reconciliation
+    db.add(ChatHistory(user_id=user.id, message="Học bổng?", response="a", role="user", timestamp=datetime.utcnow()))
+    db.commit()
+    assert get_dashboard_stats(db, "all", use_cache=False)["total_questions"] == 1
+
+    report = reconcile_stats(db)
+    assert report["questions"] == 2
+    assert report["users"] == 1
+    assert report["drifted_counters"] > 0
+    assert get_dashboard_stats(db, "all", use_cache=False)["total_questions"] == 2
+    assert reconcile_stats(db)["drifted_counters"] == 0
+
+
+def test_dashboard_endpoint_windows(db):
+    """Test the dashboard endpoint serves each window and rejects unknown ones."""
+    admin = make_user(db, "admin_user", is_admin=True)
+    reconcile_stats(db)
+    save_chat(db, admin.id, "Hồ sơ xét tuyển?", "answer")
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': str(admin.id)})}"}
+
+    response = client.get("/api/dashboard", headers=headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["window"] == "all"
+    assert data["total_users"] == 1
+    assert data["total_questions"] == 1
+    assert data["frequent_questions"] == ["Hồ sơ xét tuyển?"]
+
+    response = client.get("/api/dashboard?window=7d", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["since"] == window_start("7d").isoformat()
+
+    assert client.get("/api/dashboard?window=1y", headers=headers).status_code == 422
+
+
+def test_dashboard_requires_admin(db):
+    """Test non-admin users cannot read the dashboard."""
+    user = make_user(db, "plain_user")
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': str(user.id)})}"}
+    assert client.get("/api/dashboard", headers=headers).status_code == 403
+
+
+def test_question_counts_are_sharded(db):
+    """Test concurrent-style saves spread over shards and reads sum them."""
+    user = make_user(db, "shard_user")
+    with patch("app.services.stats_service.random.randrange", side_effect=[0, 0, 1, 1, 2, 2]):
+        for _ in range(3):
+            save_chat(db, user.id, "Học phí?", "answer")
+    shards = db.scalars(select(QuestionCount.shard).where(QuestionCount.day == window_start("today"))).all()
+    assert sorted(shards) == [0, 1, 2]
+    assert get_dashboard_stats(db, "all", use_cache=False)["frequent_question_counts"] == [{"question": "Học phí?", "count": 3}]
+
+    # A decrement takes the row off one shard and never creates rows
+    chat = db.query(ChatHistory).filter(ChatHistory.role == "user").first()
+    assert delete_chat(db, chat.id, user.id)
+    assert db.scalar(select(func.count()).select_from(QuestionCount)) == 6
+    assert get_dashboard_stats(db, "today", use_cache=False)["frequent_question_counts"] == [{"question": "Học phí?", "count": 2}]
+
+
+def test_delete_history_decrements_once_per_question(db):
+    """Test deleting a user's history issues one grouped decrement per (day, question)."""
+    user = make_user(db, "bulk_user")
+    for message in ["Học phí?", "học phí?", "Học phí?", "Ký túc xá?"]:
+        save_chat(db, user.id, message, "answer")
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        assert delete_user_chat_history(db, user.id) == 4
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+
+    updates = [statement for statement in statements if statement.startswith("UPDATE question_counts")]
+    assert len(updates) == 2
+    stats = get_dashboard_stats(db, "all", use_cache=False)
+    assert stats["total_questions"] == 0
+    assert stats["frequent_questions"] == []
+
+
+def test_init_db_rebuilds_unsharded_question_counts(tables):
+    """Test init_db replaces a question_counts table from before sharding."""
+    from app.database import init_db
+
+    db = TestingSessionLocal()
+    user = make_user(db, "legacy_user")
+    save_chat(db, user.id, "Điểm chuẩn?", "answer")
+    db.close()
+    QuestionCount.__table__.drop(bind=engine)
+    with engine.begin() as connection:
+        connection.exec_driver_sql(
+            "CREATE TABLE question_counts (day DATE, question_key VARCHAR(255), question TEXT, count BIGINT, "
+            "PRIMARY KEY (day, question_key))"
+        )
+
+    with patch("app.database.engine", engine), patch("app.database.SessionLocal", TestingSessionLocal):
+        init_db()
+
+    db = TestingSessionLocal()
+    try:
+        assert db.scalar(select(func.count()).select_from(QuestionCount).where(QuestionCount.shard == 0)) == 2
+        assert get_dashboard_stats(db, "all", use_cache=False)["frequent_questions"] == ["Điểm chuẩn?"]
+    finally:
+        db.close()
@@ -98,13 +98,29 @@ const ChatComponent = () => {
     setMessages(prev => [...prev, { sender: "user", text: userMessage }]);
     setIsLoading(true);
 
-    try {
-      const res = await chatService.send(userMessage);
-      const botResponse = res.data.response;
+    // Placeholder bot message, filled in as tokens stream in
+    setMessages(prev => [...prev, { sender: "bot", text: "" }]);
+    const updateBotMessage = (update) => {
+      setMessages(prev => {
+        const next = [...prev];
+        const last = next[next.length - 1];
+        next[next.length - 1] = { ...last, ...update(last) };
+        return next;
+      });
+    };
 
-      setMessages(prev => [...prev, { sender: "bot", text: botResponse }]);
+    try {
+      await chatService.stream(userMessage, (event, data) => {
+        if (event === "token") {
+          updateBotMessage(last => ({ text: last.text + data.text }));
+        } else if (event === "done") {
+          updateBotMessage(() => ({ text: data.response, id: data.id + '_bot' }));
+        } else if (event === "error") {
+          throw new Error(data.detail);
+        }
+      });
     } catch (error) {
-      setMessages(prev => [...prev, { sender: "bot", text: "Xin lỗi, tôi gặp sự cố khi kết nối. Vui lòng thử lại." }]);
+      updateBotMessage(() => ({ text: "Xin lỗi, tôi gặp sự cố khi kết nối. Vui lòng thử lại." }));
     } finally {
       setIsLoading(false);
     }
@@ -70,10 +70,10 @@ const DashboardPage = () => {
             <Card title={<><QuestionCircleOutlined /> Câu hỏi thường gặp</>}>
                 <List
                     bordered
-                    dataSource={stats?.frequent_questions}
+                    dataSource={stats?.top_clusters?.length ? stats.top_clusters : stats?.frequent_question_counts}
                     renderItem={(item) => (
-                        <List.Item>
-                            <Typography.Text>{item}</Typography.Text>
+                        <List.Item extra={<Typography.Text type="secondary">{item.count}</Typography.Text>}>
+                            <Typography.Text>{item.question}</Typography.Text>
                         </List.Item>
                     )}
                 />
@@ -57,13 +57,52 @@ export const authService = {
     getMe: async () => {
         return await api.get('/api/auth/me');
     },
-    getDashboardStats: async () => {
-        return await api.get('/api/dashboard');
+    // window: 'today' | '7d' | '30d' | 'all'
+    getDashboardStats: async (window = 'all') => {
+        return await api.get('/api/dashboard', { params: { window } });
     },
 };
 
+// Read a Server-Sent Events stream from fetch() and call onEvent(event, data) for each event
+const readEventStream = async (response, onEvent) => {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const blocks = buffer.split('\n\n');
+        buffer = blocks.pop();
+        for (const block of blocks) {
+            let event = 'message';
+            let data = '';
+            for (const line of block.split('\n')) {
+                if (line.startsWith('event: ')) event = line.slice(7);
+                else if (line.startsWith('data: ')) data += line.slice(6);
+            }
+            onEvent(event, data ? JSON.parse(data) : null);
+        }
+    }
+};
+
 export const chatService = {
     send: (message) => api.post('/api/chat/send', { message, role: "user" }),
+    stream: async (message, onEvent) => {
+        const token = localStorage.getItem('access_token');
+        const response = await fetch(`${API_URL}/api/chat/send/stream`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                ...(token ? { Authorization: `Bearer ${token}` } : {}),
+            },
+            body: JSON.stringify({ message, role: "user" }),
+        });
+        if (!response.ok) {
+            throw new Error(`Stream request failed with status ${response.status}`);
+        }
+        await readEventStream(response, onEvent);
+    },
     getHistory: (limit = 50, offset = 0) => api.get(`/api/chat/history?limit=${limit}&offset=${offset}`),
     delete: (chatId) => api.delete(`/api/chat/history/${chatId}`),
 };